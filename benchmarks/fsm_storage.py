@@ -0,0 +1,69 @@
+# Compares the memory held by 50k concurrent /configure wizards in aiogram's MemoryStorage with the
+# previous scene data (full SpeechDto options and the day dictionary) and in DatabaseStorage with ids only.
+# Run from the repository root: PYTHONPATH=src python benchmarks/fsm_storage.py
+import asyncio
+import gc
+import tempfile
+import tracemalloc
+from collections.abc import Mapping
+from pathlib import Path
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import data.mock_data
+import data.setup
+from data.engine import create_engine
+from data.fsm_storage import DatabaseStorage
+from data.repository import SpeechRepository
+
+WIZARDS = 50_000
+STATE = 'EditingScene:editing'
+
+
+async def fill(storage: BaseStorage, payload: Mapping[str, object]):
+    for user_id in range(WIZARDS):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+        await storage.set_state(key, STATE)
+        await storage.set_data(key, payload)
+
+
+def measure(start: int):
+    gc.collect()
+    return (tracemalloc.get_traced_memory()[0] - start) / 1024 / 1024
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f'sqlite+aiosqlite:///{Path(directory) / 'bot.db'}')
+        factory = async_sessionmaker(engine)
+        await data.setup.create_tables(engine)
+        await data.mock_data.fill_tables(factory)
+        speech_repository = SpeechRepository(factory, data.mock_data.MOCK_CONFERENCE)
+        days = await speech_repository.get_all_dates()
+        slots = await speech_repository.get_all_slot_ids()
+        _, options = await speech_repository.get_in_time_slot(slots[0])
+        legacy = {'slots': slots, 'options': options,
+                  'days': {day.strftime('%d.%m'): day for day in days}
+                  | {str(i + 1): day for i, day in enumerate(days)}}
+
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        memory = MemoryStorage()
+        await fill(memory, legacy)
+        print(f'{"MemoryStorage, full data":<34} {measure(start):8.1f} MiB')  # noqa: T201
+        del memory
+
+        start = tracemalloc.get_traced_memory()[0]
+        storage = DatabaseStorage(factory, flush_interval=3600)
+        await fill(storage, {'slots': slots})
+        print(f'{"DatabaseStorage, all cached":<34} {measure(start):8.1f} MiB')  # noqa: T201
+        await storage.close()
+        print(f'{"DatabaseStorage, after close":<34} {measure(start):8.1f} MiB')  # noqa: T201
+        tracemalloc.stop()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
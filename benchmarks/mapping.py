@@ -0,0 +1,86 @@
+# Compares automapper with the precompiled DTO builders on 10k speeches.
+# Run from the repository root: PYTHONPATH=src python benchmarks/mapping.py
+import asyncio
+import datetime
+import timeit
+from collections.abc import Awaitable, Callable, Sized
+from zoneinfo import ZoneInfo
+
+import automapper  # type: ignore
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import contains_eager
+
+import data.setup
+from data.mapping import SPEECH_COLUMNS, speeches_from_rows
+from data.repository import SpeechRepository
+from data.tables import Speech, TimeSlot
+from dto import ConferenceDto, SpeechDto
+
+ROWS = 10_000
+SLOTS = 100
+REPEAT = 5
+TIMEZONE = ZoneInfo('Asia/Novosibirsk')
+
+
+async def fill(factory: async_sessionmaker[AsyncSession]):
+    async with factory() as session, session.begin():
+        slots = [TimeSlot(date=datetime.date(2025, 6, 1) + datetime.timedelta(days=i // 10),
+                          start_time=datetime.time(9 + i % 10), end_time=datetime.time(10 + i % 10))
+                 for i in range(SLOTS)]
+        session.add_all(slots)
+        session.add_all(Speech(title=f'Title {i}', speaker=f'Speaker {i}', location=f'Room {i // SLOTS}',
+                               time_slot=slots[i % SLOTS])
+                        for i in range(ROWS))
+
+
+async def automapper_path(factory: async_sessionmaker[AsyncSession]):
+    mapper = automapper.mapper.to(SpeechDto)
+    statement = select(Speech).join(Speech.time_slot).options(contains_eager(Speech.time_slot))
+    async with factory() as session:
+        speeches = (await session.scalars(statement)).all()
+        for speech in speeches:
+            slot = speech.time_slot
+            if slot.start_time.tzinfo is None:
+                slot.start_time = slot.start_time.replace(tzinfo=TIMEZONE)
+                slot.end_time = slot.end_time.replace(tzinfo=TIMEZONE)
+        return [mapper.map(speech) for speech in speeches]
+
+
+async def measure(name: str, run: Callable[[], Awaitable[Sized]]):
+    times: list[float] = []
+    rows = 0
+    for _ in range(REPEAT):
+        start = timeit.default_timer()
+        rows = len(await run())
+        times.append(timeit.default_timer() - start)
+    print(f'{name:<30} {min(times) * 1000:8.1f} ms  ({rows} rows)')  # noqa: T201
+
+
+async def main():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    factory = async_sessionmaker(engine)
+    await data.setup.create_tables(engine)
+    await fill(factory)
+    repository = SpeechRepository(factory, ConferenceDto(1, 'benchmark', TIMEZONE, 2025))
+    async with factory() as session:
+        rows = (await session.execute(select(*SPEECH_COLUMNS).select_from(Speech).join(Speech.time_slot))).all()
+        entities = (await session.scalars(select(Speech).options(contains_eager(Speech.time_slot))
+                                          .join(Speech.time_slot))).all()
+        mapper = automapper.mapper.to(SpeechDto)
+
+        async def map_automapper():
+            return [mapper.map(speech) for speech in entities]
+
+        async def map_builder():
+            return speeches_from_rows(rows, TIMEZONE)
+
+        await measure('mapping only: automapper', map_automapper)
+        await measure('mapping only: builder', map_builder)
+    await measure('get_all_speeches: automapper', lambda: automapper_path(factory))
+    await measure('get_all_speeches: builder', repository.get_all_speeches)
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+# Measures the set-based staging table import on 10k rows, both with all rows at once
+# and with a CSV file parsed and staged in batches as the admin handler does.
+# Run from the repository root: PYTHONPATH=src python benchmarks/schedule_import.py
+import asyncio
+import csv
+import datetime
+import io
+import tempfile
+import timeit
+import uuid
+from collections.abc import Awaitable, Callable, Sequence
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import data.setup
+from data.engine import create_engine
+from data.repository import ConferenceRepository, SpeechRepository
+from dto import SpeechDto, TimeSlotDto
+from handlers import admin
+
+ROWS = 10_000
+SLOTS = 500
+TIMEZONE = ZoneInfo('Asia/Novosibirsk')
+
+
+def build_speeches(title: str):
+    slots = [TimeSlotDto(None, datetime.date(2025, 6, 1) + datetime.timedelta(days=i // 10),
+                         datetime.time(9 + i % 10, tzinfo=TIMEZONE), datetime.time(10 + i % 10, tzinfo=TIMEZONE))
+             for i in range(SLOTS)]
+    return [SpeechDto(None, f'{title} {i}', f'Speaker {i}', slots[i % SLOTS], f'Room {i // SLOTS}')
+            for i in range(ROWS)]
+
+
+async def staged_import(repository: SpeechRepository, speeches: Sequence[SpeechDto], session: AsyncSession):
+    await repository.import_speeches(speeches, (), session)
+
+
+async def streamed_import(repository: SpeechRepository, speeches: Sequence[SpeechDto], session: AsyncSession):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('date', 'start_time', 'end_time', 'location', 'title', 'speaker'))
+    writer.writerows((speech.time_slot.date.strftime('%d-%m'), speech.time_slot.start_time.strftime('%H:%M'),
+                      speech.time_slot.end_time.strftime('%H:%M'), speech.location, speech.title, speech.speaker)
+                     for speech in speeches)
+    content = buffer.getvalue().encode()
+    parser = admin.ScheduleParser(repository.conference, admin.IMPORT_BATCH_SIZE)
+    batch = uuid.uuid4().hex
+    staged = 0
+    for start in range(0, len(content), admin.DOWNLOAD_CHUNK_SIZE):
+        chunk = content[start:start + admin.DOWNLOAD_CHUNK_SIZE]
+        for batch_speeches, deletes in await asyncio.to_thread(parser.feed, chunk):
+            staged += await repository.stage_speeches(batch, staged, batch_speeches, deletes, session)
+    for batch_speeches, deletes in parser.close():
+        staged += await repository.stage_speeches(batch, staged, batch_speeches, deletes, session)
+    await repository.apply_staged(batch, session)
+
+
+async def measure(name: str, run: Callable[[SpeechRepository, Sequence[SpeechDto], AsyncSession], Awaitable[None]]):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f'sqlite+aiosqlite:///{Path(directory) / 'bot.db'}')
+        await data.setup.create_tables(engine)
+        factory = async_sessionmaker(engine)
+        conference = await ConferenceRepository(factory).get_or_create('benchmark', TIMEZONE.key, 2025)
+        repository = SpeechRepository(factory, conference)
+        for label, speeches in (('insert', build_speeches('Title')), ('update', build_speeches('Updated'))):
+            start = timeit.default_timer()
+            async with factory() as session, session.begin():
+                await run(repository, speeches, session)
+            elapsed = timeit.default_timer() - start
+            print(f'{name + ': ' + label:<30} {elapsed * 1000:8.1f} ms  ({len(speeches)} rows)')  # noqa: T201
+        await engine.dispose()
+
+
+async def main():
+    await measure('staging table', staged_import)
+    await measure('streamed CSV', streamed_import)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
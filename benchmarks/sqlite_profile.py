@@ -0,0 +1,56 @@
+# Compares concurrent save_selection/get_selected_speeches throughput on a file database
+# with the default engine settings and with the SQLite profile.
+# Run from the repository root: PYTHONPATH=src python benchmarks/sqlite_profile.py
+import asyncio
+import random
+import tempfile
+import timeit
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+import data.mock_data
+import data.setup
+from data.engine import create_engine
+from data.repository import SelectionRepository
+
+USERS = 200
+OPERATIONS_PER_USER = 20
+READ_SHARE = 0.7
+SLOTS = ((1, (1, 3)), (2, (2,)), (3, (4, 5)))
+
+
+async def run(engine: AsyncEngine):
+    factory = async_sessionmaker(engine)
+    await data.setup.create_tables(engine)
+    await data.mock_data.fill_tables(factory)
+    repository = SelectionRepository(factory, data.mock_data.MOCK_CONFERENCE)
+    rng = random.Random(42)  # noqa: S311
+
+    async def user(user_id: int):
+        for _ in range(OPERATIONS_PER_USER):
+            if rng.random() < READ_SHARE:
+                await repository.get_selected_speeches(user_id)
+            else:
+                slot_id, speeches = rng.choice(SLOTS)
+                await repository.save_selection(user_id, slot_id, rng.choice(speeches))
+
+    start = timeit.default_timer()
+    async with asyncio.TaskGroup() as group:
+        for user_id in range(USERS):
+            group.create_task(user(user_id))
+    elapsed = timeit.default_timer() - start
+    await engine.dispose()
+    return USERS * OPERATIONS_PER_USER / elapsed
+
+
+async def main():
+    for profile in ('default', 'sqlite'):
+        with tempfile.TemporaryDirectory() as directory:
+            url = f'sqlite+aiosqlite:///{Path(directory) / 'bot.db'}'
+            throughput = await run(create_engine(url, profile))
+        print(f'{profile:<10} {throughput:8.0f} operations/s')  # noqa: T201
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
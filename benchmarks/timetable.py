@@ -0,0 +1,71 @@
+# Compares rendering with babel on every line against the precomputed date format table.
+# Run from the repository root: PYTHONPATH=src python benchmarks/timetable.py
+import datetime
+import itertools
+import timeit
+from collections.abc import Callable, Sized
+from zoneinfo import ZoneInfo
+
+from data.schedule import ScheduleSnapshot
+from dto import SpeechDto, TimeSlotDto
+from view import timetable
+
+DAYS = 30
+SLOTS_PER_DAY = 20
+ROOMS = 10
+REPEAT = 5
+TIMEZONE = ZoneInfo('Asia/Novosibirsk')
+
+
+def build_schedule():
+    slots = [TimeSlotDto(day * SLOTS_PER_DAY + i, datetime.date(2025, 6, 1) + datetime.timedelta(days=day),
+                         datetime.time(8 + i // 2, 30 * (i % 2), tzinfo=TIMEZONE),
+                         datetime.time(8 + i // 2, 30 * (i % 2) + 25, tzinfo=TIMEZONE))
+             for day in range(DAYS) for i in range(SLOTS_PER_DAY)]
+    speeches = [SpeechDto(slot.id * ROOMS + room if slot.id is not None else None, f'Title {slot.id}-{room}',
+                          f'Speaker {room}', slot, f'Room {room}')
+                for slot in slots for room in range(ROOMS)]
+    return ScheduleSnapshot.build(1, slots, speeches)
+
+
+def render_all(schedule: ScheduleSnapshot):
+    def table():
+        for date in schedule.dates:
+            speeches = sorted(schedule.speeches_by_date[date], key=lambda speech: speech.location)
+            yield date, itertools.groupby(speeches, lambda speech: speech.location)
+
+    lines: list[object] = list(timetable.render_timetable(table()))
+    lines.extend(timetable.render_personal((date, schedule.speeches_by_date[date][::ROOMS])
+                                           for date in schedule.dates))
+    lines.extend(timetable.make_slot_string(slot, with_day=True) for slot in schedule.slots)
+    return lines
+
+
+def render_headers(schedule: ScheduleSnapshot):
+    lines: list[object] = [timetable.make_date_string(date) for date in schedule.dates]
+    lines.extend(timetable.make_slot_string(slot, with_day=True) for slot in schedule.slots)
+    return lines
+
+
+def measure(name: str, run: Callable[[], Sized]):
+    times: list[float] = []
+    items = 0
+    for _ in range(REPEAT):
+        start = timeit.default_timer()
+        items = len(run())
+        times.append(timeit.default_timer() - start)
+    print(f'{name:<30} {min(times) * 1000:8.1f} ms  ({items} items)')  # noqa: T201
+
+
+def main():
+    schedule = build_schedule()
+    measure('headers: babel', lambda: render_headers(schedule))
+    measure('full render: babel', lambda: render_all(schedule))
+    timetable.date_formats.update(schedule.dates, schedule.slots)
+    measure('headers: precomputed', lambda: render_headers(schedule))
+    measure('full render: precomputed', lambda: render_all(schedule))
+    measure('table update', lambda: timetable.date_formats.update(schedule.dates, schedule.slots) or schedule.dates)
+
+
+if __name__ == '__main__':
+    main()
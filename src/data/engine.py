@@ -0,0 +1,64 @@
+import logging
+import os
+from typing import Any
+
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+SQLITE_POOL_SIZE = 8
+
+
+def create_engine(url: str, profile: str | None = None, **kwargs: Any):
+    profile = profile or os.getenv('DATABASE_PROFILE') or _detect_profile(url)
+    logging.getLogger(__name__).info('Using database profile %s', profile)
+    match profile:
+        case 'sqlite':
+            return _create_sqlite_engine(url, **kwargs)
+        case 'memory':
+            # One in-memory database lives in one connection. A pool of one makes sessions take turns on it,
+            # with the default StaticPool a session closing early would roll back another one's writes
+            return create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0,
+                                       pool_timeout=30, **kwargs)
+        case 'default':
+            return create_async_engine(url, **kwargs)
+        case _:
+            msg = f'Unknown database profile {profile}'
+            raise ValueError(msg)
+
+
+def has_single_connection(factory: async_sessionmaker[AsyncSession]):
+    # In-memory SQLite runs every session on one connection
+    bind = factory.kw.get('bind')
+    if not isinstance(bind, AsyncEngine):
+        return False
+    pool = bind.sync_engine.pool
+    return isinstance(pool, StaticPool) or (isinstance(pool, QueuePool) and pool.size() <= 1)
+
+
+def _detect_profile(url: str):
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite':
+        return 'default'
+    return 'memory' if parsed.database in {None, '', ':memory:'} else 'sqlite'
+
+
+def _create_sqlite_engine(url: str, **kwargs: Any):
+    pool_size = int(os.getenv('DATABASE_POOL_SIZE', str(SQLITE_POOL_SIZE)))
+    engine = create_async_engine(url, pool_size=pool_size, max_overflow=0, pool_timeout=30, **kwargs)
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def set_pragmas(dbapi_connection: Any, _: Any):  # pyright: ignore[reportUnusedFunction]
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    return engine
@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .tables import FsmRecord
+from .upsert import upsert
+
+STATE_TTL = datetime.timedelta(days=1)
+CACHE_TTL = 60.0
+FLUSH_INTERVAL = 1.0
+PURGE_INTERVAL = 600.0
+EMPTY_DATA = '{}'
+
+
+@dataclass(slots=True)
+class _Entry:
+    state: str | None
+    data: str
+    used: float
+
+
+class DatabaseStorage(BaseStorage):
+    def __init__(self, factory: async_sessionmaker[AsyncSession], *,  # noqa: PLR0913
+                 ttl: datetime.timedelta = STATE_TTL, cache_ttl: float = CACHE_TTL,
+                 flush_interval: float = FLUSH_INTERVAL, key_builder: KeyBuilder | None = None, shared: bool = False):
+        self._factory = factory
+        self._ttl = ttl
+        self._cache_ttl = cache_ttl
+        self._flush_interval = flush_interval
+        self._shared = shared
+        self._key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._entries: dict[str, _Entry] = {}
+        self._dirty: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task[None] | None = None
+        self._closing = asyncio.Event()
+        self._last_purge = time.monotonic()
+        self._logger = logging.getLogger(__name__)
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        storage_key, entry = await self._get(key)
+        entry.state = state.state if isinstance(state, State) else state
+        await self._save(storage_key, entry)
+
+    async def get_state(self, key: StorageKey):
+        _, entry = await self._get(key)
+        return entry.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        storage_key, entry = await self._get(key)
+        entry.data = json.dumps(data, separators=(',', ':'))
+        await self._save(storage_key, entry)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, entry = await self._get(key)
+        return json.loads(entry.data)
+
+    async def close(self):
+        # The background task is stopped rather than cancelled so that a write in progress is not lost
+        self._closing.set()
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        self._entries.clear()
+        self._closing.clear()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty = self._dirty
+            self._dirty = set()
+            try:
+                await self._write({key: self._entries[key] for key in dirty})
+            except asyncio.CancelledError:
+                self._dirty |= dirty
+                raise
+            except Exception:
+                self._logger.exception('Failed to save %d FSM records', len(dirty))
+                self._dirty |= dirty
+                raise
+
+    async def purge(self):
+        async with self._factory() as session, session.begin():
+            await session.execute(delete(FsmRecord).where(FsmRecord.expires < _now()))
+        self._last_purge = time.monotonic()
+
+    async def _get(self, key: StorageKey):
+        storage_key = self._key_builder.build(key)
+        now = time.monotonic()
+        entry = None if self._shared else self._entries.get(storage_key)
+        if entry is not None and now - entry.used > self._ttl.total_seconds():
+            entry.state = None
+            entry.data = EMPTY_DATA
+            self._dirty.add(storage_key)
+        if entry is None:
+            async with self._factory() as session:
+                result = await session.execute(select(FsmRecord.state, FsmRecord.data)
+                                               .where((FsmRecord.key == storage_key) & (FsmRecord.expires >= _now())))
+                row = result.one_or_none()
+            entry = _Entry(None, EMPTY_DATA, now) if row is None else _Entry(row[0], row[1], now)
+            if not self._shared:
+                # another coroutine may have loaded or written the entry while this one waited
+                entry = self._entries.setdefault(storage_key, entry)
+        entry.used = now
+        return storage_key, entry
+
+    async def _save(self, storage_key: str, entry: _Entry):
+        if self._shared:
+            # other processes read the database directly, so neither write-behind nor caching is safe
+            await self._write({storage_key: entry})
+            return
+        self._dirty.add(storage_key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._run())
+
+    async def _write(self, entries: Mapping[str, _Entry]):
+        expires = _now() + self._ttl
+        saved = [{'key': key, 'state': entry.state, 'data': entry.data, 'expires': expires}
+                 for key, entry in entries.items() if not _is_empty(entry)]
+        removed = [key for key, entry in entries.items() if _is_empty(entry)]
+        async with self._factory() as session, session.begin():
+            if removed:
+                await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(removed)))
+            if saved:
+                await session.execute(upsert(session, FsmRecord, ['key'], ['state', 'data', 'expires']), saved)
+        self._logger.debug('Saved %d and removed %d FSM records', len(saved), len(removed))
+
+    async def _run(self):
+        while (self._dirty or self._entries) and not self._closing.is_set():
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(self._flush_interval):
+                    await self._closing.wait()
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                    await self.purge()
+            except Exception:  # noqa: BLE001
+                self._logger.warning('FSM storage maintenance failed, will retry', exc_info=True)
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        idle = [key for key, entry in self._entries.items()
+                if key not in self._dirty and (_is_empty(entry) or now - entry.used > self._cache_ttl)]
+        for key in idle:
+            del self._entries[key]
+
+
+def _is_empty(entry: _Entry):
+    return entry.state is None and entry.data == EMPTY_DATA
+
+
+def _now():
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
@@ -0,0 +1,59 @@
+import datetime
+from collections.abc import Iterable, Mapping
+
+from dto import SelectionDto, SpeechDto, TimeSlotDto
+
+from .tables import Speech, TimeSlot
+
+SLOT_COLUMNS = (TimeSlot.id, TimeSlot.date, TimeSlot.start_time, TimeSlot.end_time)
+SPEECH_COLUMNS = (Speech.id, Speech.title, Speech.speaker, Speech.location, *SLOT_COLUMNS)
+
+type SlotRow = tuple[int, datetime.date, datetime.time, datetime.time]
+type SpeechRow = tuple[int, str, str, str, int, datetime.date, datetime.time, datetime.time]
+type SelectionRow = tuple[int, int, str, str, str, int, datetime.date, datetime.time, datetime.time]
+
+
+def slot_from_row(row: SlotRow, timezone: datetime.tzinfo):
+    slot_id, date, start_time, end_time = row
+    return TimeSlotDto(slot_id, date, start_time.replace(tzinfo=timezone), end_time.replace(tzinfo=timezone))
+
+
+class SpeechBuilder:
+    def __init__(self, timezone: datetime.tzinfo, slots: Mapping[int, TimeSlotDto] | None = None):
+        self._timezone = timezone
+        self._slots: dict[int, TimeSlotDto] = dict(slots or {})
+        self._speeches: dict[int, SpeechDto] = {}
+
+    def build(self, row: SpeechRow):
+        return self._speech(*row)
+
+    def build_selection(self, row: SelectionRow):
+        attendee, speech_id, title, speaker, location, slot_id, date, start_time, end_time = row
+        return SelectionDto(attendee, self._speech(speech_id, title, speaker, location, slot_id, date, start_time,
+                                                   end_time))
+
+    def _speech(self, speech_id: int, title: str, speaker: str, location: str,  # noqa: PLR0913, PLR0917
+                slot_id: int, date: datetime.date, start_time: datetime.time, end_time: datetime.time):
+        speech = self._speeches.get(speech_id)
+        if speech is not None:
+            return speech
+        slot = self._slots.get(slot_id)
+        if slot is None:
+            slot = self._slots[slot_id] = TimeSlotDto(slot_id, date, start_time.replace(tzinfo=self._timezone),
+                                                      end_time.replace(tzinfo=self._timezone))
+        speech = self._speeches[speech_id] = SpeechDto(speech_id, title, speaker, slot, location)
+        return speech
+
+
+def speeches_from_rows(rows: Iterable[SpeechRow], timezone: datetime.tzinfo):
+    builder = SpeechBuilder(timezone)
+    return [builder.build(row) for row in rows]
+
+
+def speech_to_entity(speech: SpeechDto):
+    assert speech.time_slot.id is not None
+    entity = Speech(title=speech.title, speaker=speech.speaker, location=speech.location,
+                    time_slot_id=speech.time_slot.id)
+    if speech.id is not None:
+        entity.id = speech.id
+    return entity
@@ -5,12 +5,19 @@ from zoneinfo import ZoneInfo
 from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from .tables import Speech, TimeSlot
+from dto import ConferenceDto
+
+from .tables import DEFAULT_CONFERENCE_ID, Conference, Speech, TimeSlot
+from .upsert import insert_ignore
+
+MOCK_CONFERENCE = ConferenceDto(DEFAULT_CONFERENCE_ID, 'default', ZoneInfo('Asia/Novosibirsk'), 2025)
 
 
 async def fill_tables(session_factory: async_sessionmaker[AsyncSession]):
     async with session_factory() as session, session.begin():
-        timezone = ZoneInfo('Asia/Novosibirsk')
+        timezone = MOCK_CONFERENCE.timezone
+        await session.execute(insert_ignore(session, Conference).values(
+            id=MOCK_CONFERENCE.id, name=MOCK_CONFERENCE.name, timezone=str(timezone), year=MOCK_CONFERENCE.year))
         id_result = await session.execute(insert(TimeSlot).returning(TimeSlot.id), [
             {'date': datetime.date(2025, 6, 1), 'start_time': datetime.time(9, tzinfo=timezone),
              'end_time': datetime.time(10, tzinfo=timezone)},
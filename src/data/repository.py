@@ -1,145 +1,217 @@
+import asyncio
+import contextlib
 import datetime
+import itertools
 import logging
-from collections.abc import Collection, Iterable
+import uuid
+from collections.abc import AsyncIterator, Callable, Collection, Iterable, Sequence
 from pathlib import Path
-from typing import Any
+from typing import Any, cast
 from zoneinfo import ZoneInfo
 
-import automapper  # type: ignore
-from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy import CursorResult, Row, Select, case, delete, exists, func, insert, literal, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
-from sqlalchemy.orm import aliased, contains_eager, selectinload
-
-from dto import SelectionDto, SpeechDto, TimeSlotDto
-
-from .tables import FileInfo, Selection, Settings, Speech, TimeSlot
+from sqlalchemy.orm import aliased
+
+from dto import ConferenceDto, ReminderJobDto, SpeechDto, TimeSlotDto
+
+from .engine import has_single_connection
+from .mapping import (
+    SLOT_COLUMNS,
+    SPEECH_COLUMNS,
+    SelectionRow,
+    SpeechBuilder,
+    slot_from_row,
+    speeches_from_rows,
+)
+from .schedule import ScheduleSnapshot
+from .tables import (
+    Conference,
+    DeliveryStatus,
+    FileInfo,
+    Lease,
+    OutboxEntry,
+    OutboxMessage,
+    ReminderJob,
+    Revision,
+    ScheduleStaging,
+    Selection,
+    Settings,
+    Speech,
+    TimeSlot,
+)
+from .upsert import dialect_insert, insert_ignore, upsert
+
+STREAM_CHUNK_SIZE = 1000
+SCHEDULE_REVISION = 'schedule'
+REMINDER_JOBS_REVISION = 'reminder_jobs'
+FLUSH_INTERVAL = 0.005
+MAX_BATCH = 200
 
 
 class SpeechRepository:
-    def __init__(self, factory: async_sessionmaker[AsyncSession],
-                 timezone: datetime.tzinfo | None = None) -> None:
+    def __init__(self, factory: async_sessionmaker[AsyncSession], conference: ConferenceDto) -> None:
         self._factory = factory
-        self._timezone = timezone or ZoneInfo('Asia/Novosibirsk')
-        self._mapper = automapper.mapper.to(SpeechDto)
-        self._to_speech_mapper = automapper.mapper.to(Speech)
+        self.conference = conference
+        self._timezone = self.conference.timezone
+        self._revision_name = f'{SCHEDULE_REVISION}:{self.conference.id}'
+        self._schedule: ScheduleSnapshot | None = None
+        self._schedule_lock = asyncio.Lock()
+        self._revision: int | None = None
         self._logger = logging.getLogger(__name__)
 
     def get_session(self):
         return self._factory()
 
+    async def get_schedule(self):
+        snapshot = self._schedule
+        if snapshot is None:
+            async with self._schedule_lock:
+                snapshot = self._schedule or await self._load_schedule()
+        return snapshot
+
+    async def reload_schedule(self):
+        async with self._schedule_lock:
+            return await self._load_schedule()
+
     async def get_all_speeches(self, date: datetime.date | None = None):
-        statement = (select(Speech).join(Speech.time_slot)
-                     .order_by(TimeSlot.date, Speech.location, TimeSlot.start_time)
-                     .options(contains_eager(Speech.time_slot)))
-        if date is not None:
-            statement = statement.where(TimeSlot.date == date)
-        async with self._factory() as session:
-            result = await session.scalars(statement)
-            speeches = result.all()
-            _update_speeches_slot_timezone(speeches, self._timezone)
-            return [self._mapper.map(speech) for speech in speeches]
+        schedule = await self.get_schedule()
+        return schedule.speeches if date is None else schedule.speeches_by_date.get(date, ())
 
     async def get_in_time_slot(self, time_slot_id: int):
-        slot_statement = select(TimeSlot).where(TimeSlot.id == time_slot_id)
-        statement = select(Speech).where(Speech.time_slot_id == time_slot_id)
-        async with self._factory() as session:
-            slot_result = await session.scalars(slot_statement)
-            result = await session.scalars(statement)
-            slot = self._map_slot_to_dto(slot_result.one())
-            return slot, [self._mapper.map(it, fields_mapping={'time_slot': slot}) for it in result]
+        schedule = await self.get_schedule()
+        return schedule.slots_by_id[time_slot_id], schedule.speeches_by_slot[time_slot_id]
 
     async def get_all_slots(self):
-        statement = select(TimeSlot).order_by(TimeSlot.date, TimeSlot.start_time)
-        async with self._factory() as session:
-            result = await session.scalars(statement)
-            return list(map(self._map_slot_to_dto, result))
+        schedule = await self.get_schedule()
+        return schedule.slots
 
     async def get_all_slot_ids(self):
-        statement = select(TimeSlot.id)
-        async with self._factory() as session:
-            result = await session.scalars(statement)
-            return result.all()
+        schedule = await self.get_schedule()
+        return list(schedule.slots_by_id)
 
     async def get_slot_ids_on_day(self, date: datetime.date):
-        statement = select(TimeSlot.id).where(TimeSlot.date == date)
-        async with self._factory() as session:
-            result = await session.scalars(statement)
-            return result.all()
+        schedule = await self.get_schedule()
+        return [slot.id for slot in schedule.slots_by_date.get(date, ()) if slot.id is not None]
 
     async def get_all_dates(self):
-        statement = select(TimeSlot.date).distinct().order_by(TimeSlot.date)
-        async with self._factory() as session:
-            result = await session.scalars(statement)
-            return result.all()
+        schedule = await self.get_schedule()
+        return schedule.dates
 
-    async def find_or_create_slots(self, slots: Collection[TimeSlotDto], session: AsyncSession):
-        slot_descriptors = [(slot.date, self._shift_time(slot.start_time), self._shift_time(slot.end_time))
-                            for slot in slots]
-        statement = (select(TimeSlot)
-                     .where(tuple_(TimeSlot.date, TimeSlot.start_time, TimeSlot.end_time).in_(slot_descriptors)))
-        result = await session.scalars(statement)
-        mapping = {self._time_tuple(slot): self._map_slot_to_dto(slot) for slot in result}
-        not_found = (slot for slot in slots if (slot.date, slot.start_time, slot.end_time) not in mapping)
-        entities = [self._map_slot_from_dto(slot) for slot in not_found]
-        if entities:
-            self._logger.info('Creating new %d time slots', len(entities))
-            session.add_all(entities)
-            await session.flush()
-            for slot in entities:
-                mapping[self._time_tuple(slot)] = self._map_slot_to_dto(slot)
-        return mapping
-
-    async def update_or_insert_speeches(self, speeches: Collection[SpeechDto], session: AsyncSession):
-        self._logger.info('Updating %d speeches', len(speeches))
-        speech_descriptors = [(speech.time_slot.id, speech.location) for speech in speeches]
-        statement = select(Speech).where(tuple_(Speech.time_slot_id, Speech.location).in_(speech_descriptors))
-        result = await session.scalars(statement)
-        existing = {(speech.time_slot_id, speech.location): speech for speech in result}
-        for speech in speeches:
-            slot = speech.time_slot.id
-            assert slot is not None
-            if (slot, speech.location) in existing:
-                entity = existing[slot, speech.location]
-                _update_speech(entity, speech)
-            else:
-                entity = self._to_speech_mapper.map(
-                    speech,
-                    fields_mapping={
-                        'time_slot': None,
-                        'time_slot_id': speech.time_slot.id},
-                    skip_none_values=True)
-            session.add(entity)
-
-    def delete_speeches(self, speeches: Iterable[tuple[int, str]], session: AsyncSession):
-        self._logger.info('Deleting some speeches')
-        statement = (delete(Speech)
-                     .where(tuple_(Speech.time_slot_id, Speech.location).in_(speeches)))
-        return session.execute(statement)
-
-    def _map_slot_to_dto(self, slot: TimeSlot):
-        return TimeSlotDto(id=slot.id, date=slot.date,
-                           start_time=slot.start_time.replace(tzinfo=self._timezone),
-                           end_time=slot.end_time.replace(tzinfo=self._timezone))
-
-    def _map_slot_from_dto(self, slot: TimeSlotDto):
-        assert slot.id is None
-        return TimeSlot(date=slot.date,
-                        start_time=self._shift_time(slot.start_time),
-                        end_time=self._shift_time(slot.end_time))
+    async def get_revision(self):
+        await self.get_schedule()
+        assert self._revision is not None
+        return self._revision
+
+    async def refresh_schedule(self):
+        async with self._factory() as session:
+            revision = await self._get_revision(session)
+        if revision == self._revision:
+            return False
+        await self.reload_schedule()
+        return True
+
+    async def bump_revision(self, session: AsyncSession):
+        statement = dialect_insert(session, Revision).values(name=self._revision_name, value=1)
+        await session.execute(statement.on_conflict_do_update(index_elements=['name'],
+                                                              set_={'value': Revision.value + 1}))
+
+    async def _get_revision(self, session: AsyncSession):
+        return await session.scalar(select(Revision.value).where(Revision.name == self._revision_name)) or 0
+
+    async def _load_schedule(self):
+        version = 1 if self._schedule is None else self._schedule.version + 1
+        async with self._factory() as session:
+            self._revision = await self._get_revision(session)
+            slot_rows = await session.execute(select(*SLOT_COLUMNS).where(TimeSlot.conference_id == self.conference.id))
+            slots = {row[0]: slot_from_row(row, self._timezone) for row in slot_rows}
+            speech_rows = await session.execute(select(*SPEECH_COLUMNS).select_from(Speech).join(Speech.time_slot)
+                                                .where(TimeSlot.conference_id == self.conference.id))
+            builder = SpeechBuilder(self._timezone, slots)
+            speeches = [builder.build(row) for row in speech_rows]
+        self._schedule = ScheduleSnapshot.build(version, slots.values(), speeches)
+        self._logger.info('Loaded schedule version %d: %d slots, %d speeches', version, len(slots), len(speeches))
+        return self._schedule
+
+    async def import_speeches(self, speeches: Iterable[SpeechDto], deletes: Iterable[tuple[TimeSlotDto, str]],
+                              session: AsyncSession) -> list[TimeSlotDto]:
+        batch = uuid.uuid4().hex
+        if not await self.stage_speeches(batch, 0, speeches, deletes, session):
+            return []
+        return await self.apply_staged(batch, session)
+
+    async def stage_speeches(self, batch: str, first_row: int, speeches: Iterable[SpeechDto],
+                             deletes: Iterable[tuple[TimeSlotDto, str]], session: AsyncSession):
+        # Rows are numbered across the whole batch so that a later row for the same place wins on apply
+        rows: list[tuple[datetime.date, datetime.time, datetime.time, str, str | None, str | None]] = [
+            (*self._slot_key(slot), location, None, None) for slot, location in deletes]
+        rows.extend((*self._slot_key(speech.time_slot), speech.location, speech.title, speech.speaker)
+                    for speech in speeches)
+        if rows:
+            await session.execute(insert(ScheduleStaging), [
+                {'batch': batch, 'row': first_row + i, 'date': date, 'start_time': start_time,
+                 'end_time': end_time, 'location': location, 'title': title, 'speaker': speaker}
+                for i, (date, start_time, end_time, location, title, speaker) in enumerate(rows)])
+        return len(rows)
+
+    async def apply_staged(self, batch: str, session: AsyncSession):
+        rank = func.row_number().over(
+            partition_by=(ScheduleStaging.date, ScheduleStaging.start_time, ScheduleStaging.end_time,
+                          ScheduleStaging.location),
+            order_by=ScheduleStaging.row.desc()).label('rank')
+        ranked = select(ScheduleStaging, rank).where(ScheduleStaging.batch == batch).subquery()
+        staging = select(ranked).where(ranked.c.rank == 1).subquery()
+        slot_match = ((TimeSlot.conference_id == self.conference.id) & (TimeSlot.date == staging.c.date)
+                      & (TimeSlot.start_time == staging.c.start_time) & (TimeSlot.end_time == staging.c.end_time))
+
+        # Only missing slots are inserted, any conflict left is a real one and must not drop rows silently
+        new_slots = (select(literal(self.conference.id), staging.c.date, staging.c.start_time, staging.c.end_time)
+                     .distinct().where(staging.c.title.is_not(None))
+                     .where(~select(TimeSlot.id).where(slot_match).exists()))
+        await session.execute(insert(TimeSlot).from_select(['conference_id', 'date', 'start_time', 'end_time'],
+                                                           new_slots))
+        deleted = (select(Speech.id).select_from(staging).join(TimeSlot, slot_match)
+                   .join(Speech, (Speech.time_slot_id == TimeSlot.id) & (Speech.location == staging.c.location))
+                   .where(staging.c.title.is_(None)))
+        await session.execute(delete(Speech).where(Speech.id.in_(deleted)))
+        rows = (select(TimeSlot.id, staging.c.location, staging.c.title, staging.c.speaker)
+                .select_from(staging).join(TimeSlot, slot_match).where(staging.c.title.is_not(None)))
+        statement = dialect_insert(session, Speech).from_select(['time_slot_id', 'location', 'title', 'speaker'],
+                                                                rows)
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=['time_slot_id', 'location'],
+            set_={'title': statement.excluded.title, 'speaker': statement.excluded.speaker},
+            where=(Speech.title != statement.excluded.title) | (Speech.speaker != statement.excluded.speaker)))
+
+        result = await session.execute(select(*SLOT_COLUMNS).distinct().select_from(staging).join(TimeSlot, slot_match))
+        slots = [slot_from_row(row, self._timezone) for row in result]
+        self._logger.info('Imported schedule batch touching %d slots', len(slots))
+        await self.discard_staged(batch, session)
+        return slots
+
+    async def discard_staged(self, batch: str, session: AsyncSession):
+        await session.execute(delete(ScheduleStaging).where(ScheduleStaging.batch == batch))
 
     def _shift_time(self, time: datetime.time):
         assert time.tzinfo == self._timezone
         return time.replace(tzinfo=None)
 
-    def _time_tuple(self, slot: TimeSlot):
-        return slot.date, slot.start_time.replace(tzinfo=self._timezone), slot.end_time.replace(tzinfo=self._timezone)
+    def _slot_key(self, slot: TimeSlotDto):
+        return slot.date, self._shift_time(slot.start_time), self._shift_time(slot.end_time)
 
 
 class UserRepository:
-    def __init__(self, factory: async_sessionmaker[AsyncSession]):
+    def __init__(self, factory: async_sessionmaker[AsyncSession], *, shared: bool = False):
         self._factory = factory
+        self._shared = shared
+        self._notification_listeners: list[Callable[[int, bool], None]] = []
+        self._admins: set[int] | None = None
+        self._admins_lock = asyncio.Lock()
         self._logger = logging.getLogger(__name__)
 
+    def add_notification_listener(self, listener: Callable[[int, bool], None]):
+        self._notification_listeners.append(listener)
+
     async def get_notification_setting(self, user_id: int):
         statement = select(Settings.notifications_enabled).where(Settings.user_id == user_id)
         async with self._factory() as session:
@@ -148,119 +220,294 @@ class UserRepository:
     def register_user(self, user_id: int, username: str):
         return self._insert_or_update_setting(user_id, 'username', username)
 
-    def save_notification_setting(self, user_id: int, enabled: bool):
-        return self._insert_or_update_setting(user_id, 'notifications_enabled', enabled)
+    async def save_notification_setting(self, user_id: int, enabled: bool):
+        await self._insert_or_update_setting(user_id, 'notifications_enabled', enabled)
+        for listener in self._notification_listeners:
+            listener(user_id, enabled)
 
-    def set_admin(self, user_id: int, admin: bool):
-        return self._insert_or_update_setting(user_id, 'admin', admin)
+    async def get_users_with_notifications_disabled(self):
+        statement = select(Settings.user_id).where(Settings.notifications_enabled.is_(False))
+        async with self._factory() as session:
+            result = await session.scalars(statement)
+            return result.all()
+
+    async def set_admin(self, user_id: int, admin: bool):
+        async with self._admins_lock:
+            await self._insert_or_update_setting(user_id, 'admin', admin)
+            self._update_admins((user_id,), admin)
 
     async def is_admin(self, user_id: int):
-        statement = select(Settings.admin).where(Settings.user_id == user_id)
-        async with self._factory() as session:
-            result = await session.scalar(statement)
-            return bool(result)
+        if self._shared:
+            # other processes change admins too, a cached set would keep revoked rights
+            async with self._factory() as session:
+                return bool(await session.scalar(select(Settings.admin).where(Settings.user_id == user_id)))
+        admins = self._admins
+        if admins is None:
+            async with self._admins_lock:
+                admins = self._admins if self._admins is not None else await self._load_admins()
+        return user_id in admins
+
+    async def load_admins(self):
+        async with self._admins_lock:
+            return await self._load_admins()
 
     async def set_admin_by_username(self, username: str, admin: bool):
         self._logger.info('Setting admin status for user %s to %s', username, admin)
-        update_query = update(Settings).where(Settings.username == username).values(admin=admin)
-        async with self._factory() as session, session.begin():
-            updated = await session.execute(update_query)
-            return updated.rowcount > 0
+        update_query = (update(Settings).where(Settings.username == username).values(admin=admin)
+                        .returning(Settings.user_id))
+        async with self._admins_lock:
+            async with self._factory() as session, session.begin():
+                result = await session.scalars(update_query)
+                user_ids = result.all()
+            self._update_admins(user_ids, admin)
+        return len(user_ids) > 0
+
+    async def _load_admins(self):
+        statement = select(Settings.user_id).where(Settings.admin)
+        async with self._factory() as session:
+            result = await session.scalars(statement)
+            self._admins = set(result)
+        self._logger.info('Loaded %d admins', len(self._admins))
+        return self._admins
+
+    def _update_admins(self, user_ids: Iterable[int], admin: bool):
+        if self._admins is None:
+            return
+        if admin:
+            self._admins.update(user_ids)
+        else:
+            self._admins.difference_update(user_ids)
 
     async def _insert_or_update_setting(self, user_id: int, column: str, value: Any):
         self._logger.info('Saving setting for user %d, column %s, value %s', user_id, column, value)
-        update_query = update(Settings).where(Settings.user_id == user_id).values({column: value})
-        insert_query = insert(Settings).values({'user_id': user_id, column: value})
         async with self._factory() as session, session.begin():
-            updated = await session.execute(update_query)
-            if not updated.rowcount:
-                await session.execute(insert_query)
+            statement = upsert(session, Settings, ['user_id'], [column])
+            await session.execute(statement.values({'user_id': user_id, column: value}))
 
 
 class SelectionRepository:
-    def __init__(self, factory: async_sessionmaker[AsyncSession], timezone: datetime.tzinfo | None = None):
+    def __init__(self, factory: async_sessionmaker[AsyncSession], conference: ConferenceDto):
         self._factory = factory
-        self._timezone = timezone or ZoneInfo('Asia/Novosibirsk')
-        self._selection_mapper = automapper.mapper.to(SelectionDto)
-        self._speech_mapper = automapper.mapper.to(SpeechDto)
+        self.conference = conference
+        self._timezone = self.conference.timezone
+        self._selection_listeners: list[Callable[[int, int, int | None], None]] = []
+        # Writes made while a stream is consumed would break its open cursor when there is only one connection
+        self._fetch_before_streaming = has_single_connection(factory)
         self._logger = logging.getLogger(__name__)
 
+    def add_selection_listener(self, listener: Callable[[int, int, int | None], None]):
+        self._selection_listeners.append(listener)
+
     async def get_selected_speeches(self, user_id: int, date: datetime.date | None = None):
-        statement = (select(Speech)
+        statement = (select(*SPEECH_COLUMNS).select_from(Speech)
                      .join(Selection).where(Selection.attendee == user_id)
-                     .join(TimeSlot).order_by(TimeSlot.date, TimeSlot.start_time)
-                     .options(contains_eager(Speech.time_slot)))
+                     .join(Speech.time_slot).where(TimeSlot.conference_id == self.conference.id)
+                     .order_by(TimeSlot.date, TimeSlot.start_time))
         if date is not None:
             statement = statement.where(TimeSlot.date == date)
         async with self._factory() as session:
-            result = await session.scalars(statement)
-            speeches = result.all()
-            _update_speeches_slot_timezone(speeches, self._timezone)
-            return [self._speech_mapper.map(speech) for speech in speeches]
+            result = await session.execute(statement)
+            return speeches_from_rows(result, self._timezone)
 
     async def save_selection(self, user_id: int, slot_id: int, speech_id: int | None):
         self._logger.info(
             'Saving selection for user %d, slot %d, speech %s', user_id, slot_id, speech_id)
-        delete_statement = delete(Selection).where(
-            (Selection.attendee == user_id) & (Selection.time_slot_id == slot_id))
         async with self._factory() as session, session.begin():
-            await session.execute(delete_statement)
-            if speech_id is not None:
-                selection = Selection(
-                    attendee=user_id, time_slot_id=slot_id, speech_id=speech_id)
-                session.add(selection)
+            if speech_id is None:
+                await session.execute(delete(Selection).where(
+                    (Selection.attendee == user_id) & (Selection.time_slot_id == slot_id)))
+            else:
+                statement = upsert(session, Selection, ['attendee', 'time_slot_id'], ['speech_id'])
+                await session.execute(statement.values(attendee=user_id, time_slot_id=slot_id, speech_id=speech_id))
+        for listener in self._selection_listeners:
+            listener(user_id, slot_id, speech_id)
+
+    async def save_selections(self, selections: Collection[tuple[int, int, int | None]]):
+        self._logger.info('Saving %d selections', len(selections))
+        removed = [(user_id, slot_id) for user_id, slot_id, speech_id in selections if speech_id is None]
+        saved = [{'attendee': user_id, 'time_slot_id': slot_id, 'speech_id': speech_id}
+                 for user_id, slot_id, speech_id in selections if speech_id is not None]
+        async with self._factory() as session, session.begin():
+            if removed:
+                await session.execute(delete(Selection).where(
+                    tuple_(Selection.attendee, Selection.time_slot_id).in_(removed)))
+            if saved:
+                await session.execute(upsert(session, Selection, ['attendee', 'time_slot_id'], ['speech_id']), saved)
+        for listener in self._selection_listeners:
+            for selection in selections:
+                listener(*selection)
+
+    async def get_selections_in_slots(self, slot_ids: Iterable[int]):
+        query = (select(Selection.time_slot_id, Selection.attendee, Selection.speech_id)
+                 .where(Selection.time_slot_id.in_(slot_ids)))
+        async with self._factory() as session:
+            result = await session.execute(query)
+            return result.tuples().all()
 
     async def get_users_that_selected(self, slot_id: int):
-        query = (select(Selection).where(Selection.time_slot_id == slot_id)
-                 .outerjoin(Settings, Selection.attendee == Settings.user_id)
-                 .where(Settings.notifications_enabled.is_distinct_from(False))
-                 .options(selectinload(Selection.speech)))
-        dummy_slot = TimeSlotDto(0, datetime.date(1, 1, 1), datetime.time(), datetime.time())
         async with self._factory() as session:
-            result = await session.scalars(query)
-            return [self._selection_mapper.map(row, fields_mapping={'speech.time_slot': dummy_slot}) for row in result]
+            result = await session.execute(self._users_that_selected_query(slot_id))
+            return self._map_audience(result.tuples())
+
+    async def stream_users_that_selected(self, slot_id: int, chunk_size: int = STREAM_CHUNK_SIZE):
+        query = self._users_that_selected_query(slot_id).with_only_columns(Selection.attendee, Selection.speech_id)
+        async for chunk in self._stream(query, chunk_size):
+            yield chunk
 
     async def get_changing_users(self, current_slot_id: int, previous_slot_id: int):
-        previous_speech = aliased(Speech)
-        previous_selection = aliased(Selection)
-        query = (select(Selection)
-                 .where(Selection.time_slot_id == current_slot_id)
-                 .outerjoin(Settings, Selection.attendee == Settings.user_id)
-                 .where(Settings.notifications_enabled.is_distinct_from(False))
-                 .outerjoin(previous_selection,
-                            (Selection.attendee == previous_selection.attendee)
-                            & (previous_selection.time_slot_id == previous_slot_id))
-                 .join(Speech, Selection.speech)
-                 .outerjoin(previous_speech, previous_selection.speech)
-                 .where(Speech.location.is_distinct_from(previous_speech.location))
-                 .options(contains_eager(Selection.speech)))
-        dummy_slot = TimeSlotDto(0, datetime.date(1, 1, 1), datetime.time(), datetime.time())
         async with self._factory() as session:
-            result = await session.scalars(query)
-            return [self._selection_mapper.map(row, fields_mapping={'speech.time_slot': dummy_slot}) for row in result]
+            result = await session.execute(self._changing_users_query(current_slot_id, previous_slot_id))
+            return self._map_audience(result.tuples())
+
+    async def stream_changing_users(self, current_slot_id: int, previous_slot_id: int,
+                                    chunk_size: int = STREAM_CHUNK_SIZE):
+        query = (self._changing_users_query(current_slot_id, previous_slot_id)
+                 .with_only_columns(Selection.attendee, Selection.speech_id))
+        async for chunk in self._stream(query, chunk_size):
+            yield chunk
 
     async def get_user_ids_that_selected(self, slot_ids: Iterable[int]):
-        query = (select(Selection.attendee, Selection.time_slot_id).where(Selection.time_slot_id.in_(slot_ids))
-                 .order_by(Selection.attendee))
         async with self._factory() as session:
-            result = await session.execute(query)
+            result = await session.execute(self._user_ids_that_selected_query(slot_ids))
             return result.tuples().all()
 
+    async def stream_user_ids_that_selected(self, slot_ids: Iterable[int], chunk_size: int = STREAM_CHUNK_SIZE):
+        async for chunk in self._stream(self._user_ids_that_selected_query(slot_ids), chunk_size):
+            yield chunk
+
+    def _users_that_selected_query(self, slot_id: int):
+        return (select(Selection.attendee, *SPEECH_COLUMNS).where(Selection.time_slot_id == slot_id)
+                .join(Speech, Selection.speech).join(TimeSlot, Speech.time_slot)
+                .outerjoin(Settings, Selection.attendee == Settings.user_id)
+                .where(Settings.notifications_enabled.is_distinct_from(False)))
+
+    def _changing_users_query(self, current_slot_id: int, previous_slot_id: int):
+        previous_speech = aliased(Speech)
+        previous_selection = aliased(Selection)
+        return (select(Selection.attendee, *SPEECH_COLUMNS)
+                .where(Selection.time_slot_id == current_slot_id)
+                .outerjoin(Settings, Selection.attendee == Settings.user_id)
+                .where(Settings.notifications_enabled.is_distinct_from(False))
+                .outerjoin(previous_selection,
+                           (Selection.attendee == previous_selection.attendee)
+                           & (previous_selection.time_slot_id == previous_slot_id))
+                .join(Speech, Selection.speech).join(TimeSlot, Speech.time_slot)
+                .outerjoin(previous_speech, previous_selection.speech)
+                .where(Speech.location.is_distinct_from(previous_speech.location)))
+
+    def _user_ids_that_selected_query(self, slot_ids: Iterable[int]):
+        return (select(Selection.attendee, Selection.time_slot_id).where(Selection.time_slot_id.in_(slot_ids))
+                .order_by(Selection.attendee, Selection.time_slot_id))
+
+    async def _stream[*Ts](self, query: Select[*Ts], chunk_size: int) -> AsyncIterator[Sequence[Row[*Ts]]]:
+        if self._fetch_before_streaming:
+            async with self._factory() as session:
+                rows = (await session.execute(query)).all()
+            for start in range(0, len(rows), chunk_size):
+                yield rows[start:start + chunk_size]
+            return
+        async with self._factory() as session:
+            result = await session.stream(query.execution_options(yield_per=chunk_size))
+            async for chunk in result.partitions():
+                yield chunk
+
+    def _map_audience(self, rows: Iterable[SelectionRow]):
+        builder = SpeechBuilder(self._timezone)
+        return [builder.build_selection(row) for row in rows]
+
+
+class BufferedSelectionRepository(SelectionRepository):
+    def __init__(self, factory: async_sessionmaker[AsyncSession], conference: ConferenceDto, *,
+                 flush_interval: float = FLUSH_INTERVAL, max_batch: int = MAX_BATCH):
+        super().__init__(factory, conference)
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._pending: dict[tuple[int, int], int | None] = {}
+        self._committing: dict[tuple[int, int], int | None] = {}
+        self._batch: asyncio.Future[None] | None = None
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task[None] | None = None
+
+    async def save_selection(self, user_id: int, slot_id: int, speech_id: int | None):
+        await self.save_selections([(user_id, slot_id, speech_id)])
+
+    async def save_selections(self, selections: Collection[tuple[int, int, int | None]]):
+        # Bulk saves share the buffer too, otherwise an older buffered save could overwrite them
+        if not selections:
+            return
+        for user_id, slot_id, speech_id in selections:
+            self._pending[user_id, slot_id] = speech_id
+        batch = self._batch
+        if batch is None:
+            batch = self._batch = asyncio.get_running_loop().create_future()
+            self._batch_full.clear()
+            self._flush_task = asyncio.create_task(self._flush_after_interval())
+        if len(self._pending) >= self._max_batch:
+            self._batch_full.set()
+        await asyncio.shield(batch)
+
+    async def get_selected_speeches(self, user_id: int, date: datetime.date | None = None):
+        # A batch being committed is no longer pending but not visible yet either, reads wait for both
+        if any(pending_user == user_id for pending_user, _ in itertools.chain(self._pending, self._committing)):
+            await self.flush()
+        return await super().get_selected_speeches(user_id, date)
+
+    async def flush(self):
+        batch = self._batch
+        if batch is not None:
+            self._batch_full.set()
+            await asyncio.shield(batch)
+        else:
+            async with self._flush_lock:
+                pass
+
+    async def _flush_after_interval(self):
+        with contextlib.suppress(TimeoutError):
+            async with asyncio.timeout(self._flush_interval):
+                await self._batch_full.wait()
+        async with self._flush_lock:
+            batch = self._batch
+            pending = self._pending
+            self._batch = None
+            self._pending = {}
+            assert batch is not None
+            self._committing = pending
+            try:
+                await SelectionRepository.save_selections(self, [(*key, speech_id)
+                                                                 for key, speech_id in pending.items()])
+            except Exception as e:
+                self._logger.exception('Failed to save %d buffered selections', len(pending))
+                batch.set_exception(e)
+            else:
+                batch.set_result(None)
+            finally:
+                self._committing = {}
+
 
 class FileRepository:
-    def __init__(self, factory: async_sessionmaker[AsyncSession]):
+    def __init__(self, factory: async_sessionmaker[AsyncSession], conference: ConferenceDto):
         self._factory = factory
+        self._conference_id = conference.id
         self._logger = logging.getLogger(__name__)
 
     async def add_files(self, files: Iterable[tuple[str, Path]]):
         self._logger.info('Adding files')
+        values = [{'conference_id': self._conference_id, 'id': file_id, 'local_path': str(local_path)}
+                  for file_id, local_path in files]
+        if not values:
+            return
         async with self._factory() as session, session.begin():
-            for file_id, local_path in files:
-                file_info = FileInfo(id=file_id, local_path=str(local_path))
-                session.add(file_info)
+            statement = dialect_insert(session, FileInfo)
+            excluded = statement.excluded
+            await session.execute(statement.on_conflict_do_update(index_elements=['conference_id', 'id'], set_={
+                'local_path': excluded.local_path,
+                'telegram_id': case((FileInfo.local_path == excluded.local_path, FileInfo.telegram_id), else_=None),
+            }), values)
 
     async def get_file(self, file_id: str) -> str | Path:
-        statement = select(FileInfo).where(FileInfo.id == file_id)
+        statement = select(FileInfo).where((FileInfo.conference_id == self._conference_id)
+                                           & (FileInfo.id == file_id))
         async with self._factory() as session:
             result = await session.scalar(statement)
             if result is None:
@@ -270,31 +517,196 @@ class FileRepository:
 
     async def set_telegram_id(self, file_id: str, telegram_id: str):
         self._logger.info('Setting telegram id for file %s to %s', file_id, telegram_id)
-        update_query = update(FileInfo).where(FileInfo.id == file_id).values(telegram_id=telegram_id)
+        update_query = (update(FileInfo)
+                        .where((FileInfo.conference_id == self._conference_id) & (FileInfo.id == file_id))
+                        .values(telegram_id=telegram_id))
         async with self._factory() as session, session.begin():
-            updated = await session.execute(update_query)
+            updated = cast('CursorResult[Any]', await session.execute(update_query))
             if not updated.rowcount:
                 msg = f'File with id {file_id} not found'
                 raise ValueError(msg)
 
 
-def _update_speeches_slot_timezone(speeches: Iterable[Speech], timezone: datetime.tzinfo):
-    for speech in speeches:
-        slot = speech.time_slot
-        if slot.start_time.tzinfo is None:
-            slot.start_time = slot.start_time.replace(tzinfo=timezone)
-        if slot.end_time.tzinfo is None:
-            slot.end_time = slot.end_time.replace(tzinfo=timezone)
-
-
-def _update_speech(speech: Speech, dto: SpeechDto):
-    time_slot = dto.time_slot.id
-    assert time_slot is not None
-    if speech.time_slot_id != time_slot:
-        speech.time_slot_id = time_slot
-    if speech.title != dto.title:
-        speech.title = dto.title
-    if speech.speaker != dto.speaker:
-        speech.speaker = dto.speaker
-    if speech.location != dto.location:
-        speech.location = dto.location
+class OutboxRepository:
+    def __init__(self, factory: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+        self._factory = factory
+        self._conference_id = conference.id
+        self._logger = logging.getLogger(__name__)
+
+    async def enqueue(self, key: str, payload: str, chat_ids: Iterable[int], now: datetime.datetime) -> int | None:
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return None
+        self._logger.info('Enqueueing message with key %s for %d chats', key, len(chat_ids))
+        async with self._factory() as session, session.begin():
+            message_id = await self._insert_message(payload, session)
+            await self._insert_entries(key, message_id, chat_ids, now, session)
+            # Every chat already had the key, a payload without entries would never be pruned
+            if not await session.scalar(select(exists().where(OutboxEntry.message_id == message_id))):
+                await session.execute(delete(OutboxMessage).where(OutboxMessage.id == message_id))
+                return None
+        return message_id
+
+    async def add_recipients(self, key: str, message_id: int, chat_ids: Iterable[int], now: datetime.datetime):
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return
+        self._logger.info('Enqueueing message %d with key %s for %d chats', message_id, key, len(chat_ids))
+        async with self._factory() as session, session.begin():
+            await self._insert_entries(key, message_id, chat_ids, now, session)
+
+    async def get_due(self, now: datetime.datetime, limit: int):
+        query = (select(OutboxEntry.chat_id, OutboxEntry.key, OutboxEntry.attempts,
+                        OutboxEntry.message_id, OutboxMessage.payload)
+                 .join(OutboxMessage)
+                 .where((OutboxEntry.conference_id == self._conference_id)
+                        & (OutboxEntry.status == DeliveryStatus.PENDING) & (OutboxEntry.next_attempt <= now))
+                 .order_by(OutboxEntry.next_attempt)
+                 .limit(limit))
+        async with self._factory() as session:
+            result = await session.execute(query)
+            return result.all()
+
+    async def get_next_attempt_time(self):
+        query = select(func.min(OutboxEntry.next_attempt)).where(
+            (OutboxEntry.conference_id == self._conference_id) & (OutboxEntry.status == DeliveryStatus.PENDING))
+        async with self._factory() as session:
+            return await session.scalar(query)
+
+    async def save_results(self, sent: Collection[tuple[int, str]], failed: Collection[tuple[int, str]],
+                           retries: Collection[tuple[int, str, int, datetime.datetime]], now: datetime.datetime):
+        # Finished entries keep the time they finished in next_attempt, prune() goes by it
+        entry_key = tuple_(OutboxEntry.chat_id, OutboxEntry.key)
+        scoped = update(OutboxEntry).where(OutboxEntry.conference_id == self._conference_id)
+        async with self._factory() as session, session.begin():
+            if sent:
+                await session.execute(scoped.where(entry_key.in_(sent))
+                                      .values(status=DeliveryStatus.SENT, next_attempt=now))
+            if failed:
+                await session.execute(scoped.where(entry_key.in_(failed))
+                                      .values(status=DeliveryStatus.FAILED, next_attempt=now))
+            for chat_id, key, attempts, next_attempt in retries:
+                await session.execute(scoped.where((OutboxEntry.chat_id == chat_id) & (OutboxEntry.key == key))
+                                      .values(attempts=attempts, next_attempt=next_attempt))
+
+    async def prune(self, before: datetime.datetime):
+        async with self._factory() as session, session.begin():
+            result = await session.execute(
+                delete(OutboxEntry)
+                .where((OutboxEntry.conference_id == self._conference_id)
+                       & (OutboxEntry.status != DeliveryStatus.PENDING) & (OutboxEntry.next_attempt < before))
+                .returning(OutboxEntry.message_id))
+            removed = result.scalars().all()
+            message_ids = set(removed)
+            if message_ids:
+                in_use = select(OutboxEntry.message_id).where(OutboxEntry.message_id.in_(message_ids))
+                await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(message_ids)
+                                                                  & OutboxMessage.id.not_in(in_use)))
+        return len(removed)
+
+    async def _insert_message(self, payload: str, session: AsyncSession):
+        statement = insert(OutboxMessage).values(conference_id=self._conference_id, payload=payload)
+        message_id = await session.scalar(statement.returning(OutboxMessage.id))
+        assert message_id is not None
+        return message_id
+
+    async def _insert_entries(self, key: str, message_id: int, chat_ids: Iterable[int], now: datetime.datetime,
+                              session: AsyncSession):
+        statement = insert_ignore(session, OutboxEntry)
+        await session.execute(statement, [{'conference_id': self._conference_id, 'chat_id': chat_id, 'key': key,
+                                           'message_id': message_id, 'next_attempt': now} for chat_id in chat_ids])
+
+
+class ConferenceRepository:
+    def __init__(self, factory: async_sessionmaker[AsyncSession]):
+        self._factory = factory
+
+    async def get_or_create(self, name: str, timezone: str, year: int):
+        async with self._factory() as session, session.begin():
+            await session.execute(insert_ignore(session, Conference).values(name=name, timezone=timezone, year=year))
+            conference = await session.scalars(select(Conference).where(Conference.name == name))
+            return _conference_to_dto(conference.one())
+
+
+def _conference_to_dto(conference: Conference):
+    return ConferenceDto(conference.id, conference.name, ZoneInfo(conference.timezone), conference.year)
+
+
+class LeaseRepository:
+    def __init__(self, factory: async_sessionmaker[AsyncSession]):
+        self._factory = factory
+
+    async def try_acquire(self, name: str, holder: str, now: datetime.datetime, expires: datetime.datetime):
+        async with self._factory() as session, session.begin():
+            statement = dialect_insert(session, Lease).values(name=name, holder=holder, expires=expires)
+            await session.execute(statement.on_conflict_do_update(
+                index_elements=['name'],
+                set_={'holder': statement.excluded.holder, 'expires': statement.excluded.expires},
+                where=(Lease.holder == holder) | (Lease.expires < now)))
+            current = await session.scalar(select(Lease.holder).where(Lease.name == name))
+        return current == holder
+
+    async def release(self, name: str, holder: str):
+        async with self._factory() as session, session.begin():
+            await session.execute(delete(Lease).where((Lease.name == name) & (Lease.holder == holder)))
+
+
+class ReminderJobRepository:
+    def __init__(self, factory: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+        self._factory = factory
+        self._conference_id = conference.id
+        self._revision_name = f'{REMINDER_JOBS_REVISION}:{conference.id}'
+
+    async def get_revision(self):
+        async with self._factory() as session:
+            return await session.scalar(select(Revision.value).where(Revision.name == self._revision_name))
+
+    async def save(self, jobs: Collection[ReminderJobDto], revision: int, now: datetime.datetime):
+        async with self._factory() as session, session.begin():
+            if jobs:
+                statement = dialect_insert(session, ReminderJob)
+                same_time = ReminderJob.run_at == statement.excluded.run_at
+                statement = statement.on_conflict_do_update(index_elements=['conference_id', 'id'], set_={
+                    'kind': statement.excluded.kind,
+                    'run_at': statement.excluded.run_at,
+                    'minutes_before_start': statement.excluded.minutes_before_start,
+                    'date': statement.excluded.date,
+                    'slot_id': statement.excluded.slot_id,
+                    'previous_slot_id': statement.excluded.previous_slot_id,
+                    # a job keeps its completion mark unless it was moved
+                    'done': case((same_time, ReminderJob.done), else_=statement.excluded.done),
+                })
+                # Jobs that are already due when first stored belong to the past, not to a missed run
+                await session.execute(statement, [{'conference_id': self._conference_id,
+                                                   **_reminder_job_to_row(job, now)} for job in jobs])
+            await session.execute(delete(ReminderJob).where((ReminderJob.conference_id == self._conference_id)
+                                                            & ReminderJob.id.not_in([job.id for job in jobs])))
+            statement = dialect_insert(session, Revision).values(name=self._revision_name, value=revision)
+            await session.execute(statement.on_conflict_do_update(index_elements=['name'],
+                                                                  set_={'value': statement.excluded.value}))
+
+    async def get_pending(self):
+        query = (select(ReminderJob.id, ReminderJob.kind, ReminderJob.run_at, ReminderJob.minutes_before_start,
+                        ReminderJob.date, ReminderJob.slot_id, ReminderJob.previous_slot_id)
+                 .where((ReminderJob.conference_id == self._conference_id) & ReminderJob.done.is_(False))
+                 .order_by(ReminderJob.run_at))
+        async with self._factory() as session:
+            result = await session.execute(query)
+            return [ReminderJobDto(job_id, kind, run_at.replace(tzinfo=datetime.UTC), minutes, date, slot_id,
+                                   previous_slot_id)
+                    for job_id, kind, run_at, minutes, date, slot_id, previous_slot_id in result]
+
+    async def mark_done(self, job_ids: Collection[str]):
+        if not job_ids:
+            return
+        async with self._factory() as session, session.begin():
+            await session.execute(update(ReminderJob).values(done=True).where(
+                (ReminderJob.conference_id == self._conference_id) & ReminderJob.id.in_(job_ids)))
+
+
+def _reminder_job_to_row(job: ReminderJobDto, now: datetime.datetime):
+    run_at = job.run_at.astimezone(datetime.UTC).replace(tzinfo=None)
+    return {'id': job.id, 'kind': job.kind, 'run_at': run_at, 'minutes_before_start': job.minutes_before_start,
+            'date': job.date, 'slot_id': job.slot_id, 'previous_slot_id': job.previous_slot_id,
+            'done': job.run_at <= now}
+
@@ -0,0 +1,112 @@
+import datetime
+import enum
+import itertools
+from collections.abc import Collection, Iterable, Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Self
+
+from dto import SpeechDto, TimeSlotDto
+
+
+@dataclass(frozen=True)
+class ScheduleSnapshot:
+    version: int
+    slots: tuple[TimeSlotDto, ...]
+    speeches: tuple[SpeechDto, ...]
+    slots_by_date: Mapping[datetime.date, tuple[TimeSlotDto, ...]]
+    slots_by_id: Mapping[int, TimeSlotDto]
+    speeches_by_date: Mapping[datetime.date, tuple[SpeechDto, ...]]
+    speeches_by_slot: Mapping[int, tuple[SpeechDto, ...]]
+    speeches_by_location: Mapping[str, tuple[SpeechDto, ...]]
+    speeches_by_id: Mapping[int, SpeechDto]
+
+    @classmethod
+    def build(cls, version: int, slots: Iterable[TimeSlotDto], speeches: Iterable[SpeechDto]) -> Self:
+        slots = tuple(sorted(slots, key=lambda slot: (slot.date, slot.start_time)))
+        speeches = tuple(sorted(speeches, key=lambda speech: (speech.time_slot.date, speech.location,
+                                                              speech.time_slot.start_time)))
+        by_slot: dict[int, list[SpeechDto]] = {slot.id: [] for slot in slots if slot.id is not None}
+        by_location: dict[str, list[SpeechDto]] = {}
+        for speech in speeches:
+            if speech.time_slot.id is not None:
+                by_slot[speech.time_slot.id].append(speech)
+            by_location.setdefault(speech.location, []).append(speech)
+        return cls(
+            version=version,
+            slots=slots,
+            speeches=speeches,
+            slots_by_date=_freeze({date: tuple(day_slots)
+                                   for date, day_slots in itertools.groupby(slots, lambda slot: slot.date)}),
+            slots_by_id=_freeze({slot.id: slot for slot in slots if slot.id is not None}),
+            speeches_by_date=_freeze({date: tuple(day_speeches) for date, day_speeches
+                                      in itertools.groupby(speeches, lambda speech: speech.time_slot.date)}),
+            speeches_by_slot=_freeze({slot_id: tuple(sorted(slot_speeches, key=lambda speech: speech.location))
+                                      for slot_id, slot_speeches in by_slot.items()}),
+            speeches_by_location=_freeze({location: tuple(sorted(location_speeches, key=_speech_time))
+                                          for location, location_speeches in by_location.items()}),
+            speeches_by_id=_freeze({speech.id: speech for speech in speeches if speech.id is not None}),
+        )
+
+    @property
+    def dates(self):
+        return tuple(self.slots_by_date)
+
+
+class ChangeKind(enum.Enum):
+    ADDED = 'added'
+    REMOVED = 'removed'
+    RETITLED = 'retitled'
+    MOVED_ROOM = 'moved_room'
+    MOVED_TIME = 'moved_time'
+
+
+@dataclass(frozen=True)
+class SpeechChange:
+    kind: ChangeKind
+    speech: SpeechDto
+    previous: SpeechDto | None = None
+
+    @property
+    def slot_ids(self):
+        slots = (self.speech.time_slot, *((self.previous.time_slot,) if self.previous is not None else ()))
+        return {slot.id for slot in slots if slot.id is not None}
+
+
+def diff_schedules(old: ScheduleSnapshot, new: ScheduleSnapshot, slot_ids: Collection[int] | None = None):
+    def by_place(snapshot: ScheduleSnapshot):
+        return {(speech.time_slot.id, speech.location): speech for speech in snapshot.speeches
+                if slot_ids is None or speech.time_slot.id in slot_ids}
+
+    old_speeches = by_place(old)
+    new_speeches = by_place(new)
+    changes: list[SpeechChange] = []
+    for place, speech in new_speeches.items():
+        previous = old_speeches.get(place)
+        if previous is not None and (previous.title, previous.speaker) != (speech.title, speech.speaker):
+            changes.append(SpeechChange(ChangeKind.RETITLED, speech, previous))
+    removed = [speech for place, speech in old_speeches.items() if place not in new_speeches]
+    added = [speech for place, speech in new_speeches.items() if place not in old_speeches]
+    # A talk that disappeared from one place and appeared in another has moved, preferably within its slot
+    for same_slot in (True, False):
+        for previous in list(removed):
+            speech = next((speech for speech in added
+                           if (speech.title, speech.speaker) == (previous.title, previous.speaker)
+                           and (speech.time_slot.id == previous.time_slot.id) == same_slot), None)
+            if speech is not None:
+                kind = ChangeKind.MOVED_ROOM if same_slot else ChangeKind.MOVED_TIME
+                changes.append(SpeechChange(kind, speech, previous))
+                removed.remove(previous)
+                added.remove(speech)
+    changes.extend(SpeechChange(ChangeKind.REMOVED, speech) for speech in removed)
+    changes.extend(SpeechChange(ChangeKind.ADDED, speech) for speech in added)
+    changes.sort(key=lambda change: (_speech_time(change.speech), change.speech.location))
+    return changes
+
+
+def _speech_time(speech: SpeechDto):
+    return speech.time_slot.date, speech.time_slot.start_time
+
+
+def _freeze[K, V](mapping: dict[K, V]) -> Mapping[K, V]:
+    return MappingProxyType(mapping)
@@ -1,11 +1,121 @@
 import logging
+from collections.abc import Callable
 
+from sqlalchemy import Connection, MetaData, Table, UniqueConstraint, delete, insert, inspect, literal, select, text
 from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import AddConstraint
 
-from .tables import Base
+from .tables import (
+    DEFAULT_CONFERENCE_ID,
+    Base,
+    FileInfo,
+    OutboxEntry,
+    OutboxMessage,
+    ReminderJob,
+    SchemaVersion,
+    TimeSlot,
+)
+
+
+def _create_indexes(connection: Connection):
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            # Indexes on columns added by a later migration are created by that migration
+            if all(column.name in columns for column in index.columns):
+                index.create(connection, checkfirst=True)
+
+
+def _add_conferences(connection: Connection):
+    inspector = inspect(connection)
+    if 'conference_id' not in {column['name'] for column in inspector.get_columns(TimeSlot.__tablename__)}:
+        connection.execute(text(f'ALTER TABLE {TimeSlot.__tablename__} '
+                                f'ADD COLUMN conference_id INTEGER NOT NULL DEFAULT {DEFAULT_CONFERENCE_ID}'))
+    if 'conference_id' not in {column['name'] for column in inspector.get_columns(ReminderJob.__tablename__)}:
+        # Stored jobs are derived from the schedule and are rebuilt on the next start
+        table = Base.metadata.tables[ReminderJob.__tablename__]
+        table.drop(connection)
+        table.create(connection)
+    _create_indexes(connection)
+
+
+def _scope_slots_to_conferences(connection: Connection):
+    # Slots were unique by time alone, which stops two conferences from sharing a time
+    table = Base.metadata.tables[TimeSlot.__tablename__]
+    outdated = [constraint for constraint in inspect(connection).get_unique_constraints(table.name)
+                if 'conference_id' not in constraint['column_names']]
+    if not outdated:
+        return
+    if connection.dialect.name != 'sqlite':
+        for constraint in outdated:
+            connection.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT {constraint['name']}'))
+        connection.execute(AddConstraint(next(constraint for constraint in table.constraints
+                                              if isinstance(constraint, UniqueConstraint))))
+        return
+    # SQLite cannot drop a constraint, the table is rebuilt under the same name so references stay valid
+    _rebuild_table(connection, table)
+
+
+def _scope_outbox_and_files_to_conferences(connection: Connection):
+    # Every conference process delivered the whole outbox and shared one files row, the existing rows are
+    # left to the default conference
+    inspector = inspect(connection)
+    if 'conference_id' not in {column['name'] for column in inspector.get_columns(OutboxMessage.__tablename__)}:
+        connection.execute(text(f'ALTER TABLE {OutboxMessage.__tablename__} '
+                                f'ADD COLUMN conference_id INTEGER NOT NULL DEFAULT {DEFAULT_CONFERENCE_ID}'))
+    for name in (OutboxEntry.__tablename__, FileInfo.__tablename__):
+        if 'conference_id' not in {column['name'] for column in inspector.get_columns(name)}:
+            # The conference becomes part of the primary key, which needs a new table on every dialect
+            _rebuild_table(connection, Base.metadata.tables[name], conference_id=DEFAULT_CONFERENCE_ID)
+
+
+def _rebuild_table(connection: Connection, table: Table, **defaults: object):
+    previous = Table(table.name, MetaData(), autoload_with=connection)
+    metadata = MetaData()
+    for referred in table.foreign_key_constraints:
+        assert referred.referred_table is not None
+        referred.referred_table.to_metadata(metadata)
+    rebuilt = table.to_metadata(metadata, name=f'{table.name}_rebuilt')
+    rebuilt.indexes.clear()
+    rebuilt.create(connection)
+    columns = [column.name for column in previous.columns]
+    connection.execute(insert(rebuilt).from_select([*columns, *defaults],
+                                                   select(*previous.columns, *map(literal, defaults.values()))))
+    previous.drop(connection)
+    connection.execute(text(f'ALTER TABLE {rebuilt.name} RENAME TO {table.name}'))
+    _create_indexes(connection)
+
+
+# Each entry upgrades a database from the version equal to its position to the next one
+MIGRATIONS: tuple[Callable[[Connection], None], ...] = (
+    _create_indexes,
+    _add_conferences,
+    _scope_slots_to_conferences,
+    _scope_outbox_and_files_to_conferences,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
 
 
 async def create_tables(engine: AsyncEngine):
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_or_upgrade)
     logging.getLogger(__name__).info('Tables created')
+
+
+def _create_or_upgrade(connection: Connection):
+    logger = logging.getLogger(__name__)
+    existing = inspect(connection).get_table_names()
+    Base.metadata.create_all(connection)
+    if not existing:
+        version = SCHEMA_VERSION
+    elif SchemaVersion.__tablename__ not in existing:
+        version = 0
+    else:
+        version = connection.scalar(select(SchemaVersion.version)) or 0
+    for migration in MIGRATIONS[version:]:
+        logger.info('Upgrading database schema from version %d', version)
+        migration(connection)
+        version += 1
+    connection.execute(delete(SchemaVersion))
+    connection.execute(insert(SchemaVersion).values(version=version))
@@ -1,6 +1,7 @@
 import datetime
+import enum
 
-from sqlalchemy import BigInteger, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 # pylint: disable=too-few-public-methods,unsubscriptable-object
@@ -10,15 +11,28 @@ class Base(DeclarativeBase):
     pass
 
 
+DEFAULT_CONFERENCE_ID = 1
+
+
+class Conference(Base):
+    __tablename__ = 'conferences'
+    id: Mapped[int] = mapped_column(primary_key=True)  # noqa: A003
+    name: Mapped[str] = mapped_column(nullable=False, unique=True)
+    timezone: Mapped[str] = mapped_column(nullable=False)
+    year: Mapped[int] = mapped_column(nullable=False)
+
+
 class TimeSlot(Base):
     __tablename__ = 'time_slots'
     id: Mapped[int] = mapped_column(primary_key=True)  # noqa: A003
+    conference_id: Mapped[int] = mapped_column(ForeignKey('conferences.id'), default=DEFAULT_CONFERENCE_ID)
     date: Mapped[datetime.date] = mapped_column(nullable=False)
     start_time: Mapped[datetime.time] = mapped_column(nullable=False)
     end_time: Mapped[datetime.time] = mapped_column(nullable=False)
 
     __table_args__ = (
-        UniqueConstraint('date', 'start_time', 'end_time'),
+        UniqueConstraint('conference_id', 'date', 'start_time', 'end_time'),
+        Index('ix_time_slots_conference', 'conference_id', 'date'),
     )
 
 
@@ -36,6 +50,18 @@ class Speech(Base):
     )
 
 
+class ScheduleStaging(Base):
+    __tablename__ = 'schedule_staging'
+    batch: Mapped[str] = mapped_column(primary_key=True)
+    row: Mapped[int] = mapped_column(primary_key=True)
+    date: Mapped[datetime.date] = mapped_column(nullable=False)
+    start_time: Mapped[datetime.time] = mapped_column(nullable=False)
+    end_time: Mapped[datetime.time] = mapped_column(nullable=False)
+    location: Mapped[str] = mapped_column(nullable=False)
+    title: Mapped[str | None] = mapped_column()
+    speaker: Mapped[str | None] = mapped_column()
+
+
 class Selection(Base):
     __tablename__ = 'selections'
     attendee: Mapped[int] = mapped_column(BigInteger(), primary_key=True)
@@ -44,17 +70,94 @@ class Selection(Base):
     speech_id: Mapped[int] = mapped_column(ForeignKey('speeches.id'))
     speech: Mapped['Speech'] = relationship()
 
+    __table_args__ = (
+        Index('ix_selections_slot', 'time_slot_id', 'attendee', 'speech_id'),
+        Index('ix_selections_speech', 'speech_id'),
+    )
+
 
 class Settings(Base):
     __tablename__ = 'settings'
     user_id: Mapped[int] = mapped_column(primary_key=True)
-    username: Mapped[str | None]
+    username: Mapped[str | None] = mapped_column(index=True)
     notifications_enabled: Mapped[bool] = mapped_column(default=True)
     admin: Mapped[bool] = mapped_column(default=False)
 
 
 class FileInfo(Base):
     __tablename__ = 'files'
+    conference_id: Mapped[int] = mapped_column(primary_key=True)
     id: Mapped[str] = mapped_column(primary_key=True)  # noqa: A003
     local_path: Mapped[str] = mapped_column(nullable=False)
     telegram_id: Mapped[str | None] = mapped_column()
+
+
+class DeliveryStatus(enum.Enum):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+
+class OutboxMessage(Base):
+    __tablename__ = 'outbox_messages'
+    id: Mapped[int] = mapped_column(primary_key=True)  # noqa: A003
+    conference_id: Mapped[int] = mapped_column(nullable=False)
+    payload: Mapped[str] = mapped_column(nullable=False)
+
+
+class OutboxEntry(Base):
+    __tablename__ = 'outbox'
+    conference_id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger(), primary_key=True)
+    key: Mapped[str] = mapped_column(primary_key=True)
+    message_id: Mapped[int] = mapped_column(ForeignKey('outbox_messages.id'))
+    status: Mapped[DeliveryStatus] = mapped_column(default=DeliveryStatus.PENDING)
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt: Mapped[datetime.datetime] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        Index('ix_outbox_due', 'conference_id', 'status', 'next_attempt'),
+    )
+
+
+class FsmRecord(Base):
+    __tablename__ = 'fsm_states'
+    key: Mapped[str] = mapped_column(primary_key=True)
+    state: Mapped[str | None] = mapped_column()
+    data: Mapped[str] = mapped_column(nullable=False)
+    expires: Mapped[datetime.datetime] = mapped_column(nullable=False, index=True)
+
+
+class ReminderJob(Base):
+    __tablename__ = 'reminder_jobs'
+    conference_id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[str] = mapped_column(primary_key=True)  # noqa: A003
+    kind: Mapped[str] = mapped_column(nullable=False)
+    run_at: Mapped[datetime.datetime] = mapped_column(nullable=False)
+    minutes_before_start: Mapped[int] = mapped_column(nullable=False)
+    date: Mapped[datetime.date | None] = mapped_column()
+    slot_id: Mapped[int | None] = mapped_column()
+    previous_slot_id: Mapped[int | None] = mapped_column()
+    done: Mapped[bool] = mapped_column(default=False)
+
+    __table_args__ = (
+        Index('ix_reminder_jobs_pending', 'done', 'run_at'),
+    )
+
+
+class Lease(Base):
+    __tablename__ = 'leases'
+    name: Mapped[str] = mapped_column(primary_key=True)
+    holder: Mapped[str] = mapped_column(nullable=False)
+    expires: Mapped[datetime.datetime] = mapped_column(nullable=False)
+
+
+class Revision(Base):
+    __tablename__ = 'revisions'
+    name: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[int] = mapped_column(nullable=False)
+
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+    version: Mapped[int] = mapped_column(primary_key=True)
@@ -0,0 +1,26 @@
+from collections.abc import Sequence
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import DeclarativeBase
+
+
+def dialect_insert(session: AsyncSession, entity: type[DeclarativeBase]) -> sqlite.Insert | postgresql.Insert:
+    match session.get_bind().dialect.name:
+        case 'sqlite':
+            return sqlite.insert(entity)
+        case 'postgresql':
+            return postgresql.insert(entity)
+        case name:
+            msg = f'Upserts are not supported for dialect {name}'
+            raise NotImplementedError(msg)
+
+
+def upsert(session: AsyncSession, entity: type[DeclarativeBase], keys: Sequence[str], updates: Sequence[str]):
+    statement = dialect_insert(session, entity)
+    return statement.on_conflict_do_update(index_elements=keys,
+                                           set_={column: statement.excluded[column] for column in updates})
+
+
+def insert_ignore(session: AsyncSession, entity: type[DeclarativeBase]):
+    return dialect_insert(session, entity).on_conflict_do_nothing()
@@ -2,6 +2,14 @@ import datetime
 from dataclasses import dataclass
 
 
+@dataclass(frozen=True)
+class ConferenceDto:
+    id: int  # noqa: A003
+    name: str
+    timezone: datetime.tzinfo
+    year: int
+
+
 @dataclass(frozen=True)
 class TimeSlotDto:
     id: int | None  # noqa: A003
@@ -23,3 +31,14 @@ class SpeechDto:
 class SelectionDto:
     attendee: int
     speech: SpeechDto
+
+
+@dataclass(frozen=True)
+class ReminderJobDto:
+    id: str  # noqa: A003
+    kind: str
+    run_at: datetime.datetime
+    minutes_before_start: int
+    date: datetime.date | None = None
+    slot_id: int | None = None
+    previous_slot_id: int | None = None
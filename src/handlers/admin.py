@@ -1,20 +1,26 @@
-import dataclasses
+import asyncio
+import codecs
+import csv
 import datetime
 import logging
-from collections.abc import Awaitable, Callable, Generator, Iterable, Mapping
-from csv import DictReader
-from io import TextIOWrapper
-from typing import Any, TextIO
-from zoneinfo import ZoneInfo
+import uuid
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from typing import Any
 
-from aiogram import Router
+from aiogram import Bot, Router
 from aiogram.filters import Command
 from aiogram.types import Message, TelegramObject
+from aiogram.utils.formatting import as_section
 from sqlalchemy.exc import IntegrityError
 
 from data.repository import SpeechRepository, UserRepository
-from dto import SpeechDto, TimeSlotDto
-from utility import cast_not_none
+from data.schedule import diff_schedules
+from dto import ConferenceDto, SpeechDto, TimeSlotDto
+from notifications.outbox import Outbox
+from view import notifications
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 500
 
 
 def get_router():
@@ -72,9 +78,7 @@ async def set_admin_handler(message: Message, user_repository: UserRepository):
             logger.info('User %s not found for admin privileges', identifier)
 
 
-async def manual_notify_handler(message: Message):
-    bot = message.bot
-    assert bot is not None
+async def manual_notify_handler(message: Message, outbox: Outbox):
     text = message.text
     assert text
     logger = logging.getLogger(__name__)
@@ -89,19 +93,17 @@ async def manual_notify_handler(message: Message):
         await message.answer('Неверный формат команды. Используйте /notify <IDs> <message>')
         return
     user_ids = text[first_space + 1:second_space]
-    ids = map(int, user_ids.split(','))
     message_text = text[second_space + 1:]
-    logger.info('Sending message to %s: %s', message_text, user_ids)
-    i = 0
     try:
-        for user_id in ids:
-            await bot.send_message(user_id, message_text)
-            i += 1
+        ids = [int(user_id) for user_id in user_ids.split(',')]
     except ValueError:
-        logger.exception('Failed to send message to user')
-        await message.answer(f'Ошибка при отправке сообщения. Проверьте формат ID. Успел отправить {i} сообщений')
+        logger.warning('Invalid user IDs in command %s', text)
+        await message.answer('Ошибка при отправке сообщения. Проверьте формат ID')
         return
-    await message.answer(f'Сообщение отправлено {i} пользователям')
+    logger.info('Sending message to %s: %s', user_ids, message_text)
+    # The outbox delivers at the shared rate limit and keeps retrying across restarts
+    await outbox.enqueue(f'manual:{uuid.uuid4().hex}', {'text': message_text}, ids)
+    await message.answer(f'Сообщение поставлено в очередь для {len(set(ids))} пользователей')
 
 
 async def modify_schedule_handler(message: Message, speech_repository: SpeechRepository,
@@ -117,71 +119,154 @@ async def modify_schedule_handler(message: Message, speech_repository: SpeechRep
         return
     bot = message.bot
     assert bot is not None
-    file_io = await bot.download(file.file_id)
-    assert file_io is not None
-    text_io = TextIOWrapper(file_io, encoding='utf-8')
-    try:
-        slots, speeches, deletes = _parse_csv(text_io)
-    except (ValueError, KeyError):
-        logger.warning('Error parsing CSV file', exc_info=True)
-        await message.answer('Ошибка при обработке файла')
-        return
+    await speech_repository.refresh_schedule()
+    old_schedule = await speech_repository.get_schedule()
+    parser = ScheduleParser(speech_repository.conference, IMPORT_BATCH_SIZE)
+    batch = uuid.uuid4().hex
     try:
+        try:
+            await _stage_document(bot, file.file_id, parser, speech_repository, batch)
+        except (ValueError, KeyError, csv.Error):
+            logger.warning('Error parsing CSV file at line %d', parser.line, exc_info=True)
+            await message.answer(f'Ошибка при обработке файла в строке {parser.line}')
+            return
+        # Applied outside of the parser's error handling, a failure here has nothing to do with a line of the file
         async with speech_repository.get_session() as session, session.begin():
-            slot_mapping = await speech_repository.find_or_create_slots(slots, session)
-            if deletes:
-                logger.info('Deleting %d speeches', len(deletes))
-                to_delete: Generator[tuple[int, str]] = (
-                    (cast_not_none(slot_mapping[entry[0].date, entry[0].start_time, entry[0].end_time].id),
-                     entry[1])
-                    for entry in deletes)
-                await speech_repository.delete_speeches(to_delete, session)
-            if speeches:
-                logger.info('Updating %d speeches', len(speeches))
-                speeches = _update_slots(speeches, slot_mapping)
-                await speech_repository.update_or_insert_speeches(speeches, session)
+            slots = await speech_repository.apply_staged(batch, session)
+            await speech_repository.bump_revision(session)
     except IntegrityError as e:
         logger.exception('Database integrity error')
         await message.answer(f'Ошибка при обновлении расписания: {e.orig}')
         return
-    await message.answer('Расписание обновлено')
-    logger.info('Schedule updated with %d speeches and %d deletes', len(speeches), len(deletes))
-    await schedule_update_callback(slot_mapping.values())
+    finally:
+        # Applied rows are already gone, anything else was left by a failure, including a broken download
+        await _discard(speech_repository, batch)
+    new_schedule = await speech_repository.reload_schedule()
+    changes = diff_schedules(old_schedule, new_schedule, {slot.id for slot in slots if slot.id is not None})
+    await message.answer(**as_section('Расписание обновлено', notifications.render_schedule_diff(changes)).as_kwargs())
+    logger.info('Schedule updated with %d rows, %d visible changes', parser.rows, len(changes))
+    changed_slots = set[int]().union(*(change.slot_ids for change in changes))
+    await schedule_update_callback([slot for slot in slots if slot.id in changed_slots])
+
+
+async def _stream_document(bot: Bot, file_id: str):
+    file = await bot.get_file(file_id)
+    assert file.file_path is not None
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    async for chunk in bot.session.stream_content(url=url, chunk_size=DOWNLOAD_CHUNK_SIZE, raise_for_status=True):
+        yield chunk
+
+
+async def _stage_document(bot: Bot, file_id: str, parser: 'ScheduleParser', speech_repository: SpeechRepository,
+                          batch: str):
+    # Each chunk is parsed in a worker thread and every full batch is staged in its own short transaction,
+    # so neither the file nor a write lock is held while the rest of it is downloaded
+    staged = 0
+    async for chunk in _stream_document(bot, file_id):
+        for speeches, deletes in await asyncio.to_thread(parser.feed, chunk):
+            staged += await _stage(speech_repository, batch, staged, speeches, deletes)
+    for speeches, deletes in await asyncio.to_thread(parser.close):
+        staged += await _stage(speech_repository, batch, staged, speeches, deletes)
+
 
+async def _stage(speech_repository: SpeechRepository, batch: str, first_row: int,
+                 speeches: Sequence[SpeechDto], deletes: Sequence[tuple[TimeSlotDto, str]]):
+    async with speech_repository.get_session() as session, session.begin():
+        return await speech_repository.stage_speeches(batch, first_row, speeches, deletes, session)
 
-def _parse_csv(data: TextIO):
-    slots: dict[tuple[str, str, str], TimeSlotDto] = {}
-    speeches: list[SpeechDto] = []
-    deletes: list[tuple[TimeSlotDto, str]] = []
-    timezone = ZoneInfo('Asia/Novosibirsk')
-    for row in DictReader(data):
+
+async def _discard(speech_repository: SpeechRepository, batch: str):
+    async with speech_repository.get_session() as session, session.begin():
+        await speech_repository.discard_staged(batch, session)
+
+
+class ScheduleParser:
+    # Incremental CSV parser: bytes go in chunk by chunk, validated batches of rows come out
+    def __init__(self, conference: ConferenceDto, batch_size: int):
+        self._conference = conference
+        self._batch_size = batch_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._tail = ''
+        self._record: list[str] = []
+        self._quotes = 0
+        self._header: list[str] | None = None
+        self._slots: dict[tuple[str, str, str], TimeSlotDto] = {}
+        self._speeches: list[SpeechDto] = []
+        self._deletes: list[tuple[TimeSlotDto, str]] = []
+        self.line = 0
+        self.rows = 0
+
+    def feed(self, chunk: bytes):
+        lines = (self._tail + self._decoder.decode(chunk)).split('\n')
+        self._tail = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self):
+        batches = self._parse_lines([self._tail + self._decoder.decode(b'', final=True)])
+        self._tail = ''
+        if self._record:
+            msg = f'Unterminated quoted field at line {self.line}'
+            raise ValueError(msg)
+        if self._speeches or self._deletes:
+            batches.append(self._take_batch())
+        return batches
+
+    def _parse_lines(self, lines: Iterable[str]):
+        batches: list[tuple[list[SpeechDto], list[tuple[TimeSlotDto, str]]]] = []
+        for line in lines:
+            self.line += 1
+            # A record continues on the next line while one of its quoted fields is still open
+            self._record.append(line)
+            self._quotes += line.count('"')
+            if self._quotes % 2:
+                continue
+            record = '\n'.join(self._record)
+            self._record.clear()
+            self._quotes = 0
+            for row in csv.reader((record,)):
+                if row:
+                    self._parse_row(row)
+            if len(self._speeches) + len(self._deletes) >= self._batch_size:
+                batches.append(self._take_batch())
+        return batches
+
+    def _parse_row(self, fields: list[str]):
+        if self._header is None:
+            self._header = fields
+            missing = {'date', 'start_time', 'end_time', 'location', 'title', 'speaker'}.difference(fields)
+            if missing:
+                raise KeyError(', '.join(sorted(missing)))
+            return
+        if len(fields) < len(self._header):
+            msg = f'Line {self.line} has {len(fields)} fields, expected {len(self._header)}'
+            raise ValueError(msg)
+        row = dict(zip(self._header, fields, strict=False))
         date = row['date']
         start_time = row['start_time']
         end_time = row['end_time']
-        if (date, start_time, end_time) not in slots:
-            slots[date, start_time, end_time] = TimeSlotDto(None, _parse_date(
-                date), _parse_time(start_time, timezone), _parse_time(end_time, timezone))
-        slot = slots[date, start_time, end_time]
+        if (date, start_time, end_time) not in self._slots:
+            timezone = self._conference.timezone
+            self._slots[date, start_time, end_time] = TimeSlotDto(None, _parse_date(
+                date, self._conference.year), _parse_time(start_time, timezone), _parse_time(end_time, timezone))
+        slot = self._slots[date, start_time, end_time]
         title = row['title']
         if not title:
-            deletes.append((slot, row['location']))
+            self._deletes.append((slot, row['location']))
         else:
-            speech = SpeechDto(None, row['title'], row['speaker'], slot, row['location'])
-            speeches.append(speech)
-    return slots.values(), speeches, deletes
+            self._speeches.append(SpeechDto(None, title, row['speaker'], slot, row['location']))
+        self.rows += 1
 
+    def _take_batch(self):
+        batch = self._speeches, self._deletes
+        self._speeches = []
+        self._deletes = []
+        return batch
 
-def _parse_date(date_str: str, year: int = 2025):
+
+def _parse_date(date_str: str, year: int):
     return datetime.datetime.strptime(f'{date_str}-{year}', '%d-%m-%Y').replace(tzinfo=datetime.UTC).date()
 
 
 def _parse_time(time_str: str, timezone: datetime.tzinfo):
     return datetime.datetime.strptime(time_str, '%H:%M').replace(tzinfo=timezone).timetz()
 
-
-def _update_slots(speeches: Iterable[SpeechDto],
-                  slot_mapping: Mapping[tuple[datetime.date, datetime.time, datetime.time], TimeSlotDto]):
-    slots = frozenset(speech.time_slot for speech in speeches)
-    mapping = {old_slot: slot_mapping[old_slot.date, old_slot.start_time, old_slot.end_time] for old_slot in slots}
-    return [dataclasses.replace(speech, time_slot=mapping[speech.time_slot])
-            for speech in speeches]
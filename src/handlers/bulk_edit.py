@@ -0,0 +1,237 @@
+import datetime
+import logging
+from collections.abc import Collection, Iterable, Sequence
+
+from aiogram import F, Router
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, InaccessibleMessage, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.utils.formatting import Text
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from data.repository import SelectionRepository, SpeechRepository
+from data.schedule import ScheduleSnapshot
+from dto import TimeSlotDto
+from utility import as_list_section, format_user
+from view import timetable
+
+SELECTED_MARK = '✅ '
+# Telegram rejects inline keyboards with more buttons than this
+MAX_ROW_BUTTONS = 8
+MAX_KEYBOARD_BUTTONS = 100
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def handle_bulk_edit(message: Message, speech_repository: SpeechRepository):
+    _LOGGER.debug('User %s started bulk editing', format_user(message.from_user))
+    keyboard = InlineKeyboardBuilder()
+    for date in await speech_repository.get_all_dates():
+        keyboard.button(text=date.strftime('%d.%m'), callback_data=f'bulk_day#{date.isoformat()}')
+    await message.answer('Какой день хотите настроить?', reply_markup=keyboard.as_markup())
+
+
+async def handle_day_selection(callback: CallbackQuery, speech_repository: SpeechRepository,
+                               selection_repository: SelectionRepository):
+    message = callback.message
+    if message is None or isinstance(message, InaccessibleMessage):
+        await callback.answer('Сообщение устарело')
+        return
+    query = callback.data
+    assert query is not None
+    try:
+        date = datetime.date.fromisoformat(query.split('#')[1])
+    except (IndexError, ValueError):
+        _LOGGER.exception('Invalid date in bulk edit query %s', query)
+        await callback.answer('Что-то пошло не так')
+        return
+    _LOGGER.debug('User %s is bulk editing %s', format_user(callback.from_user), date)
+    await callback.answer()
+    text, markup = await _render_page(speech_repository, selection_repository, callback.from_user.id, date, 0)
+    await message.answer(**text.as_kwargs(), reply_markup=markup)
+
+
+async def handle_pick(callback: CallbackQuery):
+    message = callback.message
+    if message is None or isinstance(message, InaccessibleMessage) or message.reply_markup is None:
+        await callback.answer('Сообщение устарело')
+        return
+    query = callback.data
+    assert query is not None
+    slot_prefix = query.rsplit('#', 1)[0] + '#'
+    rows = [[_toggle(button, query) if _data(button).startswith(slot_prefix) else button for button in row]
+            for row in message.reply_markup.inline_keyboard]
+    await message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    await callback.answer()
+
+
+async def handle_save(callback: CallbackQuery, speech_repository: SpeechRepository,
+                      selection_repository: SelectionRepository):
+    message = callback.message
+    if message is None or isinstance(message, InaccessibleMessage) or message.reply_markup is None:
+        await callback.answer('Сообщение устарело')
+        return
+    if not await _save_choices(callback, message.reply_markup.inline_keyboard, speech_repository,
+                               selection_repository):
+        return
+    await message.edit_reply_markup(reply_markup=None)
+    await callback.answer('Сохранено')
+
+
+async def handle_page(callback: CallbackQuery, speech_repository: SpeechRepository,
+                      selection_repository: SelectionRepository):
+    # The keyboard is the only place unsaved choices live, so they are saved before another page replaces it
+    message = callback.message
+    if message is None or isinstance(message, InaccessibleMessage) or message.reply_markup is None:
+        await callback.answer('Сообщение устарело')
+        return
+    query = callback.data
+    assert query is not None
+    try:
+        _, date_str, page_str = query.split('#')
+        date = datetime.date.fromisoformat(date_str)
+        page = int(page_str)
+    except ValueError:
+        _LOGGER.exception('Invalid page in bulk edit query %s', query)
+        await callback.answer('Что-то пошло не так')
+        return
+    if not await _save_choices(callback, message.reply_markup.inline_keyboard, speech_repository,
+                               selection_repository):
+        return
+    await callback.answer()
+    text, markup = await _render_page(speech_repository, selection_repository, callback.from_user.id, date, page)
+    await message.edit_text(**text.as_kwargs(), reply_markup=markup)
+
+
+async def _save_choices(callback: CallbackQuery, rows: Sequence[Sequence[InlineKeyboardButton]],
+                        speech_repository: SpeechRepository, selection_repository: SelectionRepository):
+    user = callback.from_user
+    choices = read_choices(rows)
+    schedule = await speech_repository.get_schedule()
+    if not all(_is_current(schedule, slot, speech) for slot, speech in choices.items()):
+        _LOGGER.info('User %s tried to save a bulk selection for an outdated schedule', format_user(user))
+        await callback.answer('Расписание изменилось, откройте день заново', show_alert=True)
+        return False
+    _LOGGER.debug('User %s saving bulk selection %s', format_user(user), choices)
+    await selection_repository.save_selections([(user.id, slot, speech) for slot, speech in choices.items()])
+    return True
+
+
+def _is_current(schedule: ScheduleSnapshot, slot_id: int, speech_id: int | None):
+    if slot_id not in schedule.slots_by_id:
+        return False
+    return speech_id is None or any(speech.id == speech_id for speech in schedule.speeches_by_slot[slot_id])
+
+
+async def _render_page(speech_repository: SpeechRepository, selection_repository: SelectionRepository,
+                       user_id: int, date: datetime.date, page: int):
+    schedule = await speech_repository.get_schedule()
+    selected = await selection_repository.get_selected_speeches(user_id, date)
+    pages = paginate_slots(schedule, date)
+    page = min(max(page, 0), len(pages) - 1)
+    return (render_day(schedule, date, pages[page]),
+            build_day_keyboard(schedule, date, {speech.id for speech in selected}, pages, page))
+
+
+async def handle_cancel(callback: CallbackQuery):
+    message = callback.message
+    if isinstance(message, Message):
+        await message.edit_reply_markup(reply_markup=None)
+    await callback.answer('Отменено')
+
+
+async def handle_noop(callback: CallbackQuery):
+    await callback.answer()
+
+
+def render_day(schedule: ScheduleSnapshot, date: datetime.date, slots: Iterable[TimeSlotDto] | None = None):
+    if slots is None:
+        slots = schedule.slots_by_date.get(date, ())
+    sections = (as_list_section(timetable.make_slot_string(slot),
+                                *(timetable.make_entry_string(speech, timetable.EntryFormat.PLACE_ONLY)
+                                  for speech in schedule.speeches_by_slot.get(slot.id, ())))
+                for slot in slots if slot.id is not None)
+    return as_list_section(Text(timetable.make_date_string(date), ':'), *sections)
+
+
+def paginate_slots(schedule: ScheduleSnapshot, date: datetime.date):
+    # Slots are split so that each page fits the keyboard button limit together with the control rows
+    budget = MAX_KEYBOARD_BUTTONS - 4
+    pages: list[list[TimeSlotDto]] = [[]]
+    used = 0
+    for slot in schedule.slots_by_date.get(date, ()):
+        if slot.id is None:
+            continue
+        size = 1 + len(schedule.speeches_by_slot.get(slot.id, ()))
+        if pages[-1] and used + size > budget:
+            pages.append([])
+            used = 0
+        pages[-1].append(slot)
+        used += size
+    return pages
+
+
+def build_day_keyboard(schedule: ScheduleSnapshot, date: datetime.date,
+                       selected: Collection[int | None], pages: Sequence[Sequence[TimeSlotDto]] | None = None,
+                       page: int = 0):
+    if pages is None:
+        pages = paginate_slots(schedule, date)
+    builder = InlineKeyboardBuilder()
+    for slot in pages[page]:
+        assert slot.id is not None
+        buttons = [InlineKeyboardButton(text=f'{slot.start_time:%H:%M}', callback_data='bulk_noop'),
+                   *(InlineKeyboardButton(text=_label(speech.location, speech.id in selected),
+                                          callback_data=f'bulk_pick#{slot.id}#{speech.id}')
+                     for speech in schedule.speeches_by_slot.get(slot.id, ()))]
+        for start in range(0, len(buttons), MAX_ROW_BUTTONS):
+            builder.row(*buttons[start:start + MAX_ROW_BUTTONS])
+    navigation: list[InlineKeyboardButton] = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(text='◀', callback_data=f'bulk_page#{date.isoformat()}#{page - 1}'))
+    if page + 1 < len(pages):
+        navigation.append(InlineKeyboardButton(text='▶', callback_data=f'bulk_page#{date.isoformat()}#{page + 1}'))
+    if navigation:
+        builder.row(*navigation)
+    builder.row(InlineKeyboardButton(text='Сохранить', callback_data='bulk_save'),
+                InlineKeyboardButton(text='Отмена', callback_data='bulk_cancel'))
+    return builder.as_markup()
+
+
+def read_choices(rows: Sequence[Sequence[InlineKeyboardButton]]):
+    choices: dict[int, int | None] = {}
+    for row in rows:
+        for button in row:
+            data = _data(button)
+            if not data.startswith('bulk_pick#'):
+                continue
+            _, slot, speech = data.split('#')
+            if button.text.startswith(SELECTED_MARK):
+                choices[int(slot)] = int(speech)
+            else:
+                choices.setdefault(int(slot), None)
+    return choices
+
+
+def _label(location: str, selected: bool):
+    return SELECTED_MARK + location if selected else location
+
+
+def _data(button: InlineKeyboardButton):
+    return button.callback_data or ''
+
+
+def _toggle(button: InlineKeyboardButton, query: str):
+    location = button.text.removeprefix(SELECTED_MARK)
+    selected = _data(button) == query and not button.text.startswith(SELECTED_MARK)
+    return button.model_copy(update={'text': _label(location, selected)})
+
+
+def get_router():
+    router = Router()
+    router.message.register(handle_bulk_edit, Command('configure_day'))
+    router.callback_query.register(handle_day_selection, F.data.startswith('bulk_day#'))
+    router.callback_query.register(handle_pick, F.data.startswith('bulk_pick#'))
+    router.callback_query.register(handle_save, F.data == 'bulk_save')
+    router.callback_query.register(handle_page, F.data.startswith('bulk_page#'))
+    router.callback_query.register(handle_cancel, F.data == 'bulk_cancel')
+    router.callback_query.register(handle_noop, F.data == 'bulk_noop')
+    return router
@@ -1,10 +1,8 @@
 import datetime
-import itertools
 import logging
 import textwrap
 import typing
 from pathlib import Path
-from zoneinfo import ZoneInfo
 
 from aiogram import F, Router
 from aiogram.filters import Command, CommandStart
@@ -14,7 +12,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
 from data.repository import FileRepository, SpeechRepository, UserRepository
 from utility import format_user
-from view import timetable
+from view.cache import TimetableCache
 
 SCHEDULE_FILE_KEY = 'schedule'
 
@@ -37,6 +35,7 @@ async def handle_start(message: Message, state: FSMContext):
     Это бот, предоставляющий информацию о мероприятиях. Команды:
     /schedule - список всех мероприятий
     /configure - настройка персональной программы
+    /configure_day - настройка программы на день одной таблицей
     /personal - ваша персональная программа
     /settings - настройки уведомлений
     /start - показать это сообщение, сбросить состояние и клавиатуру
@@ -55,7 +54,7 @@ async def handle_schedule(message: Message, speech_repository: SpeechRepository)
 
 
 async def handle_schedule_selection(callback: CallbackQuery, speech_repository: SpeechRepository,
-                                    file_repository: FileRepository):
+                                    file_repository: FileRepository, timetable_cache: TimetableCache):
     message = callback.message
     if message is None or isinstance(message, InaccessibleMessage):
         await callback.answer('Сообщение устарело')
@@ -63,7 +62,7 @@ async def handle_schedule_selection(callback: CallbackQuery, speech_repository:
     query = callback.data
     assert query is not None
     command = query.split('#')
-    timezone = ZoneInfo('Asia/Novosibirsk')
+    timezone = speech_repository.conference.timezone
     _LOGGER.debug('User %s requested general schedule with query %s', format_user(callback.from_user), query)
     match command[0]:
         case 'show_general_all':
@@ -85,15 +84,13 @@ async def handle_schedule_selection(callback: CallbackQuery, speech_repository:
             _LOGGER.error('Received unknown general command %s', query)
             await callback.answer('Что-то пошло не так')
             return
-    speeches = await speech_repository.get_all_speeches(date)
+    rendered = timetable_cache.get(await speech_repository.get_schedule(), date)
     await callback.answer()
-    if not speeches:
+    if not rendered:
         await message.answer('Ничего не найдено')
     else:
-        days = ((day, itertools.groupby(locations, lambda x: x.location))
-                for day, locations in itertools.groupby(speeches, lambda x: x.time_slot.date))
-        for text in timetable.render_timetable(days, False):
-            await message.answer(**text.as_kwargs())
+        for kwargs in rendered:
+            await message.answer(**kwargs)
 
 
 async def _send_full_schedule(message: Message, file_repository: FileRepository):
@@ -1,7 +1,8 @@
+import datetime
 import itertools
 import logging
-from collections.abc import Iterable, Sequence
-from typing import TYPE_CHECKING, Any
+from collections.abc import Sequence
+from typing import Any
 
 from aiogram import F, Router
 from aiogram.filters import Command, and_f
@@ -16,11 +17,6 @@ from handlers import general
 from utility import as_list_section, format_user
 from view import timetable
 
-if TYPE_CHECKING:
-    import datetime
-
-    from dto import SpeechDto
-
 
 class Intention:  # pylint: disable=too-few-public-methods
     ALL = 'Все'
@@ -73,29 +69,25 @@ class SelectDayScene(Scene, state='selectDay'):
     _logger = logging.getLogger(__name__)
 
     @on.message.enter()
-    async def on_enter(self, message: Message, state: FSMContext, speech_repository: SpeechRepository):
+    async def on_enter(self, message: Message, speech_repository: SpeechRepository):
         self._logger.debug('User %s started selecting day', format_user(message.from_user))
         days = await speech_repository.get_all_dates()
         keyboard = ReplyKeyboardBuilder()
         for day in days:
             keyboard.button(text=day.strftime('%d.%m'))
         answer = as_list_section('Возможные варианты:', *map(timetable.make_date_string_underline, days))
-        await state.update_data(days={day.strftime('%d.%m'): day for day in days}
-                                | {str(i + 1): day for i, day in enumerate(days)})
         await message.answer(**answer.as_kwargs(), reply_markup=keyboard.as_markup())
 
     @on.message(F.text)
-    async def on_message(self, message: Message, state: FSMContext, speech_repository: SpeechRepository):
+    async def on_message(self, message: Message, speech_repository: SpeechRepository):
         self._logger.debug('User %s selected day %s', format_user(message.from_user), message.text)
         text = message.text
         assert text is not None
-        days: dict[str, datetime.date] | None = await state.get_value('days')
-        assert days is not None
-        if text not in days:
+        date = _parse_day(text, await speech_repository.get_all_dates())
+        if date is None:
             self._logger.warning('User %s selected invalid day %s', format_user(message.from_user), message.text)
             await message.answer('Выберете из доступных дней')
             return
-        date = days[text]
         slots = await speech_repository.get_slot_ids_on_day(date)
         await self.wizard.goto(EditingScene, slots=slots)
 
@@ -165,7 +157,7 @@ class EditingScene(Scene, state='editing'):
         for option in options:
             inline_keyboard.button(text=option.location, callback_data=f'select#{slot.id}#{option.id}')
         inline_keyboard.button(text=NOTHING_OPTION, callback_data=f'select#{slot.id}#-1')
-        await state.update_data(slots=slots, options=options)
+        await state.update_data(slots=list(slots))
         await message.answer(**slot_string.as_kwargs(), reply_markup=reply_keyboard.as_markup())
         await message.answer(**answer.as_kwargs(), reply_markup=inline_keyboard.as_markup())
 
@@ -194,7 +186,8 @@ class EditingScene(Scene, state='editing'):
         await self.wizard.retake(slots=slots[1:])
 
     @on.message(F.text)
-    async def on_message(self, message: Message, state: FSMContext, selection_repository: SelectionRepository):
+    async def on_message(self, message: Message, state: FSMContext, selection_repository: SelectionRepository,
+                         speech_repository: SpeechRepository):
         location = message.text
         if location == NOTHING_OPTION:
             await self.on_nothing(message, state, selection_repository)
@@ -205,9 +198,9 @@ class EditingScene(Scene, state='editing'):
             await self.wizard.exit()
             return
         selection = None
-        data = await state.get_data()
-        options: Iterable[SpeechDto] = data['options']
-        slots: Sequence[int] = data['slots']
+        slots: Sequence[int] | None = await state.get_value('slots')
+        assert slots is not None
+        _, options = await speech_repository.get_in_time_slot(slots[0])
         user = message.from_user
         assert user is not None
         self._logger.debug('User %s selected location "%s" for slot %d', format_user(user), location, slots[0])
@@ -237,6 +230,13 @@ class EditingScene(Scene, state='editing'):
         await message.answer('Выберете значение из списка')
 
 
+def _parse_day(text: str, days: Sequence[datetime.date]):
+    for i, day in enumerate(days):
+        if text in {day.strftime('%d.%m'), str(i + 1)}:
+            return day
+    return None
+
+
 async def handle_selection_query(callback: CallbackQuery, selection_repository: SelectionRepository):
     query = callback.data
     assert query is not None
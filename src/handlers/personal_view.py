@@ -1,7 +1,6 @@
 import datetime
 import itertools
 import logging
-from zoneinfo import ZoneInfo
 
 from aiogram import F, Router
 from aiogram.filters import Command
@@ -33,7 +32,7 @@ async def handle_personal_view_selection(callback: CallbackQuery, selection_repo
     query = callback.data
     assert query is not None
     command = query.split('#')
-    timezone = ZoneInfo('Asia/Novosibirsk')
+    timezone = selection_repository.conference.timezone
     _LOGGER.debug('User %s requested personal schedule with query %s', format_user(callback.from_user), query)
     match command[0]:
         case 'show_personal_all':
@@ -59,8 +58,8 @@ async def handle_personal_view_selection(callback: CallbackQuery, selection_repo
         await message.answer('Вы не выбрали ни одной записи')
         return
     days = itertools.groupby(speeches, lambda x: x.time_slot.date)
-    for day_schedule in timetable.render_personal(days):
-        await message.answer(**day_schedule.as_kwargs())
+    for text in timetable.pack_messages(timetable.render_personal(days)):
+        await message.answer(**text.as_kwargs())
 
 
 def get_router():
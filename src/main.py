@@ -1,6 +1,8 @@
 import asyncio
+import datetime
 import logging
 import logging.config
+import multiprocessing
 import os
 import secrets
 from collections.abc import Awaitable, Callable, Iterable
@@ -11,22 +13,39 @@ from typing import Any
 
 from aiogram import Bot, Dispatcher
 from aiogram.types import FSInputFile
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
-from aiohttp import web
-from apscheduler.schedulers.asyncio import AsyncIOScheduler  # type: ignore
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
+import data.engine
 import data.mock_data
 import data.setup
 import handlers.admin
+import handlers.bulk_edit
 import handlers.general
 import handlers.middleware
 import handlers.personal_edit
 import handlers.personal_view
 import handlers.settings
-from data.repository import FileRepository, SelectionRepository, SpeechRepository, UserRepository
+from data.fsm_storage import DatabaseStorage
+from data.repository import (
+    BufferedSelectionRepository,
+    ConferenceRepository,
+    FileRepository,
+    LeaseRepository,
+    OutboxRepository,
+    ReminderJobRepository,
+    SelectionRepository,
+    SpeechRepository,
+    UserRepository,
+)
 from dto import TimeSlotDto
 from notifications import changed, event_start
+from notifications.leader import LeaderElection
+from notifications.outbox import IDLE_POLL_INTERVAL, Outbox
+from notifications.planner import AudiencePlanner
+from notifications.sender import MessageSender
+from view.cache import TimetableCache
+
+SCHEDULE_POLL_INTERVAL = 5.0
 
 
 def configure_async_logging():
@@ -40,12 +59,16 @@ def configure_async_logging():
     return listener
 
 
-async def main():
+def configure_logging():
     log_config_path = Path(os.getenv('LOG_CONFIG', 'logging.ini'))
     if log_config_path.exists():
         logging.config.fileConfig(log_config_path, disable_existing_loggers=False)
     else:
         logging.basicConfig(level=logging.DEBUG)
+
+
+async def main():
+    configure_logging()
     token = os.getenv('TELEGRAM_TOKEN')
     logger = logging.getLogger(__name__)
     if token is None:
@@ -53,74 +76,228 @@ async def main():
         return
     listener = configure_async_logging()
     try:
-        await setup_and_run_bot(token, logger)
+        workers = int(os.getenv('WEBHOOK_WORKERS', '1'))
+        webhook_url = os.getenv('WEBHOOK_URL')
+        if workers > 1 and webhook_url:
+            await run_workers(token, webhook_url, workers, logger)
+        else:
+            await setup_and_run_bot(token)
     finally:
         listener.stop()
 
 
-async def setup_and_run_bot(token: str, logger: logging.Logger):
-    engine = create_async_engine(os.getenv('DATABASE_URL', 'sqlite+aiosqlite:///:memory:'))
-    session_maker = async_sessionmaker(engine)
+async def run_workers(token: str, webhook_url: str, workers: int, logger: logging.Logger):
+    database_url = os.getenv('DATABASE_URL')
+    if database_url is None or ':memory:' in database_url:
+        logger.critical('Webhook workers need a shared database, set DATABASE_URL')
+        return
+    engine = data.engine.create_engine(database_url)
+    await init_database(engine)
+    await engine.dispose()
+
+    bot = Bot(token)
+    webhook_secret = await register_webhook(bot, webhook_url)
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(webhook_secret,), name=f'worker-{i}')
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    logger.info('Started %d webhook workers', workers)
+    try:
+        await asyncio.gather(*(asyncio.to_thread(process.join) for process in processes))
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        await bot.delete_webhook()
+        await bot.session.close()
+
+
+def run_worker(webhook_secret: str):
+    configure_logging()
+    token = os.environ['TELEGRAM_TOKEN']
+    listener = configure_async_logging()
+    try:
+        asyncio.run(setup_and_run_bot(token, webhook_secret))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+
+
+async def init_database(engine: AsyncEngine):
     await data.setup.create_tables(engine)
     if os.getenv('FILL_MOCK_DATA') == '1':
-        await data.mock_data.fill_tables(session_maker)
+        await data.mock_data.fill_tables(async_sessionmaker(engine))
+
+
+async def load_conference(session_maker: async_sessionmaker[AsyncSession]):
+    conference = await ConferenceRepository(session_maker).get_or_create(
+        os.getenv('CONFERENCE', 'default'), os.getenv('CONFERENCE_TIMEZONE', 'Asia/Novosibirsk'),
+        int(os.getenv('CONFERENCE_YEAR', str(datetime.datetime.now(datetime.UTC).year))))
+    logging.getLogger(__name__).info('Serving conference %s (%s)', conference.name, conference.timezone)
+    return conference
+
+
+async def setup_and_run_bot(token: str, webhook_secret: str | None = None):
+    worker = webhook_secret is not None
+    engine = data.engine.create_engine(os.getenv('DATABASE_URL', 'sqlite+aiosqlite:///:memory:'))
+    session_maker = async_sessionmaker(engine)
+    if not worker:
+        await init_database(engine)
 
-    speech_repository = SpeechRepository(session_maker)
-    selection_repository = SelectionRepository(session_maker)
-    user_repository = UserRepository(session_maker)
-    file_repository = FileRepository(session_maker)
-    general_schedule_path = Path(os.getenv('GENERAL_SCHEDULE_PATH', 'files/general.pdf'))
-    await file_repository.add_files(((handlers.general.SCHEDULE_FILE_KEY, general_schedule_path),))
+    conference = await load_conference(session_maker)
+    speech_repository = SpeechRepository(session_maker, conference)
+    selection_repository = (BufferedSelectionRepository(session_maker, conference)
+                            if os.getenv('SELECTION_WRITE_BUFFER') == '1'
+                            else SelectionRepository(session_maker, conference))
+    user_repository = UserRepository(session_maker, shared=worker)
+    file_repository = FileRepository(session_maker, conference)
+    timetable_cache = TimetableCache()
+    timetable_cache.warm_up(await load_startup_data(session_maker, speech_repository, user_repository,
+                                                    file_repository))
 
     bot = Bot(token)
-    dispatcher = Dispatcher(speech_repository=speech_repository, selection_repository=selection_repository,
-                            user_repository=user_repository, file_repository=file_repository)
+    # A worker's /notify reaches the leader only through the database
+    outbox = Outbox(OutboxRepository(session_maker, conference),
+                    MessageSender(bot, max_concurrency=int(os.getenv('SEND_CONCURRENCY', '16'))),
+                    poll_interval=SCHEDULE_POLL_INTERVAL if worker else IDLE_POLL_INTERVAL)
+    dispatcher = Dispatcher(storage=DatabaseStorage(session_maker, shared=worker),
+                            speech_repository=speech_repository, selection_repository=selection_repository,
+                            user_repository=user_repository, file_repository=file_repository,
+                            outbox=outbox, timetable_cache=timetable_cache)
+    planner = AudiencePlanner(speech_repository, selection_repository, user_repository, shared=worker)
+    include_handlers(dispatcher)
+
+    scheduler = create_scheduler()
+    leadership = LeaderElection(LeaseRepository(session_maker), f'scheduler:{conference.id}')
+
+    job_repository = ReminderJobRepository(session_maker, conference)
+
+    def scheduler_callback():
+        return event_start.configure_events(scheduler, speech_repository, planner, outbox, 5, job_repository)
+
+    async def lead():
+        await event_start.restore_events(scheduler, speech_repository, planner, outbox, 5, job_repository,
+                                         datetime.timedelta(minutes=int(os.getenv('REMINDER_CATCH_UP_MINUTES', '10'))))
+        scheduler.start()
+        try:
+            await outbox.run()
+        finally:
+            scheduler.shutdown(wait=False)
+
+    async def change_callback(slots: Iterable[TimeSlotDto]):
+        timetable_cache.warm_up(await speech_repository.get_schedule())
+        if leadership.is_leader:
+            await scheduler_callback()
+        await changed.notify_schedule_change(outbox, selection_repository, slots)
+
+    async def external_change_callback():
+        timetable_cache.warm_up(await speech_repository.get_schedule())
+        if leadership.is_leader:
+            await scheduler_callback()
+            outbox.wake()
+
+    background = [asyncio.create_task(leadership.run(lead)),
+                  asyncio.create_task(watch_schedule(speech_repository, external_change_callback))]
+    try:
+        await serve(bot, dispatcher, change_callback, webhook_secret)
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.wait(background)
+        if isinstance(selection_repository, BufferedSelectionRepository):
+            await selection_repository.flush()
+
+
+async def load_startup_data(session_maker: async_sessionmaker[AsyncSession], speech_repository: SpeechRepository,
+                            user_repository: UserRepository, file_repository: FileRepository):
+    files = ((handlers.general.SCHEDULE_FILE_KEY, Path(os.getenv('GENERAL_SCHEDULE_PATH', 'files/general.pdf'))),)
+    if data.engine.has_single_connection(session_maker):
+        # The write goes first, an in-memory database has a single connection for the reads to share
+        await file_repository.add_files(files)
+        _, schedule = await asyncio.gather(user_repository.load_admins(), speech_repository.get_schedule())
+    else:
+        _, _, schedule = await asyncio.gather(file_repository.add_files(files), user_repository.load_admins(),
+                                              speech_repository.get_schedule())
+    return schedule
+
+
+def create_scheduler():
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler  # type: ignore # noqa: PLC0415
+
+    return AsyncIOScheduler(job_defaults={'misfire_grace_time': 60})
+
+
+def include_handlers(dispatcher: Dispatcher):
     dispatcher.include_router(handlers.general.get_router())
     dispatcher.include_router(handlers.personal_view.get_router())
+    dispatcher.include_router(handlers.bulk_edit.get_router())
     dispatcher.include_router(handlers.settings.get_router())
     dispatcher.include_router(handlers.admin.get_router())
     handlers.personal_edit.init(dispatcher)
     handlers.middleware.init_middleware(dispatcher)
 
-    scheduler = AsyncIOScheduler(job_defaults={'misfire_grace_time': 60})
 
-    def scheduler_callback():
-        return event_start.configure_events(scheduler, speech_repository, selection_repository,
-                                            bot, 5)
-    await scheduler_callback()
-    scheduler.start()
+async def watch_schedule(speech_repository: SpeechRepository, change_callback: Callable[[], Awaitable[Any]]):
+    logger = logging.getLogger(__name__)
+    while True:
+        await asyncio.sleep(SCHEDULE_POLL_INTERVAL)
+        try:
+            if await speech_repository.refresh_schedule():
+                logger.info('Schedule was changed by another process')
+                await change_callback()
+        except Exception:
+            logger.exception('Failed to refresh the schedule')
 
-    async def change_callback(slots: Iterable[TimeSlotDto]):
-        await scheduler_callback()
-        await changed.notify_schedule_change(bot, selection_repository, slots)
 
+async def serve(bot: Bot, dispatcher: Dispatcher,
+                change_callback: Callable[[Iterable[TimeSlotDto]], Awaitable[Any]], webhook_secret: str | None):
+    if webhook_secret is not None:
+        await run_webhook(bot, dispatcher, change_callback, webhook_secret, reuse_port=True)
+        return
     webhook_url = os.getenv('WEBHOOK_URL')
-    if webhook_url:
-        await run_webhook(bot, dispatcher, change_callback, webhook_url)
-    else:
-        logger.info('Starting polling')
+    if not webhook_url:
+        logging.getLogger(__name__).info('Starting polling')
         await dispatcher.start_polling(bot, schedule_update_callback=change_callback)  # type: ignore
+        return
+    webhook_secret = await register_webhook(bot, webhook_url)
+    try:
+        await run_webhook(bot, dispatcher, change_callback, webhook_secret)
+    finally:
+        await bot.delete_webhook()
+
+
+async def register_webhook(bot: Bot, webhook_url: str):
+    logging.getLogger(__name__).info('Setting up webhook on %s', webhook_url)
+    webhook_path = os.getenv('WEBHOOK_PATH', '/webhook')
+    webhook_secret = secrets.token_urlsafe(64)
+    certificate_path = os.getenv('WEBHOOK_CERT')
+    certificate_file = FSInputFile(certificate_path) if certificate_path else None
+    await bot.set_webhook(webhook_url + webhook_path, certificate_file, secret_token=webhook_secret)
+    return webhook_secret
 
 
 async def run_webhook(bot: Bot, dispatcher: Dispatcher,
-                      change_callback: Callable[[Iterable[TimeSlotDto]], Awaitable[Any]], webhook_url: str):
+                      change_callback: Callable[[Iterable[TimeSlotDto]], Awaitable[Any]], webhook_secret: str,
+                      reuse_port: bool = False):
+    # only webhook mode needs the aiohttp server
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application  # noqa: PLC0415
+    from aiohttp import web  # noqa: PLC0415
+
     logger = logging.getLogger(__name__)
-    logger.info('Setting up webhook on %s', webhook_url)
     webhook_host = os.getenv('WEBHOOK_HOST', '127.0.0.1')
     webhook_port = int(os.getenv('WEBHOOK_PORT', '8080'))
     webhook_path = os.getenv('WEBHOOK_PATH', '/webhook')
-    webhook_secret = secrets.token_urlsafe(64)
     handler = SimpleRequestHandler(dispatcher, bot, secret_token=webhook_secret,
                                    schedule_update_callback=change_callback)
     app = web.Application()
     handler.register(app, path=webhook_path)
     setup_application(app, dispatcher)
-    certificate_path = os.getenv('WEBHOOK_CERT')
-    certificate_file = FSInputFile(certificate_path) if certificate_path else None
-    await bot.set_webhook(webhook_url + webhook_path, certificate_file, secret_token=webhook_secret)
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, webhook_host, webhook_port)
+    # workers started by run_workers share the port, the kernel spreads connections between them
+    site = web.TCPSite(runner, webhook_host, webhook_port, reuse_port=reuse_port)
     await site.start()
     logger.info('Webhook server started')
     try:
@@ -130,7 +307,6 @@ async def run_webhook(bot: Bot, dispatcher: Dispatcher,
     finally:
         await site.stop()
         await runner.cleanup()
-        await bot.delete_webhook()
 
 
 if __name__ == '__main__':
@@ -1,22 +1,44 @@
-import asyncio
 import itertools
 import operator
-from collections.abc import Iterable
-
-from aiogram import Bot
+import uuid
+from collections.abc import Iterable, Sequence
 
 from data.repository import SelectionRepository
 from dto import TimeSlotDto
+from notifications.outbox import Outbox
+from utility import pipeline
 from view import notifications
 
 
-async def notify_schedule_change(bot: Bot, selection_repository: SelectionRepository,
+async def notify_schedule_change(outbox: Outbox, selection_repository: SelectionRepository,
                                  changed_slots: Iterable[TimeSlotDto]):
     slot_mapping = {slot.id: slot for slot in changed_slots if slot.id is not None}
-    selections = await selection_repository.get_user_ids_that_selected(slot_mapping.keys())
-    grouped = itertools.groupby(selections, operator.itemgetter(0))
-    for i, (user, selection) in enumerate(grouped, 1):
-        message = notifications.render_changed(slot_mapping[slot_id] for _, slot_id in selection)
-        await bot.send_message(user, **message.as_kwargs())
-        if not i % 24:
-            await asyncio.sleep(1)
+    key = f'changed:{uuid.uuid4().hex}'
+    message_ids: dict[tuple[int, ...], int] = {}
+    pending: list[tuple[int, int]] = []
+
+    async def enqueue(rows: Iterable[tuple[int, int]]):
+        audiences: dict[tuple[int, ...], list[int]] = {}
+        for user, selection in itertools.groupby(rows, operator.itemgetter(0)):
+            audiences.setdefault(tuple(slot_id for _, slot_id in selection), []).append(user)
+        for slot_ids, users in audiences.items():
+            if slot_ids in message_ids:
+                await outbox.add_recipients(key, message_ids[slot_ids], users)
+            else:
+                message = notifications.render_changed(slot_mapping[slot_id] for slot_id in slot_ids)
+                message_id = await outbox.enqueue(key, message.as_kwargs(), users)
+                if message_id is not None:
+                    message_ids[slot_ids] = message_id
+
+    async def enqueue_complete_users(chunk: Sequence[tuple[int, int]]):
+        # rows are ordered by user, so the last user of a chunk may continue in the next one
+        nonlocal pending
+        rows = [*pending, *chunk]
+        split = len(rows)
+        while split > 0 and rows[split - 1][0] == rows[-1][0]:
+            split -= 1
+        pending = rows[split:]
+        await enqueue(rows[:split])
+
+    await pipeline(selection_repository.stream_user_ids_that_selected(slot_mapping.keys()), enqueue_complete_users)
+    await enqueue(pending)
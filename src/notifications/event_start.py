@@ -1,54 +1,208 @@
-import asyncio
 import datetime
-import itertools
 import logging
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from typing import TYPE_CHECKING, Any, NamedTuple, Protocol, cast
 
-from aiogram import Bot
-from apscheduler.schedulers.base import BaseScheduler  # type: ignore
-
-from data.repository import SelectionRepository, SpeechRepository
+from data.repository import ReminderJobRepository, SpeechRepository
+from data.schedule import ScheduleSnapshot
+from dto import ReminderJobDto
+from notifications.outbox import Outbox
+from notifications.planner import AudiencePlanner
+from utility import pipeline
 from view import notifications
 
+if TYPE_CHECKING:
+    from apscheduler.schedulers.base import BaseScheduler  # type: ignore
+
+PLANNING_ADVANCE = datetime.timedelta(minutes=30)
+CATCH_UP_WINDOW = datetime.timedelta(minutes=10)
+JOB_PREFIXES = ('plan:', 'reminder:')
+
+
+class _DateTrigger(Protocol):
+    run_date: datetime.datetime
+
+
+class _ScheduledJob(Protocol):
+    # The part of apscheduler's untyped Job that is used here
+    id: str
+    func: Callable[..., Awaitable[object]]
+    args: tuple[Any, ...]
+    trigger: _DateTrigger
+
+    def modify(self, **changes: Any) -> object: ...  # noqa: ANN401
+
+    def reschedule(self, trigger: str, **trigger_args: Any) -> object: ...  # noqa: ANN401
+
+    def remove(self) -> None: ...
+
+
+class _Job(NamedTuple):
+    func: Callable[..., Awaitable[object]]
+    args: tuple[Any, ...]
+    run_date: datetime.datetime
+
+
+async def configure_events(scheduler: 'BaseScheduler', speech_repository: SpeechRepository,  # noqa: PLR0913, PLR0917
+                           planner: AudiencePlanner, outbox: Outbox, minutes_before_start: int,
+                           job_repository: ReminderJobRepository | None = None):
+    schedule = await speech_repository.get_schedule()
+    now = datetime.datetime.now(datetime.UTC)
+    specs, to_plan = _collect_jobs(schedule, planner, minutes_before_start, now)
+    if job_repository is not None:
+        await job_repository.save(specs, await speech_repository.get_revision(), now)
+    jobs = {spec.id: _to_job(spec, planner, outbox, job_repository) for spec in specs}
+    # No awaits until all jobs are updated, so no job can fire against a half-updated set
+    mutations = _apply_jobs(scheduler, jobs, now)
+    for date in to_plan:
+        await planner.plan_day(date)
+    logging.getLogger(__name__).info('Notifications rescheduled: %d added, %d changed, %d removed', *mutations)
+
+
+async def restore_events(scheduler: 'BaseScheduler', speech_repository: SpeechRepository,  # noqa: PLR0913, PLR0917
+                         planner: AudiencePlanner, outbox: Outbox, minutes_before_start: int,
+                         job_repository: ReminderJobRepository, catch_up_window: datetime.timedelta = CATCH_UP_WINDOW):
+    logger = logging.getLogger(__name__)
+    schedule = await speech_repository.get_schedule()
+    now = datetime.datetime.now(datetime.UTC)
+    pending = None
+    if await job_repository.get_revision() == await speech_repository.get_revision():
+        pending = await job_repository.get_pending()
+        if any(spec.minutes_before_start != minutes_before_start for spec in pending):
+            pending = None
+    if pending is None:
+        logger.info('Stored notification jobs are outdated, rebuilding them')
+        await configure_events(scheduler, speech_repository, planner, outbox, minutes_before_start, job_repository)
+        pending = await job_repository.get_pending()
+    else:
+        _, to_plan = _collect_jobs(schedule, planner, minutes_before_start, now)
+        mutations = _apply_jobs(scheduler, {spec.id: _to_job(spec, planner, outbox, job_repository)
+                                            for spec in pending}, now)
+        for date in to_plan:
+            await planner.plan_day(date)
+        logger.info('Notifications restored: %d added, %d changed, %d removed', *mutations)
 
-async def configure_events(scheduler: BaseScheduler, speech_repository: SpeechRepository,
-                           selection_repository: SelectionRepository, bot: Bot, minutes_before_start: int):
-    slots = await speech_repository.get_all_slots()
-    scheduler.remove_all_jobs()  # pyright: ignore[reportUnknownMemberType]
-    for date, day_slots in itertools.groupby(slots, key=lambda slot: slot.date):
-        prev_slot = next(day_slots)
-        prev_id = prev_slot.id
-        assert prev_id is not None
-        execution_time = (datetime.datetime.combine(date, prev_slot.start_time)
-                          - datetime.timedelta(minutes=minutes_before_start))
-        scheduler.add_job(notify_first, 'date',  # pyright: ignore[reportUnknownMemberType]
-                          (bot, selection_repository, prev_id, minutes_before_start), run_date=execution_time)
-        for slot in day_slots:  # noqa: B031
-            current_id = slot.id
-            assert current_id is not None
-            execution_time = (datetime.datetime.combine(date, slot.start_time)
-                              - datetime.timedelta(minutes=minutes_before_start))
-            scheduler.add_job(notify_change_location, 'date',  # pyright: ignore[reportUnknownMemberType]
-                              (bot, selection_repository, current_id, prev_id, minutes_before_start),
-                              run_date=execution_time)
+    missed = [spec for spec in pending if spec.run_at <= now]
+    # Planning is redone above for every day that still has reminders ahead
+    late = [spec for spec in missed if spec.kind != 'plan' and now - spec.run_at <= catch_up_window]
+    skipped = [spec.id for spec in missed if spec not in late]
+    if skipped:
+        logger.warning('Skipping %d notification jobs missed beyond the catch-up window', len(skipped))
+        await job_repository.mark_done(skipped)
+    for spec in late:
+        logger.info('Catching up on missed job %s scheduled for %s', spec.id, spec.run_at)
+        func, args, _ = _to_job(spec, planner, outbox, job_repository)
+        try:
+            await func(*args)
+        except Exception:
+            logger.exception('Missed job %s failed', spec.id)
+
+
+def _collect_jobs(schedule: ScheduleSnapshot, planner: AudiencePlanner, minutes_before_start: int,
+                  now: datetime.datetime):
+    specs: list[ReminderJobDto] = []
+    to_plan: list[datetime.date] = []
+    for date, day_slots in schedule.slots_by_date.items():
+        execution_times = [(slot.id, datetime.datetime.combine(date, slot.start_time)
+                            - datetime.timedelta(minutes=minutes_before_start))
+                           for slot in day_slots if slot.id is not None]
+        planning_time = execution_times[0][1] - PLANNING_ADVANCE
+        if planning_time > now:
+            specs.append(ReminderJobDto(f'plan:{date.isoformat()}', 'plan', planning_time, minutes_before_start,
+                                        date=date))
+        elif execution_times[-1][1] > now and not planner.is_planned(
+                [slot_id for slot_id, _ in execution_times], schedule.speeches_by_date.get(date, ())):
+            to_plan.append(date)
+        prev_id = None
+        for current_id, execution_time in execution_times:
+            specs.append(ReminderJobDto(f'reminder:{current_id}', 'first' if prev_id is None else 'change',
+                                        execution_time, minutes_before_start, slot_id=current_id,
+                                        previous_slot_id=prev_id))
             prev_id = current_id
-    logging.getLogger(__name__).info('Notifications scheduled')
+    return specs, to_plan
+
+
+def _to_job(spec: ReminderJobDto, planner: AudiencePlanner, outbox: Outbox,
+            job_repository: ReminderJobRepository | None):
+    func: Callable[..., Awaitable[object]]
+    args: tuple[Any, ...]
+    match spec.kind:
+        case 'plan':
+            func, args = planner.plan_day, (spec.date,)
+        case 'first':
+            func, args = notify_first, (outbox, planner, spec.slot_id, spec.minutes_before_start)
+        case _:
+            func, args = notify_change_location, (outbox, planner, spec.slot_id, spec.previous_slot_id,
+                                                  spec.minutes_before_start)
+    if job_repository is not None:
+        func, args = _run_stored, (job_repository, spec.id, func, *args)
+    return _Job(func, args, spec.run_at)
+
+
+async def _run_stored(job_repository: ReminderJobRepository, job_id: str, func: Callable[..., Awaitable[object]],
+                      *args: Any):  # noqa: ANN401
+    await func(*args)
+    await job_repository.mark_done([job_id])
+
 
+def get_scheduled_jobs(scheduler: 'BaseScheduler'):
+    return cast('list[_ScheduledJob]', scheduler.get_jobs())  # pyright: ignore[reportUnknownMemberType]
 
-async def notify_first(bot: Bot, selection_repository: SelectionRepository,
-                       time_slot_id: int, time_to_start: int):
-    selections = await selection_repository.get_users_that_selected(time_slot_id)
-    logging.getLogger(__name__).info('Notifying %d users about first speech', len(selections))
-    for batch in itertools.batched(selections, 24, strict=False):
-        for selection in batch:
-            await bot.send_message(selection.attendee, notifications.render_starting(selection.speech, time_to_start))
-        await asyncio.sleep(1)
 
+def _apply_jobs(scheduler: 'BaseScheduler', jobs: Mapping[str, _Job], now: datetime.datetime):
+    existing = {job.id: job for job in get_scheduled_jobs(scheduler) if job.id.startswith(JOB_PREFIXES)}
+    added = changed = 0
+    for job_id, (func, args, run_date) in jobs.items():
+        job = existing.pop(job_id, None)
+        if job is None:
+            if run_date > now:
+                scheduler.add_job(func, 'date', args, id=job_id,  # pyright: ignore[reportUnknownMemberType]
+                                  run_date=run_date)
+                added += 1
+            continue
+        if job.func != func or job.args != args:
+            job.modify(func=func, args=args)
+            changed += 1
+        if job.trigger.run_date != run_date:
+            job.reschedule('date', run_date=run_date)
+            changed += 1
+    for job in existing.values():
+        job.remove()
+    return added, changed, len(existing)
 
-async def notify_change_location(bot: Bot, selection_repository: SelectionRepository,
+
+async def notify_first(outbox: Outbox, planner: AudiencePlanner, time_slot_id: int, time_to_start: int):
+    count = await _enqueue_reminders(outbox, planner, time_slot_id, None, time_to_start)
+    logging.getLogger(__name__).info('Notified %d users about first speech', count)
+
+
+async def notify_change_location(outbox: Outbox, planner: AudiencePlanner,
                                  time_slot_id: int, previous_slot_id: int, time_to_start: int):
-    selections = await selection_repository.get_changing_users(time_slot_id, previous_slot_id)
-    logging.getLogger(__name__).info('Notifying %d users about location change', len(selections))
-    for batch in itertools.batched(selections, 24, strict=False):
-        for selection in batch:
-            await bot.send_message(selection.attendee, notifications.render_starting(selection.speech, time_to_start))
-        await asyncio.sleep(1)
+    count = await _enqueue_reminders(outbox, planner, time_slot_id, previous_slot_id, time_to_start)
+    logging.getLogger(__name__).info('Notified %d users about location change', count)
+
+
+async def _enqueue_reminders(outbox: Outbox, planner: AudiencePlanner, time_slot_id: int,
+                             previous_slot_id: int | None, time_to_start: int):
+    speeches = await planner.get_speeches(time_slot_id)
+    message_ids: dict[int, int] = {}
+    count = 0
+
+    async def enqueue(chunk: Iterable[tuple[int, int]]):
+        nonlocal count
+        audiences: dict[int, list[int]] = {}
+        for attendee, speech_id in chunk:
+            audiences.setdefault(speech_id, []).append(attendee)
+        for speech_id, attendees in audiences.items():
+            key = f'reminder:{time_slot_id}'
+            if speech_id in message_ids:
+                await outbox.add_recipients(key, message_ids[speech_id], attendees)
+            else:
+                message = {'text': notifications.render_starting(speeches[speech_id], time_to_start)}
+                message_id = await outbox.enqueue(key, message, attendees)
+                if message_id is not None:
+                    message_ids[speech_id] = message_id
+            count += len(attendees)
+
+    await pipeline(planner.stream_audience(time_slot_id, previous_slot_id), enqueue)
+    return count
@@ -0,0 +1,74 @@
+import asyncio
+import datetime
+import logging
+import os
+import secrets
+import socket
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from data.repository import LeaseRepository
+
+LEASE_DURATION = datetime.timedelta(seconds=30)
+RENEW_INTERVAL = 10.0
+
+
+class LeaderElection:
+    def __init__(self, repository: LeaseRepository, name: str = 'scheduler', *, holder: str | None = None,
+                 lease_duration: datetime.timedelta = LEASE_DURATION, renew_interval: float = RENEW_INTERVAL):
+        self._repository = repository
+        self._name = name
+        self._holder = holder or f'{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}'
+        self._lease_duration = lease_duration
+        self._renew_interval = renew_interval
+        self._logger = logging.getLogger(__name__)
+        self.is_leader = False
+
+    async def run(self, leader_task: Callable[[], Coroutine[Any, Any, object]]):
+        task: asyncio.Task[object] | None = None
+        try:
+            while True:
+                acquired = await self._try_acquire()
+                if acquired and task is None:
+                    self._logger.info('%s became leader for %s', self._holder, self._name)
+                    self.is_leader = True
+                    task = asyncio.create_task(leader_task())
+                elif not acquired and task is not None:
+                    self._logger.warning('%s lost leadership for %s', self._holder, self._name)
+                    self.is_leader = False
+                    await _cancel(task)
+                    task = None
+                if task is not None and task.done():
+                    self._logger.error('Leader task for %s stopped, restarting', self._name,
+                                       exc_info=task.exception())
+                    task = asyncio.create_task(leader_task())
+                await asyncio.sleep(self._renew_interval)
+        finally:
+            if task is not None:
+                await _cancel(task)
+            if self.is_leader:
+                self.is_leader = False
+                await self._release()
+
+    async def _release(self):
+        try:
+            await self._repository.release(self._name, self._holder)
+        except Exception:
+            # The lease expires on its own, releasing it only lets the next leader start sooner
+            self._logger.exception('Failed to release lease %s', self._name)
+            return
+        self._logger.info('%s released leadership for %s', self._holder, self._name)
+
+    async def _try_acquire(self):
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        try:
+            return await self._repository.try_acquire(self._name, self._holder, now, now + self._lease_duration)
+        except Exception:
+            # Stepping down is safe: nobody else can take over before the current lease expires
+            self._logger.exception('Failed to renew lease %s', self._name)
+            return False
+
+
+async def _cancel(task: asyncio.Task[object]):
+    task.cancel()
+    await asyncio.wait((task,))
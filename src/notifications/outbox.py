@@ -0,0 +1,200 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+    TelegramUnauthorizedError,
+)
+from pydantic import BaseModel
+
+from data.repository import OutboxRepository
+from notifications.sender import MessageSender
+
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 8
+BASE_RETRY_DELAY = 2.0
+MAX_RETRY_DELAY = 600.0
+IDLE_POLL_INTERVAL = 60.0
+RESULT_GROUP_SIZE = 20
+RETENTION = datetime.timedelta(days=7)
+PRUNE_INTERVAL = datetime.timedelta(hours=1)
+
+
+class Outbox:
+    def __init__(self, repository: OutboxRepository, sender: MessageSender, *,  # noqa: PLR0913
+                 batch_size: int = BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS,
+                 base_retry_delay: float = BASE_RETRY_DELAY, max_retry_delay: float = MAX_RETRY_DELAY,
+                 result_group_size: int = RESULT_GROUP_SIZE, retention: datetime.timedelta = RETENTION,
+                 poll_interval: float = IDLE_POLL_INTERVAL):
+        self._repository = repository
+        self._sender = sender
+        self._batch_size = batch_size
+        self._result_group_size = result_group_size
+        self._retention = retention
+        self._pruned_at: datetime.datetime | None = None
+        self._max_attempts = max_attempts
+        self._base_retry_delay = base_retry_delay
+        self._max_retry_delay = max_retry_delay
+        # Bounds the wait for entries enqueued by other processes, wake() only reaches this one
+        self._poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._logger = logging.getLogger(__name__)
+
+    async def enqueue(self, key: str, message: Mapping[str, Any], chat_ids: Iterable[int]):
+        message_id = await self._repository.enqueue(key, _serialize(message), chat_ids, _now())
+        self._wakeup.set()
+        return message_id
+
+    async def add_recipients(self, key: str, message_id: int, chat_ids: Iterable[int]):
+        await self._repository.add_recipients(key, message_id, chat_ids, _now())
+        self._wakeup.set()
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def run(self):
+        self._logger.info('Outbox sender started')
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.deliver_due()
+                await self._prune()
+                next_attempt = await self._repository.get_next_attempt_time()
+            except Exception:
+                self._logger.exception('Outbox delivery failed')
+                next_attempt = None
+            timeout = (self._poll_interval if next_attempt is None
+                       else min(max((next_attempt - _now()).total_seconds(), 0), self._poll_interval))
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+
+    async def deliver_due(self):
+        while True:
+            entries = await self._repository.get_due(_now(), self._batch_size)
+            if not entries:
+                return
+            await self._deliver(entries)
+            if len(entries) < self._batch_size:
+                return
+
+    async def prune(self):
+        removed = await self._repository.prune(_now() - self._retention)
+        self._pruned_at = _now()
+        if removed:
+            self._logger.info('Pruned %d delivered outbox entries', removed)
+
+    async def _prune(self):
+        if self._pruned_at is None or _now() - self._pruned_at >= PRUNE_INTERVAL:
+            await self.prune()
+
+    async def _deliver(self, entries: Iterable[tuple[int, str, int, int, str]]):
+        messages: dict[int, dict[str, Any]] = {}
+        writer = _ResultWriter(self._repository, self._result_group_size)
+        results = writer.pending
+
+        async def deliver_one(chat_id: int, key: str, attempts: int, message: Mapping[str, Any]):
+            try:
+                await self._sender.send(chat_id, **message)
+            except TelegramRetryAfter as e:
+                self._logger.warning('Flood control hit, retrying in %d seconds', e.retry_after)
+                self._sender.pause(e.retry_after)
+                results.retries.append((chat_id, key, attempts, _now() + datetime.timedelta(seconds=e.retry_after)))
+            except (TelegramForbiddenError, TelegramBadRequest, TelegramUnauthorizedError):
+                self._logger.warning('Message %s to chat %d rejected', key, chat_id, exc_info=True)
+                results.failed.append((chat_id, key))
+            except TelegramAPIError:
+                attempts += 1
+                if attempts >= self._max_attempts:
+                    self._logger.exception('Giving up on message %s to chat %d', key, chat_id)
+                    results.failed.append((chat_id, key))
+                else:
+                    self._logger.warning('Failed to send message %s to chat %d', key, chat_id, exc_info=True)
+                    delay = min(self._base_retry_delay * 2 ** (attempts - 1), self._max_retry_delay)
+                    results.retries.append((chat_id, key, attempts, _now() + datetime.timedelta(seconds=delay)))
+            else:
+                results.sent.append((chat_id, key))
+            await writer.save_if_full()
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for chat_id, key, attempts, message_id, payload in entries:
+                    if message_id not in messages:
+                        messages[message_id] = json.loads(payload)
+                    group.create_task(deliver_one(chat_id, key, attempts, messages[message_id]))
+        finally:
+            await writer.save()
+        totals = writer.saved
+        self._logger.info('Outbox batch done: %d sent, %d failed, %d to retry',
+                          len(totals.sent), len(totals.failed), len(totals.retries))
+
+
+class _Results:
+    def __init__(self) -> None:
+        self.sent: list[tuple[int, str]] = []
+        self.failed: list[tuple[int, str]] = []
+        self.retries: list[tuple[int, str, int, datetime.datetime]] = []
+
+    def __len__(self):
+        return len(self.sent) + len(self.failed) + len(self.retries)
+
+    def clear(self):
+        self.sent.clear()
+        self.failed.clear()
+        self.retries.clear()
+
+    def merge(self, other: '_Results'):
+        self.sent.extend(other.sent)
+        self.failed.extend(other.failed)
+        self.retries.extend(other.retries)
+
+
+class _ResultWriter:
+    # Results are written in small groups, so a crash re-sends at most a group instead of a whole batch
+    def __init__(self, repository: OutboxRepository, group_size: int):
+        self._repository = repository
+        self._group_size = group_size
+        self._lock = asyncio.Lock()
+        self.pending = _Results()
+        self.saved = _Results()
+
+    async def save_if_full(self):
+        if len(self.pending) >= self._group_size:
+            await self.save()
+
+    async def save(self):
+        async with self._lock:
+            if not self.pending:
+                return
+            done = _Results()
+            done.merge(self.pending)
+            self.pending.clear()
+            try:
+                await self._repository.save_results(done.sent, done.failed, done.retries, _now())
+            except BaseException:
+                self.pending.merge(done)
+                raise
+            self.saved.merge(done)
+
+
+def _serialize(message: Mapping[str, Any]):
+    return json.dumps(message, default=_serialize_model, ensure_ascii=False)
+
+
+def _serialize_model(value: object):
+    if isinstance(value, BaseModel):
+        return value.model_dump(exclude_none=True)
+    msg = f'Cannot serialize value of type {type(value).__name__}'
+    raise TypeError(msg)
+
+
+def _now():
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
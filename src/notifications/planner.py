@@ -0,0 +1,134 @@
+import datetime
+import logging
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+
+from data.repository import SelectionRepository, SpeechRepository, UserRepository
+from dto import SpeechDto
+
+
+@dataclass(eq=False)
+class _DayPlan:
+    slot_ids: Sequence[int]
+    speeches: dict[int, SpeechDto]
+    selections: dict[int, dict[int, int]]
+    audiences: dict[int, dict[int, int]] = field(default_factory=dict[int, dict[int, int]])
+
+    def previous_slot(self, slot_id: int):
+        index = self.slot_ids.index(slot_id)
+        return self.slot_ids[index - 1] if index > 0 else None
+
+    def next_slot(self, slot_id: int):
+        index = self.slot_ids.index(slot_id) + 1
+        return self.slot_ids[index] if index < len(self.slot_ids) else None
+
+
+class AudiencePlanner:
+    def __init__(self, speech_repository: SpeechRepository, selection_repository: SelectionRepository,
+                 user_repository: UserRepository, *, shared: bool = False):
+        self._speech_repository = speech_repository
+        self._selection_repository = selection_repository
+        self._user_repository = user_repository
+        self._plans: dict[int, _DayPlan] = {}
+        self._disabled: set[int] = set()
+        self._changes_while_planning: list[tuple[int, int, int | None]] | None = None
+        self._shared = shared
+        self._logger = logging.getLogger(__name__)
+        selection_repository.add_selection_listener(self._on_selection_saved)
+        user_repository.add_notification_listener(self._on_notification_setting_saved)
+
+    async def plan_day(self, date: datetime.date):
+        if self._shared:
+            # changes made by other processes never reach the listeners, so audiences are always queried
+            self._logger.debug('Not planning %s, the database is shared', date)
+            return
+        changes: list[tuple[int, int, int | None]] = []
+        self._changes_while_planning = changes
+        try:
+            slot_ids = [slot.id for slot in await self._speech_repository.get_all_slots()
+                        if slot.date == date and slot.id is not None]
+            speeches = {speech.id: speech for speech in await self._speech_repository.get_all_speeches(date)
+                        if speech.id is not None}
+            rows = await self._selection_repository.get_selections_in_slots(slot_ids)
+            self._disabled = set(await self._user_repository.get_users_with_notifications_disabled())
+        finally:
+            self._changes_while_planning = None
+        selections: dict[int, dict[int, int]] = {slot_id: {} for slot_id in slot_ids}
+        for slot_id, attendee, speech_id in rows:
+            selections[slot_id][attendee] = speech_id
+        plan = _DayPlan(slot_ids, speeches, selections)
+        for slot_id in slot_ids:
+            plan.audiences[slot_id] = {attendee: speech_id for attendee, speech_id in selections[slot_id].items()
+                                       if self._should_notify(plan, slot_id, attendee, speech_id)}
+            self._plans[slot_id] = plan
+        for change in changes:
+            self._on_selection_saved(*change)
+        self._logger.info('Planned notifications for %s: %d selections in %d slots', date, len(rows), len(slot_ids))
+
+    def is_planned(self, slot_ids: Sequence[int], speeches: Iterable[SpeechDto]):
+        plan = self._plans.get(slot_ids[0]) if slot_ids else None
+        return (plan is not None and list(plan.slot_ids) == list(slot_ids)
+                and plan.speeches == {speech.id: speech for speech in speeches if speech.id is not None})
+
+    async def stream_audience(self, slot_id: int, previous_slot_id: int | None):
+        plan = self._plans.get(slot_id)
+        if plan is not None:
+            yield list(plan.audiences[slot_id].items())
+            return
+        self._logger.info('Slot %d is not planned, querying its audience', slot_id)
+        chunks = (self._selection_repository.stream_users_that_selected(slot_id) if previous_slot_id is None
+                  else self._selection_repository.stream_changing_users(slot_id, previous_slot_id))
+        async for chunk in chunks:
+            yield [(attendee, speech_id) for attendee, speech_id in chunk]
+
+    async def get_speeches(self, slot_id: int):
+        plan = self._plans.get(slot_id)
+        if plan is not None:
+            return plan.speeches
+        _, speeches = await self._speech_repository.get_in_time_slot(slot_id)
+        return {speech.id: speech for speech in speeches if speech.id is not None}
+
+    def _on_selection_saved(self, user_id: int, slot_id: int, speech_id: int | None):
+        if self._changes_while_planning is not None:
+            self._changes_while_planning.append((user_id, slot_id, speech_id))
+        plan = self._plans.get(slot_id)
+        if plan is None:
+            return
+        if speech_id is not None and speech_id not in plan.speeches:
+            self._logger.warning('Speech %d is not in the plan, dropping the plan for its day', speech_id)
+            for planned_slot in plan.slot_ids:
+                del self._plans[planned_slot]
+            return
+        if speech_id is None:
+            plan.selections[slot_id].pop(user_id, None)
+        else:
+            plan.selections[slot_id][user_id] = speech_id
+        self._update_audience(plan, slot_id, user_id)
+        next_slot = plan.next_slot(slot_id)
+        if next_slot is not None:
+            self._update_audience(plan, next_slot, user_id)
+
+    def _on_notification_setting_saved(self, user_id: int, enabled: bool):
+        if enabled:
+            self._disabled.discard(user_id)
+        else:
+            self._disabled.add(user_id)
+        for plan in set(self._plans.values()):
+            for slot_id in plan.slot_ids:
+                self._update_audience(plan, slot_id, user_id)
+
+    def _update_audience(self, plan: _DayPlan, slot_id: int, user_id: int):
+        speech_id = plan.selections[slot_id].get(user_id)
+        if speech_id is not None and self._should_notify(plan, slot_id, user_id, speech_id):
+            plan.audiences[slot_id][user_id] = speech_id
+        else:
+            plan.audiences[slot_id].pop(user_id, None)
+
+    def _should_notify(self, plan: _DayPlan, slot_id: int, user_id: int, speech_id: int):
+        if user_id in self._disabled:
+            return False
+        previous_slot = plan.previous_slot(slot_id)
+        if previous_slot is None:
+            return True
+        previous_speech = plan.selections[previous_slot].get(user_id)
+        return previous_speech is None or plan.speeches[previous_speech].location != plan.speeches[speech_id].location
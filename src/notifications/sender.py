@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from typing import Any
+
+from aiogram import Bot
+
+# Telegram allows about 30 messages per second overall and about one per second in a single chat
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+MAX_CONCURRENCY = 16
+_MAX_IDLE_BUCKETS = 10_000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    @property
+    def full(self):
+        self._refill()
+        return self._tokens >= self._capacity
+
+    def reserve(self):
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self._rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self._rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+
+class MessageSender:
+    def __init__(self, bot: Bot, *, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 max_concurrency: int = MAX_CONCURRENCY):
+        self._bot = bot
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._per_chat_rate = per_chat_rate
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._logger = logging.getLogger(__name__)
+
+    async def send(self, chat_id: int, text: str, **kwargs: Any):
+        await self._chat_bucket(chat_id).acquire()
+        async with self._semaphore:
+            await self._global_bucket.acquire()
+            return await self._bot.send_message(chat_id, text, **kwargs)
+
+    def pause(self, seconds: float):
+        self._logger.info('Pausing outgoing messages for %s seconds', seconds)
+        self._global_bucket.pause(seconds)
+
+    def _chat_bucket(self, chat_id: int):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= _MAX_IDLE_BUCKETS:
+                self._chat_buckets = {chat: bucket for chat, bucket in self._chat_buckets.items() if not bucket.full}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._per_chat_rate)
+        return bucket
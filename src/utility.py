@@ -1,4 +1,5 @@
-from collections.abc import Iterable
+import asyncio
+from collections.abc import AsyncIterable, Awaitable, Callable, Iterable
 from typing import Any
 
 from aiogram.types import User
@@ -31,3 +32,24 @@ def cast_not_none[T](value: T | None) -> T:
         msg = 'Value is None'
         raise TypeError(msg)
     return value
+
+
+async def pipeline[T](source: AsyncIterable[T], consumer: Callable[[T], Awaitable[object]], max_pending: int = 2):
+    # The bound keeps a fast source from buffering everything while the consumer catches up
+    queue: asyncio.Queue[T] = asyncio.Queue(max_pending)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put(item)
+        finally:
+            queue.shutdown()
+
+    async with asyncio.TaskGroup() as group:
+        group.create_task(produce())
+        while True:
+            try:
+                item = await queue.get()
+            except asyncio.QueueShutDown:
+                break
+            await consumer(item)
@@ -0,0 +1,38 @@
+import datetime
+import itertools
+import logging
+from collections.abc import Iterable
+from typing import Any
+
+from data.schedule import ScheduleSnapshot
+from dto import SpeechDto
+from view import timetable
+
+
+class TimetableCache:
+    def __init__(self) -> None:
+        self._version: int | None = None
+        self._rendered: dict[datetime.date, tuple[dict[str, Any], ...]] = {}
+        self._logger = logging.getLogger(__name__)
+
+    def get(self, schedule: ScheduleSnapshot, date: datetime.date):
+        if schedule.version != self._version:
+            self._logger.info('Schedule version changed to %d, dropping rendered timetables', schedule.version)
+            self._rendered = {}
+            self._version = schedule.version
+            timetable.date_formats.update(schedule.dates, schedule.slots)
+        rendered = self._rendered.get(date)
+        if rendered is None:
+            rendered = self._rendered[date] = _render(schedule.speeches_by_date.get(date, ()))
+        return rendered
+
+    def warm_up(self, schedule: ScheduleSnapshot):
+        for date in schedule.dates:
+            self.get(schedule, date)
+        self._logger.info('Rendered timetables for %d dates', len(schedule.dates))
+
+
+def _render(speeches: Iterable[SpeechDto]):
+    days = ((day, itertools.groupby(locations, lambda x: x.location))
+            for day, locations in itertools.groupby(speeches, lambda x: x.time_slot.date))
+    return tuple(text.as_kwargs() for text in timetable.pack_messages(timetable.render_timetable(days, False)))
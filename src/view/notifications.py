@@ -1,5 +1,9 @@
-from collections.abc import Iterable
+import typing
+from collections.abc import Collection, Iterable
 
+from aiogram.utils.formatting import Text
+
+from data.schedule import ChangeKind, SpeechChange
 from dto import SpeechDto, TimeSlotDto
 from utility import as_list_section
 from view import timetable
@@ -16,3 +20,33 @@ def render_settings(enabled: bool):
 def render_changed(time_slots: Iterable[TimeSlotDto]):
     slot_strings = (timetable.make_slot_string(slot, bold=False) for slot in time_slots)
     return as_list_section('Поменялось расписание для следующих слотов:', *slot_strings, 'Проверьте ваш выбор')
+
+
+def render_schedule_diff(changes: Collection[SpeechChange]):
+    if not changes:
+        return Text('Изменений нет')
+    return as_list_section('Изменения:', *map(_render_change, changes))
+
+
+def _render_change(change: SpeechChange):
+    speech = change.speech
+    slot = timetable.make_slot_string(speech.time_slot, with_day=True, bold=False)
+    previous = change.previous
+    match change.kind:
+        case ChangeKind.ADDED:
+            return Text('➕ ', slot, f' {speech.location}: "{speech.title}" ({speech.speaker})')
+        case ChangeKind.REMOVED:
+            return Text('➖ ', slot, f' {speech.location}: "{speech.title}" ({speech.speaker})')
+        case ChangeKind.RETITLED:
+            assert previous is not None
+            return Text('✏️ ', slot, f' {speech.location}: "{previous.title}" ({previous.speaker})'
+                                     f' → "{speech.title}" ({speech.speaker})')
+        case ChangeKind.MOVED_ROOM:
+            assert previous is not None
+            return Text('🚪 ', slot, f' "{speech.title}": {previous.location} → {speech.location}')
+        case ChangeKind.MOVED_TIME:
+            assert previous is not None
+            return Text('🕒 ', f'"{speech.title}": ',
+                        timetable.make_slot_string(previous.time_slot, with_day=True, bold=False),
+                        f' {previous.location} → ', slot, f' {speech.location}')
+    typing.assert_never(change.kind)
@@ -1,10 +1,10 @@
 import datetime
 import typing
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 from enum import Enum, auto
 
-from aiogram.utils.formatting import Bold, Italic, Text, Underline, as_key_value, as_marked_section
-from babel import dates
+from aiogram.types import MessageEntity
+from aiogram.utils.formatting import Bold, Italic, Text, Underline, as_key_value, as_marked_section, sizeof
 
 from dto import SpeechDto, TimeSlotDto
 
@@ -31,20 +31,54 @@ def make_entry_string(speech: SpeechDto, format_type: EntryFormat = EntryFormat.
     typing.assert_never(format_type)
 
 
+DATE_PATTERNS = ('E, dd.MM', 'E, ', 'E, dd.MM:', 'E, dd.MM:\n')
+
+
+def _format_date(date: datetime.date, pattern: str):
+    # babel loads its locale data on first use, which is not needed to start the bot
+    from babel import dates  # noqa: PLC0415
+
+    return dates.format_date(date, pattern, locale='ru').capitalize()
+
+
+def _format_slot_time(slot: TimeSlotDto):
+    return f'{slot.start_time:%H:%M} - {slot.end_time:%H:%M}'
+
+
+class DateFormatTable:
+    def __init__(self) -> None:
+        self._dates: dict[tuple[datetime.date, str], str] = {}
+        self._slot_times: dict[TimeSlotDto, str] = {}
+
+    def update(self, dates: Iterable[datetime.date], slots: Iterable[TimeSlotDto]):
+        # Built aside and swapped in, so a render never sees a half-filled table
+        self._dates = {(date, pattern): _format_date(date, pattern) for date in dates for pattern in DATE_PATTERNS}
+        self._slot_times = {slot: _format_slot_time(slot) for slot in slots}
+
+    def date(self, date: datetime.date, pattern: str):
+        text = self._dates.get((date, pattern))
+        return text if text is not None else _format_date(date, pattern)
+
+    def slot_time(self, slot: TimeSlotDto):
+        text = self._slot_times.get(slot)
+        return text if text is not None else _format_slot_time(slot)
+
+
+date_formats = DateFormatTable()
+
+
 def make_date_string(date: datetime.date):
-    return dates.format_date(date, 'E, dd.MM', locale='ru').capitalize()
+    return date_formats.date(date, 'E, dd.MM')
 
 
 def make_date_string_underline(date: datetime.date):
-    return Text(dates.format_date(date, 'E, ', locale='ru').capitalize(), Underline(f'{date:%d.%m}'))
+    return Text(date_formats.date(date, 'E, '), Underline(f'{date:%d.%m}'))
 
 
 def make_slot_string(slot: TimeSlotDto, with_day: bool = False, bold: bool = True):
+    text = date_formats.slot_time(slot)
     if with_day:
-        text = (dates.format_date(slot.date, 'E, dd.MM', locale='ru').capitalize() +
-                f' {slot.start_time:%H:%M} - {slot.end_time:%H:%M}')
-    else:
-        text = f'{slot.start_time:%H:%M} - {slot.end_time:%H:%M}'
+        text = f'{date_formats.date(slot.date, 'E, dd.MM')} {text}'
     return Bold(text) if bold else Text(text)
 
 
@@ -53,7 +87,7 @@ def render_timetable(
         with_day_counter: bool = True):
     for date, locations in table:
         if with_day_counter:
-            yield Text('📆', dates.format_date(date, 'E, dd.MM:', locale='ru').capitalize())
+            yield Text('📆', date_formats.date(date, 'E, dd.MM:'))
         else:
             yield Text('📆', f'{date:%d.%m}:')
         for location, speeches in locations:
@@ -63,7 +97,67 @@ def render_timetable(
 
 def render_personal(table: Iterable[tuple[datetime.date, Iterable[SpeechDto]]]):
     return (as_marked_section(
-        Text('🗓️', dates.format_date(date, 'E, dd.MM:\n', locale='ru').capitalize()),
+        Text('🗓️', date_formats.date(date, 'E, dd.MM:\n')),
         *(make_entry_string(speech, EntryFormat.WITH_PLACE) for speech in speeches)
     )
         for date, speeches in table)
+
+
+MESSAGE_LIMIT = 4096
+
+
+def pack_messages(blocks: Iterable[Text], separator: str = '\n\n', limit: int = MESSAGE_LIMIT) -> Iterator[Text]:
+    # Joins rendered blocks into as few messages as fit the limit; Text recomputes entity offsets on render
+    pending: list[Text] = []
+    size = 0
+    for block in blocks:
+        block_size = len(block)
+        if pending and (block_size > limit or size + sizeof(separator) + block_size > limit):
+            yield _join(pending, separator)
+            pending = []
+        if block_size > limit:
+            yield from _split(block, limit)
+            continue
+        size = size + sizeof(separator) + block_size if pending else block_size
+        pending.append(block)
+    if pending:
+        yield _join(pending, separator)
+
+
+def _join(blocks: list[Text], separator: str):
+    nodes: list[Text | str] = []
+    for block in blocks:
+        if nodes:
+            nodes.append(separator)
+        nodes.append(block)
+    return Text(*nodes)
+
+
+def _split(block: Text, limit: int):
+    # A single block over the limit is cut at line ends, or mid-line if one line is too long.
+    # Cutting the rendered text keeps entities exact, Text slicing counts code points instead of UTF-16 units.
+    text, entities = block.render()
+    start = position = line_end = 0
+    start_index = line_end_index = 0
+    for index, char in enumerate(text):
+        char_size = sizeof(char)
+        while position + char_size - start > limit:
+            cut, cut_index = (line_end, line_end_index) if line_end > start else (position, index)
+            yield _slice(text[start_index:cut_index], entities, start, cut)
+            start, start_index = cut, cut_index
+        position += char_size
+        if char == '\n':
+            line_end, line_end_index = position, index + 1
+    if position > start:
+        yield _slice(text[start_index:], entities, start, position)
+
+
+def _slice(text: str, entities: list[MessageEntity], start: int, stop: int):
+    parts: list[MessageEntity] = []
+    for entity in entities:
+        entity_start = max(entity.offset, start)
+        entity_stop = min(entity.offset + entity.length, stop)
+        if entity_stop > entity_start:
+            parts.append(entity.model_copy(update={'offset': entity_start - start,
+                                                   'length': entity_stop - entity_start}))
+    return Text.from_entities(text, parts)
@@ -0,0 +1,8 @@
+import pytest
+
+from data.mock_data import MOCK_CONFERENCE
+
+
+@pytest.fixture
+def conference():
+    return MOCK_CONFERENCE
@@ -0,0 +1,154 @@
+# ruff: noqa: PLR2004
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+import data.mock_data
+import data.setup
+from data.engine import create_engine
+from data.repository import BufferedSelectionRepository, SelectionRepository
+from data.tables import Selection
+from dto import ConferenceDto
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path: Path):
+    engine = create_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    await data.setup.create_tables(engine)
+    await data.mock_data.fill_tables(async_sessionmaker(engine))
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_maker(engine: AsyncEngine):
+    return async_sessionmaker(engine)
+
+
+async def _get_selections(session_maker: async_sessionmaker[AsyncSession]):
+    async with session_maker() as session:
+        result = await session.execute(select(Selection.attendee, Selection.time_slot_id, Selection.speech_id))
+        return {tuple(row) for row in result}
+
+
+@pytest.mark.asyncio
+async def test_saves_are_coalesced(engine: AsyncEngine, session_maker: async_sessionmaker[AsyncSession],
+                                   conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference, flush_interval=0.05)
+    commits = 0
+
+    def count(*_: Any):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine.sync_engine, 'commit', count)
+    async with asyncio.TaskGroup() as group:
+        for user_id in range(300):
+            group.create_task(repository.save_selection(user_id, 1, 1))
+            group.create_task(repository.save_selection(user_id, 2, 2))
+    event.remove(engine.sync_engine, 'commit', count)
+
+    assert commits <= 3
+    assert len(await _get_selections(session_maker)) == 600
+
+
+@pytest.mark.asyncio
+async def test_last_writer_wins(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference)
+    notified: list[tuple[int, int, int | None]] = []
+
+    def record(attendee: int, slot_id: int, speech_id: int | None):
+        notified.append((attendee, slot_id, speech_id))
+
+    repository.add_selection_listener(record)
+    await repository.save_selection(41, 2, 2)
+
+    await asyncio.gather(repository.save_selection(41, 1, 1), repository.save_selection(41, 1, 3),
+                         repository.save_selection(41, 2, None))
+
+    assert await _get_selections(session_maker) == {(41, 1, 3)}
+    assert notified == [(41, 2, 2), (41, 1, 3), (41, 2, None)]
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference, flush_interval=10)
+
+    save = asyncio.create_task(repository.save_selection(41, 1, 3))
+    await asyncio.sleep(0)
+    speeches = await repository.get_selected_speeches(41)
+
+    assert [speech.id for speech in speeches] == [3]
+    assert save.done()
+
+
+@pytest.mark.asyncio
+async def test_flush(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference, flush_interval=10)
+
+    save = asyncio.create_task(repository.save_selection(41, 1, 3))
+    await asyncio.sleep(0)
+    await repository.flush()
+
+    assert await _get_selections(session_maker) == {(41, 1, 3)}
+    await save
+
+
+@pytest.mark.asyncio
+async def test_failure_is_reported(session_maker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch,
+                                   conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference)
+
+    async def fail(*_: Any):
+        raise RuntimeError
+
+    monkeypatch.setattr(SelectionRepository, 'save_selections', fail)
+
+    with pytest.raises(RuntimeError):
+        await repository.save_selection(41, 1, 3)
+
+
+@pytest.mark.asyncio
+async def test_read_waits_for_commit_in_progress(session_maker: async_sessionmaker[AsyncSession],
+                                                 monkeypatch: pytest.MonkeyPatch, conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference, flush_interval=0)
+    committing = asyncio.Event()
+    resume = asyncio.Event()
+    save_selections = SelectionRepository.save_selections
+
+    async def slow_save(self: SelectionRepository, selections: Any):
+        committing.set()
+        await resume.wait()
+        await save_selections(self, selections)
+
+    monkeypatch.setattr(SelectionRepository, 'save_selections', slow_save)
+    save = asyncio.create_task(repository.save_selection(41, 1, 3))
+    await committing.wait()
+    read = asyncio.create_task(repository.get_selected_speeches(41))
+    await asyncio.sleep(0.05)
+    assert not read.done()
+    resume.set()
+
+    assert [speech.id for speech in await read] == [3]
+    await save
+
+
+@pytest.mark.asyncio
+async def test_bulk_save_is_ordered_after_buffered_save(session_maker: async_sessionmaker[AsyncSession],
+                                                        conference: ConferenceDto):
+    repository = BufferedSelectionRepository(session_maker, conference, flush_interval=10)
+
+    single = asyncio.create_task(repository.save_selection(41, 1, 1))
+    await asyncio.sleep(0)
+    bulk = asyncio.create_task(repository.save_selections([(41, 1, 3), (41, 2, 2)]))
+    await asyncio.sleep(0)
+    await repository.flush()
+    await asyncio.gather(single, bulk)
+
+    assert await _get_selections(session_maker) == {(41, 1, 3), (41, 2, 2)}
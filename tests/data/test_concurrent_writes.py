@@ -0,0 +1,56 @@
+# ruff: noqa: PLR2004
+
+import asyncio
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import data.mock_data
+import data.setup
+from data.engine import create_engine
+from data.repository import SelectionRepository, UserRepository
+from data.tables import Selection, Settings
+from dto import ConferenceDto
+
+USERS = 100
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes(tmp_path: Path, conference: ConferenceDto):
+    engine = create_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    session_maker = async_sessionmaker(engine)
+    await data.setup.create_tables(engine)
+    await data.mock_data.fill_tables(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
+    user_repository = UserRepository(session_maker)
+    statements: Counter[str] = Counter()
+
+    def count(_conn: Any, _cursor: Any, statement: str, *_: Any):
+        statements[statement.split(maxsplit=1)[0].upper()] += 1
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', count)
+    async with asyncio.TaskGroup() as group:
+        for user_id in range(USERS):
+            group.create_task(selection_repository.save_selection(user_id, 1, 1))
+            group.create_task(selection_repository.save_selection(user_id, 1, 3))
+            group.create_task(selection_repository.save_selection(user_id, 2, 2))
+            group.create_task(user_repository.save_notification_setting(user_id, user_id % 2 == 0))
+            group.create_task(user_repository.register_user(user_id, f'user{user_id}'))
+    event.remove(engine.sync_engine, 'before_cursor_execute', count)
+
+    assert statements['INSERT'] == 5 * USERS
+    assert statements['UPDATE'] == statements['DELETE'] == 0
+    async with session_maker() as session:
+        selections = (await session.execute(select(Selection.time_slot_id, Selection.speech_id))).all()
+        assert Counter(slot_id for slot_id, _ in selections) == {1: USERS, 2: USERS}
+        assert {speech_id for slot_id, speech_id in selections if slot_id == 1} <= {1, 3}
+        settings = (await session.scalars(select(Settings))).all()
+        assert len(settings) == USERS
+        assert all(setting.username == f'user{setting.user_id}' for setting in settings)
+        assert all(setting.notifications_enabled == (setting.user_id % 2 == 0) for setting in settings)
+        assert await session.scalar(select(func.count()).select_from(Settings).where(Settings.admin)) == 0
+    await engine.dispose()
@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from data.engine import create_engine, has_single_connection
+
+
+@pytest.mark.asyncio
+async def test_sqlite_profile(tmp_path: Path):
+    engine = create_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+
+    async with engine.connect() as conn:
+        journal_mode = await conn.scalar(text('PRAGMA journal_mode'))
+        synchronous = await conn.scalar(text('PRAGMA synchronous'))
+        busy_timeout = await conn.scalar(text('PRAGMA busy_timeout'))
+    await engine.dispose()
+
+    assert journal_mode == 'wal'
+    assert synchronous == 1
+    assert busy_timeout == 5000  # noqa: PLR2004
+    assert engine.pool.size() == 8  # type: ignore  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_memory_database_uses_one_connection():
+    engine = create_engine('sqlite+aiosqlite:///:memory:')
+
+    async with engine.connect() as conn:
+        journal_mode = await conn.scalar(text('PRAGMA journal_mode'))
+    await engine.dispose()
+
+    assert journal_mode == 'memory'
+    assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+    assert engine.pool.size() == 1
+    assert has_single_connection(async_sessionmaker(engine))
+
+
+@pytest.mark.asyncio
+async def test_memory_sessions_take_turns():
+    engine = create_engine('sqlite+aiosqlite:///:memory:')
+    factory = async_sessionmaker(engine)
+    async with factory() as session, session.begin():
+        await session.execute(text('CREATE TABLE items (value INTEGER)'))
+
+    async def write(value: int):
+        async with factory() as session, session.begin():
+            await session.execute(text('INSERT INTO items VALUES (:value)'), {'value': value})
+            await asyncio.sleep(0)
+
+    async def read():
+        async with factory() as session:
+            await session.execute(text('SELECT count(*) FROM items'))
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(write(i) for i in range(10)), *(read() for _ in range(10)))
+    async with factory() as session:
+        assert await session.scalar(text('SELECT count(*) FROM items')) == 10  # noqa: PLR2004
+    await engine.dispose()
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match='Unknown database profile'):
+        create_engine('sqlite+aiosqlite:///:memory:', 'unknown')
@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import Insert, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import data.setup
+from data.fsm_storage import DatabaseStorage
+from data.tables import FsmRecord
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+USERS = 100
+
+
+@pytest_asyncio.fixture  # type: ignore
+async def session_maker():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    await data.setup.create_tables(engine)
+    return async_sessionmaker(engine)
+
+
+async def _count(session_maker: async_sessionmaker[AsyncSession]):
+    async with session_maker() as session:
+        return await session.scalar(select(func.count()).select_from(FsmRecord))
+
+
+@pytest.mark.asyncio
+async def test_round_trip(session_maker: async_sessionmaker[AsyncSession]):
+    storage = DatabaseStorage(session_maker, flush_interval=60)
+    await storage.set_state(KEY, State('editing', 'EditingScene'))
+    await storage.update_data(KEY, {'slots': [1, 2, 3]})
+    assert await storage.get_state(KEY) == 'EditingScene:editing'
+    assert await storage.get_value(KEY, 'slots') == [1, 2, 3]
+    assert await _count(session_maker) == 0
+    await storage.close()
+
+    restored = DatabaseStorage(session_maker)
+    assert await restored.get_state(KEY) == 'EditingScene:editing'
+    assert await restored.get_data(KEY) == {'slots': [1, 2, 3]}
+    assert await restored.get_state(StorageKey(bot_id=1, chat_id=41, user_id=41)) is None
+    await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched(session_maker: async_sessionmaker[AsyncSession]):
+    storage = DatabaseStorage(session_maker, flush_interval=60)
+    for user_id in range(USERS):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+        await storage.set_state(key, 'editing')
+        await storage.set_data(key, {'slots': [user_id]})
+    statements: list[str] = []
+    engine = session_maker.kw['bind']
+
+    def record(*args: object):
+        statements.append(str(args[2]))
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    await storage.flush()
+    event.remove(engine.sync_engine, 'before_cursor_execute', record)
+    assert len(statements) == 1
+    assert await _count(session_maker) == USERS
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_cleared_state_is_removed(session_maker: async_sessionmaker[AsyncSession]):
+    storage = DatabaseStorage(session_maker, flush_interval=60)
+    await storage.set_state(KEY, 'editing')
+    await storage.flush()
+    assert await _count(session_maker) == 1
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    await storage.close()
+    assert await _count(session_maker) == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_state(session_maker: async_sessionmaker[AsyncSession]):
+    storage = DatabaseStorage(session_maker, ttl=datetime.timedelta(seconds=-1), flush_interval=60)
+    await storage.set_state(KEY, 'editing')
+    await storage.close()
+    assert await _count(session_maker) == 1
+
+    restored = DatabaseStorage(session_maker)
+    assert await restored.get_state(KEY) is None
+    await restored.purge()
+    assert await _count(session_maker) == 0
+
+
+@pytest.mark.asyncio
+async def test_data_must_be_serializable(session_maker: async_sessionmaker[AsyncSession]):
+    storage = DatabaseStorage(session_maker)
+    with pytest.raises(TypeError):
+        await storage.set_data(KEY, {'day': datetime.date(2025, 6, 1)})
+
+
+@pytest.mark.asyncio
+async def test_shared_storages(session_maker: async_sessionmaker[AsyncSession]):
+    first = DatabaseStorage(session_maker, shared=True)
+    second = DatabaseStorage(session_maker, shared=True)
+    await first.set_state(KEY, 'editing')
+    assert await second.get_state(KEY) == 'editing'
+    await second.update_data(KEY, {'slots': [2]})
+    assert await first.get_data(KEY) == {'slots': [2]}
+    await first.set_state(KEY, None)
+    await first.set_data(KEY, {})
+    assert await second.get_state(KEY) is None
+    assert await _count(session_maker) == 0
+
+
+@pytest.mark.asyncio
+async def test_close_waits_for_write_in_progress(session_maker: async_sessionmaker[AsyncSession]):
+    writing = asyncio.Event()
+    resume = asyncio.Event()
+
+    class SlowWriteSession(AsyncSession):
+        async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+            if isinstance(statement, Insert):
+                writing.set()
+                await resume.wait()
+            return await super().execute(statement, *args, **kwargs)
+
+    storage = DatabaseStorage(async_sessionmaker(session_maker.kw['bind'], class_=SlowWriteSession), flush_interval=0)
+    await storage.set_state(KEY, 'editing')
+    await writing.wait()
+    other = StorageKey(bot_id=1, chat_id=41, user_id=41)
+    await storage.set_state(other, 'editing')
+    close = asyncio.create_task(storage.close())
+    await asyncio.sleep(0.05)
+    assert not close.done()
+    resume.set()
+    await close
+
+    restored = DatabaseStorage(session_maker)
+    assert await restored.get_state(KEY) == 'editing'
+    assert await restored.get_state(other) == 'editing'
+    await restored.close()
@@ -0,0 +1,39 @@
+import datetime
+from zoneinfo import ZoneInfo
+
+from data.mapping import SpeechBuilder, speech_to_entity, speeches_from_rows
+from dto import SpeechDto, TimeSlotDto
+
+
+def test_speeches_from_rows():
+    timezone = ZoneInfo('Asia/Novosibirsk')
+    date = datetime.date(2025, 6, 1)
+    rows = [(1, 'Title 1', 'Speaker 1', 'Room 1', 1, date, datetime.time(9), datetime.time(10)),
+            (2, 'Title 2', 'Speaker 2', 'Room 2', 1, date, datetime.time(9), datetime.time(10))]
+
+    speeches = speeches_from_rows(rows, timezone)
+
+    slot = TimeSlotDto(1, date, datetime.time(9, tzinfo=timezone), datetime.time(10, tzinfo=timezone))
+    assert speeches == [SpeechDto(1, 'Title 1', 'Speaker 1', slot, 'Room 1'),
+                        SpeechDto(2, 'Title 2', 'Speaker 2', slot, 'Room 2')]
+    assert speeches[0].time_slot is speeches[1].time_slot
+
+
+def test_build_selection_shares_speech():
+    builder = SpeechBuilder(ZoneInfo('Asia/Novosibirsk'))
+    speech = (1, 'Title', 'Speaker', 'Room', 1, datetime.date(2025, 6, 1), datetime.time(9), datetime.time(10))
+
+    first = builder.build_selection((41, *speech))
+    second = builder.build_selection((42, *speech))
+
+    assert (first.attendee, second.attendee) == (41, 42)
+    assert first.speech is second.speech
+
+
+def test_speech_to_entity():
+    slot = TimeSlotDto(3, datetime.date(2025, 6, 1), datetime.time(9), datetime.time(10))
+
+    entity = speech_to_entity(SpeechDto(None, 'Title', 'Speaker', slot, 'Room'))
+
+    assert entity.id is None
+    assert (entity.title, entity.speaker, entity.location, entity.time_slot_id) == ('Title', 'Speaker', 'Room', 3)
@@ -0,0 +1,73 @@
+import datetime
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+import data.mock_data
+import data.setup
+from data.repository import OutboxRepository, SelectionRepository, UserRepository
+from dto import ConferenceDto
+
+HOT_TABLES = ('selections', 'settings', 'outbox')
+
+
+@pytest_asyncio.fixture
+async def engine():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    await data.setup.create_tables(engine)
+    await data.mock_data.fill_tables(async_sessionmaker(engine))
+    return engine
+
+
+async def _record_statements(engine: AsyncEngine, action: Callable[[], Awaitable[Any]]):
+    statements: list[tuple[str, Any]] = []
+
+    def record(_conn: Any, _cursor: Any, statement: str, parameters: Any, *_: Any):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    try:
+        await action()
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', record)
+    return statements
+
+
+async def _collect(chunks: Any):
+    return [row async for chunk in chunks for row in chunk]
+
+
+def _actions(factory: async_sessionmaker[AsyncSession],
+             conference: ConferenceDto) -> dict[str, Callable[[], Awaitable[Any]]]:
+    selections = SelectionRepository(factory, conference)
+    users = UserRepository(factory)
+    outbox = OutboxRepository(factory, conference)
+    return {
+        'users_that_selected': lambda: _collect(selections.stream_users_that_selected(1)),
+        'changing_users': lambda: _collect(selections.stream_changing_users(2, 1)),
+        'user_ids_that_selected': lambda: _collect(selections.stream_user_ids_that_selected((1, 2))),
+        'selections_in_slots': lambda: selections.get_selections_in_slots((1, 2)),
+        'remove_selection': lambda: selections.save_selection(41, 1, None),
+        'set_admin_by_username': lambda: users.set_admin_by_username('user', True),
+        'outbox_due': lambda: outbox.get_due(datetime.datetime(2025, 6, 1), 10),  # noqa: DTZ001
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('query', ['users_that_selected', 'changing_users', 'user_ids_that_selected',
+                                   'selections_in_slots', 'remove_selection', 'set_admin_by_username', 'outbox_due'])
+async def test_hot_queries_use_indexes(engine: AsyncEngine, query: str, conference: ConferenceDto):
+    statements = await _record_statements(engine, _actions(async_sessionmaker(engine), conference)[query])
+
+    assert statements
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            result = await conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+            plan: list[str] = [detail for *_, detail in result]
+            scans = [step for step in plan if step.startswith(tuple(f'SCAN {table}' for table in HOT_TABLES))]
+            assert not scans, f'{statement}\n{plan}'
@@ -3,19 +3,27 @@
 import dataclasses
 import datetime
 from collections import Counter
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
 import pytest
 import pytest_asyncio
-from sqlalchemy import select
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import selectinload
 
 import data.mock_data
 import data.setup
-from data.repository import SelectionRepository, SpeechRepository, UserRepository
-from data.tables import Selection, Settings, Speech, TimeSlot
-from dto import SpeechDto, TimeSlotDto
+from data.repository import (
+    ConferenceRepository,
+    FileRepository,
+    SelectionRepository,
+    SpeechRepository,
+    UserRepository,
+)
+from data.tables import ScheduleStaging, Selection, Settings, Speech, TimeSlot
+from dto import ConferenceDto, SpeechDto, TimeSlotDto
 
 
 @pytest_asyncio.fixture  # type: ignore
@@ -59,8 +67,8 @@ def old_speeches(old_slots: list[TimeSlotDto]):
 
 
 @pytest.mark.asyncio
-async def test_save_selection_add(session_maker: async_sessionmaker[AsyncSession]):
-    selection_repository = SelectionRepository(session_maker)
+async def test_save_selection_add(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    selection_repository = SelectionRepository(session_maker, conference)
 
     await selection_repository.save_selection(42, 1, 3)
 
@@ -73,10 +81,10 @@ async def test_save_selection_add(session_maker: async_sessionmaker[AsyncSession
 
 
 @pytest.mark.asyncio
-async def test_save_selection_replace(session_maker: async_sessionmaker[AsyncSession]):
+async def test_save_selection_replace(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
     async with session_maker() as session, session.begin():
         session.add(Selection(attendee=42, time_slot_id=1, speech_id=1))
-    selection_repository = SelectionRepository(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
 
     await selection_repository.save_selection(42, 1, 3)
 
@@ -89,10 +97,10 @@ async def test_save_selection_replace(session_maker: async_sessionmaker[AsyncSes
 
 
 @pytest.mark.asyncio
-async def test_save_selection_remove(session_maker: async_sessionmaker[AsyncSession]):
+async def test_save_selection_remove(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
     async with session_maker() as session, session.begin():
         session.add(Selection(attendee=42, time_slot_id=1, speech_id=1))
-    selection_repository = SelectionRepository(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
 
     await selection_repository.save_selection(42, 1, None)
 
@@ -116,20 +124,21 @@ async def _generate_mock_users(session_maker: async_sessionmaker[AsyncSession]):
 
 
 @pytest.mark.asyncio
-async def test_get_users_selected(session_maker: async_sessionmaker[AsyncSession]):
+async def test_get_users_selected(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
     await _generate_mock_users(session_maker)
-    selection_repository = SelectionRepository(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
 
     result = await selection_repository.get_users_that_selected(2)
 
     assert Counter(x.attendee for x in result) == Counter((41, 42, 43, 45))
     assert tuple(x.speech.id for x in result) == (2, 2, 2, 2)
+    assert len({id(x.speech) for x in result}) == 1
 
 
 @pytest.mark.asyncio
-async def test_get_changing_users(session_maker: async_sessionmaker[AsyncSession]):
+async def test_get_changing_users(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
     await _generate_mock_users(session_maker)
-    selection_repository = SelectionRepository(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
 
     result = await selection_repository.get_changing_users(2, 1)
 
@@ -137,6 +146,39 @@ async def test_get_changing_users(session_maker: async_sessionmaker[AsyncSession
     assert tuple(x.speech.id for x in result) == (2, 2, 2)
 
 
+@pytest.mark.asyncio
+async def test_stream_users_selected(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    await _generate_mock_users(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
+
+    chunks = [chunk async for chunk in selection_repository.stream_users_that_selected(2, chunk_size=3)]
+
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert Counter(tuple(row) for chunk in chunks for row in chunk) == Counter(((41, 2), (42, 2), (43, 2), (45, 2)))
+
+
+@pytest.mark.asyncio
+async def test_stream_changing_users(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    await _generate_mock_users(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
+
+    chunks = [chunk async for chunk in selection_repository.stream_changing_users(2, 1, chunk_size=2)]
+
+    assert Counter(tuple(row) for chunk in chunks for row in chunk) == Counter(((42, 2), (43, 2), (45, 2)))
+
+
+@pytest.mark.asyncio
+async def test_stream_user_ids_selected(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    await _generate_mock_users(session_maker)
+    selection_repository = SelectionRepository(session_maker, conference)
+
+    chunks = [chunk async for chunk in selection_repository.stream_user_ids_that_selected((1, 2), chunk_size=3)]
+
+    assert [tuple(row) for chunk in chunks for row in chunk] == [
+        (41, 1), (41, 2), (42, 1), (42, 2), (43, 2), (44, 1), (45, 2), (46, 2)]
+    assert max(len(chunk) for chunk in chunks) == 3
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize('previous', [True, False, None])
 async def test_save_notification_setting(session_maker: async_sessionmaker[AsyncSession], previous: bool | None):
@@ -154,34 +196,13 @@ async def test_save_notification_setting(session_maker: async_sessionmaker[Async
         assert settings.notifications_enabled is True
 
 
-@pytest.mark.asyncio
-async def test_find_or_create_slots(session_maker: async_sessionmaker[AsyncSession], old_slots: list[TimeSlotDto],
-                                    new_slot: TimeSlotDto):
-    speech_repository = SpeechRepository(session_maker)
-
-    async with session_maker() as session, session.begin():
-        slot_mapping = await speech_repository.find_or_create_slots([*old_slots, new_slot], session)
-
-    assert slot_mapping[old_slots[0].date, old_slots[0].start_time, old_slots[0].end_time].id == 1
-    assert slot_mapping[old_slots[1].date, old_slots[1].start_time, old_slots[1].end_time].id == 2
-    assert slot_mapping[old_slots[2].date, old_slots[2].start_time, old_slots[2].end_time].id == 3
-    assert slot_mapping[new_slot.date, new_slot.start_time, new_slot.end_time].id == 4
-    async with session_maker() as session:
-        result = await session.scalar(select(TimeSlot).where(TimeSlot.id == 4))
-        assert result is not None
-        assert result.date == new_slot.date
-        assert result.start_time == new_slot.start_time
-        assert result.end_time == new_slot.end_time
-
-
 @pytest.mark.asyncio
 @pytest.mark.parametrize('location_new', [False, True])
 async def test_insert_or_update_speeches(session_maker: async_sessionmaker[AsyncSession], old_speeches: list[SpeechDto],
-                                         location_new: bool):
-    speech_repository = SpeechRepository(session_maker)
+                                         location_new: bool, conference: ConferenceDto):
+    speech_repository = SpeechRepository(session_maker, conference)
     updated_speech = dataclasses.replace(old_speeches[1], title='Updated Title', speaker='Updated Speaker')
-    slot = dataclasses.replace(old_speeches[1].time_slot, id=2)
-    updated_speech = dataclasses.replace(updated_speech, time_slot=slot)
+    slot = updated_speech.time_slot
     if location_new:
         updated_speech = dataclasses.replace(updated_speech, location='B')
         location = 'B'
@@ -189,7 +210,7 @@ async def test_insert_or_update_speeches(session_maker: async_sessionmaker[Async
         location = old_speeches[1].location
 
     async with session_maker() as session, session.begin():
-        await speech_repository.update_or_insert_speeches([updated_speech], session)
+        await speech_repository.import_speeches([updated_speech], (), session)
 
     async with session_maker() as session:
         result = await session.scalars(select(Speech).join(TimeSlot)
@@ -208,14 +229,190 @@ async def test_insert_or_update_speeches(session_maker: async_sessionmaker[Async
 
 
 @pytest.mark.asyncio
-async def test_delete_speeches(session_maker: async_sessionmaker[AsyncSession]):
-    speech_repository = SpeechRepository(session_maker)
+async def test_import_speeches(session_maker: async_sessionmaker[AsyncSession], old_slots: list[TimeSlotDto],
+                               new_slot: TimeSlotDto, conference: ConferenceDto):
+    speech_repository = SpeechRepository(session_maker, conference)
+    speeches = [SpeechDto(None, 'Draft', 'Someone', new_slot, 'A'),
+                SpeechDto(None, 'Final', 'Someone', new_slot, 'A'),
+                SpeechDto(None, 'About something else', 'Jane Doe', old_slots[1], 'A'),
+                SpeechDto(None, 'Renamed', 'Mr. Alternative', old_slots[2], 'B')]
+    deletes = [(old_slots[0], 'B'), (old_slots[2], 'C')]
+
+    async with session_maker() as session, session.begin():
+        slots = await speech_repository.import_speeches(speeches, deletes, session)
+
+    assert {(slot.id, slot.date, slot.start_time, slot.end_time) for slot in slots} == {
+        (i + 1, slot.date, slot.start_time, slot.end_time) for i, slot in enumerate([*old_slots, new_slot])}
+    async with session_maker() as session:
+        rows = (await session.execute(select(Speech.time_slot_id, Speech.location, Speech.title)
+                                      .order_by(Speech.time_slot_id, Speech.location))).all()
+        assert await session.scalar(select(func.count()).select_from(ScheduleStaging)) == 0
+    assert rows == [(1, 'A', 'About something'), (2, 'A', 'About something else'), (3, 'A', 'New day talk'),
+                    (3, 'B', 'Renamed'), (4, 'A', 'Final')]
+
+
+@pytest.mark.asyncio
+async def test_delete_speeches(session_maker: async_sessionmaker[AsyncSession], old_slots: list[TimeSlotDto],
+                               conference: ConferenceDto):
+    speech_repository = SpeechRepository(session_maker, conference)
 
     async with session_maker() as session, session.begin():
-        await speech_repository.delete_speeches([(1, 'B'), (2, 'A')], session)
+        await speech_repository.import_speeches((), [(old_slots[0], 'B'), (old_slots[1], 'A')], session)
 
     async with session_maker() as session:
         result = await session.scalars(select(Speech))
         speeches = result.all()
         assert len(speeches) == 3
         assert {speech.id for speech in speeches} == {1, 4, 5}
+
+
+@pytest.mark.asyncio
+async def test_schedule_served_from_snapshot(session_maker: async_sessionmaker[AsyncSession],
+                                             old_slots: list[TimeSlotDto], conference: ConferenceDto):
+    speech_repository = SpeechRepository(session_maker, conference)
+    speeches = await speech_repository.get_all_speeches()
+    slot, options = await speech_repository.get_in_time_slot(1)
+
+    async with session_maker() as session, session.begin():
+        await speech_repository.import_speeches((), [(old_slots[0], 'B')], session)
+
+    assert await speech_repository.get_all_speeches() == speeches
+    assert (await speech_repository.get_schedule()).version == 1
+    assert slot.id == 1
+    assert [speech.location for speech in options] == ['A', 'B']
+
+    await speech_repository.reload_schedule()
+
+    schedule = await speech_repository.get_schedule()
+    assert schedule.version == 2
+    assert len(await speech_repository.get_all_speeches()) == len(speeches) - 1
+    assert [speech.location for speech in (await speech_repository.get_in_time_slot(1))[1]] == ['A']
+    assert schedule.speeches_by_id.keys() == {1, 2, 4, 5}
+    assert [speech.id for speech in schedule.speeches_by_location['A']] == [1, 2, 4]
+
+
+@pytest.mark.asyncio
+async def test_refresh_schedule(session_maker: async_sessionmaker[AsyncSession], old_slots: list[TimeSlotDto],
+                                conference: ConferenceDto):
+    writer = SpeechRepository(session_maker, conference)
+    reader = SpeechRepository(session_maker, conference)
+    await writer.get_schedule()
+    await reader.get_schedule()
+    assert not await reader.refresh_schedule()
+
+    async with session_maker() as session, session.begin():
+        await writer.import_speeches((), [(old_slots[0], 'B')], session)
+        await writer.bump_revision(session)
+    await writer.reload_schedule()
+
+    assert not await writer.refresh_schedule()
+    assert await reader.refresh_schedule()
+    assert (await reader.get_schedule()).speeches_by_id.keys() == {1, 2, 4, 5}
+    assert not await reader.refresh_schedule()
+
+
+@pytest.mark.asyncio
+async def test_conferences_are_isolated(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    conferences = ConferenceRepository(session_maker)
+    assert await conferences.get_or_create('default', 'UTC', 2000) == conference
+    other = await conferences.get_or_create('other', 'Europe/Moscow', 2026)
+    assert await conferences.get_or_create('other', 'UTC', 2000) == other
+
+    timezone = ZoneInfo('Europe/Moscow')
+    other_speeches = SpeechRepository(session_maker, other)
+    slot = TimeSlotDto(None, datetime.date(2025, 6, 1), datetime.time(9, tzinfo=timezone),
+                       datetime.time(10, tzinfo=timezone))
+    async with session_maker() as session, session.begin():
+        # the same time as the first default slot, but a separate slot of the other conference
+        other_slot, = await other_speeches.import_speeches([SpeechDto(None, 'Other talk', 'Speaker', slot, 'A')], (),
+                                                           session)
+    assert other_slot.id not in {slot.id for slot in await SpeechRepository(session_maker, conference).get_all_slots()}
+    assert [speech.title for speech in await other_speeches.get_all_speeches()] == ['Other talk']
+    assert len(await SpeechRepository(session_maker, conference).get_all_speeches()) == 5
+
+    speech_id = (await other_speeches.get_all_speeches())[0].id
+    assert other_slot.id is not None
+    assert speech_id is not None
+    await SelectionRepository(session_maker, conference).save_selection(41, 1, 1)
+    await SelectionRepository(session_maker, conference).save_selection(41, other_slot.id, speech_id)
+    assert [speech.title for speech in await SelectionRepository(session_maker, other).get_selected_speeches(41)] \
+        == ['Other talk']
+    assert len(await SelectionRepository(session_maker, conference).get_selected_speeches(41)) == 1
+
+
+@pytest.mark.asyncio
+async def test_admin_cache(session_maker: async_sessionmaker[AsyncSession]):
+    async with session_maker() as session, session.begin():
+        session.add_all((Settings(user_id=41, admin=True), Settings(user_id=42, username='user42')))
+    user_repository = UserRepository(session_maker)
+    await user_repository.load_admins()
+
+    async with session_maker() as session, session.begin():
+        session.add(Settings(user_id=43, admin=True))
+
+    assert await user_repository.is_admin(41)
+    assert not await user_repository.is_admin(43)
+
+    await user_repository.set_admin(41, False)
+    assert await user_repository.set_admin_by_username('user42', True)
+    assert not await user_repository.set_admin_by_username('unknown', True)
+
+    assert not await user_repository.is_admin(41)
+    assert await user_repository.is_admin(42)
+    assert await user_repository.load_admins() == {42, 43}
+
+
+@pytest.mark.asyncio
+async def test_conflicting_slot_is_not_dropped(session_maker: async_sessionmaker[AsyncSession],
+                                               conference: ConferenceDto):
+    async with session_maker() as session, session.begin():
+        # a slot uniqueness that ignores the conference, as left by an incomplete upgrade
+        await session.execute(text('CREATE UNIQUE INDEX ix_slot_time ON time_slots (date, start_time, end_time)'))
+    other = await ConferenceRepository(session_maker).get_or_create('other', 'Asia/Novosibirsk', 2025)
+    slot = (await SpeechRepository(session_maker, conference).get_all_slots())[0]
+    speech = SpeechDto(None, 'Other talk', 'Speaker', dataclasses.replace(slot, id=None), 'A')
+
+    with pytest.raises(IntegrityError):
+        async with session_maker() as session, session.begin():
+            await SpeechRepository(session_maker, other).import_speeches([speech], (), session)
+
+
+@pytest.mark.asyncio
+async def test_shared_admins(session_maker: async_sessionmaker[AsyncSession]):
+    async with session_maker() as session, session.begin():
+        session.add(Settings(user_id=41, admin=True))
+    user_repository = UserRepository(session_maker, shared=True)
+    await user_repository.load_admins()
+    assert await user_repository.is_admin(41)
+
+    await UserRepository(session_maker).set_admin(41, False)
+
+    assert not await user_repository.is_admin(41)
+    assert not await user_repository.is_admin(43)
+
+
+@pytest.mark.asyncio
+async def test_add_files_again(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    file_repository = FileRepository(session_maker, conference)
+    await file_repository.add_files([('schedule', Path('schedule.pdf')), ('map', Path('map.pdf'))])
+    await file_repository.set_telegram_id('schedule', 'telegram-schedule')
+    await file_repository.set_telegram_id('map', 'telegram-map')
+
+    await file_repository.add_files([('schedule', Path('schedule.pdf')), ('map', Path('new_map.pdf'))])
+
+    assert await file_repository.get_file('schedule') == 'telegram-schedule'
+    assert await file_repository.get_file('map') == Path('new_map.pdf')
+
+
+@pytest.mark.asyncio
+async def test_files_are_per_conference(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    other = await ConferenceRepository(session_maker).get_or_create('other', 'Europe/Moscow', 2026)
+    file_repository = FileRepository(session_maker, conference)
+    other_files = FileRepository(session_maker, other)
+    await file_repository.add_files([('schedule', Path('schedule.pdf'))])
+    await other_files.add_files([('schedule', Path('other.pdf'))])
+
+    await other_files.set_telegram_id('schedule', 'telegram-other')
+
+    assert await file_repository.get_file('schedule') == Path('schedule.pdf')
+    assert await other_files.get_file('schedule') == 'telegram-other'
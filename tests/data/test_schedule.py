@@ -0,0 +1,35 @@
+import datetime
+
+from data.schedule import ChangeKind, ScheduleSnapshot, diff_schedules
+from dto import SpeechDto, TimeSlotDto
+
+FIRST = TimeSlotDto(1, datetime.date(2025, 6, 1), datetime.time(9), datetime.time(10))
+SECOND = TimeSlotDto(2, datetime.date(2025, 6, 1), datetime.time(10), datetime.time(11))
+
+
+def _snapshot(*speeches: tuple[TimeSlotDto, str, str]):
+    return ScheduleSnapshot.build(1, (FIRST, SECOND), [SpeechDto(None, title, 'Speaker', slot, location)
+                                                       for slot, location, title in speeches])
+
+
+def test_diff_schedules():
+    old = _snapshot((FIRST, 'A', 'Stays'), (FIRST, 'B', 'Changes room'), (FIRST, 'C', 'Changes time'),
+                    (SECOND, 'A', 'Old title'), (SECOND, 'B', 'Cancelled'))
+    new = _snapshot((FIRST, 'A', 'Stays'), (FIRST, 'D', 'Changes room'), (SECOND, 'C', 'Changes time'),
+                    (SECOND, 'A', 'New title'), (SECOND, 'D', 'Added'))
+
+    changes = diff_schedules(old, new)
+
+    assert {(change.kind, change.speech.title, change.previous.title if change.previous else None)
+            for change in changes} == {
+        (ChangeKind.MOVED_ROOM, 'Changes room', 'Changes room'),
+        (ChangeKind.MOVED_TIME, 'Changes time', 'Changes time'),
+        (ChangeKind.RETITLED, 'New title', 'Old title'),
+        (ChangeKind.REMOVED, 'Cancelled', None),
+        (ChangeKind.ADDED, 'Added', None),
+    }
+    assert set().union(*(change.slot_ids for change in changes)) == {1, 2}
+    # outside the given slots a moved talk looks removed
+    assert {(change.kind, change.speech.title) for change in diff_schedules(old, new, {1})} == {
+        (ChangeKind.MOVED_ROOM, 'Changes room'), (ChangeKind.REMOVED, 'Changes time')}
+    assert diff_schedules(new, new) == []
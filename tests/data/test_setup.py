@@ -0,0 +1,130 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import insert, inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import data.setup
+from data.tables import Base, SchemaVersion
+
+
+@pytest.mark.asyncio
+async def test_fresh_database(tmp_path: Path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+
+    await data.setup.create_tables(engine)
+    await data.setup.create_tables(engine)
+
+    async with engine.connect() as conn:
+        versions = (await conn.scalars(select(SchemaVersion.version))).all()
+    assert versions == [data.setup.SCHEMA_VERSION]
+
+
+@pytest.mark.asyncio
+async def test_upgrade_adds_indexes(tmp_path: Path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for name in ('ix_selections_slot', 'ix_selections_speech', 'ix_settings_username'):
+            await conn.execute(text(f'DROP INDEX {name}'))
+        await conn.execute(text('DROP TABLE schema_version'))
+
+    await data.setup.create_tables(engine)
+
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(lambda sync_conn: {
+            index['name'] for table in ('selections', 'settings') for index in inspect(sync_conn).get_indexes(table)})
+        version = await conn.scalar(select(SchemaVersion.version))
+    assert {'ix_selections_slot', 'ix_selections_speech', 'ix_settings_username'} <= indexes
+    assert version == data.setup.SCHEMA_VERSION
+
+
+@pytest.mark.asyncio
+async def test_upgrade_adds_conferences(tmp_path: Path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    async with engine.begin() as conn:
+        await conn.execute(text('CREATE TABLE time_slots (id INTEGER PRIMARY KEY, date DATE NOT NULL, '
+                                'start_time TIME NOT NULL, end_time TIME NOT NULL, '
+                                'UNIQUE (date, start_time, end_time))'))
+        await conn.execute(text("INSERT INTO time_slots VALUES (1, '2025-06-01', '09:00:00', '10:00:00')"))
+        await conn.execute(text('CREATE TABLE reminder_jobs (id VARCHAR PRIMARY KEY)'))
+        await conn.execute(text('CREATE TABLE schema_version (version INTEGER PRIMARY KEY)'))
+        await conn.execute(text('INSERT INTO schema_version VALUES (1)'))
+
+    await data.setup.create_tables(engine)
+
+    async with engine.connect() as conn:
+        conference_ids = (await conn.scalars(text('SELECT conference_id FROM time_slots'))).all()
+        job_columns = await conn.run_sync(lambda sync_conn: {
+            column['name'] for column in inspect(sync_conn).get_columns('reminder_jobs')})
+        indexes = await conn.run_sync(lambda sync_conn: {
+            index['name'] for index in inspect(sync_conn).get_indexes('time_slots')})
+    assert conference_ids == [1]
+    assert 'conference_id' in job_columns
+    assert 'ix_time_slots_conference' in indexes
+
+
+@pytest.mark.asyncio
+async def test_upgrade_scopes_slots_to_conferences(tmp_path: Path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text('DROP TABLE time_slots'))
+        await conn.execute(text('CREATE TABLE time_slots (id INTEGER PRIMARY KEY, date DATE NOT NULL, '
+                                'start_time TIME NOT NULL, end_time TIME NOT NULL, '
+                                'conference_id INTEGER NOT NULL DEFAULT 1, UNIQUE (date, start_time, end_time))'))
+        await conn.execute(text("INSERT INTO time_slots VALUES (7, '2025-06-01', '09:00:00', '10:00:00', 1)"))
+        await conn.execute(text("INSERT INTO conferences VALUES (1, 'default', 'UTC', 2025), "
+                                "(2, 'other', 'UTC', 2025)"))
+        await conn.execute(insert(SchemaVersion).values(version=2))
+
+    await data.setup.create_tables(engine)
+
+    async with engine.begin() as conn:
+        await conn.execute(text('INSERT INTO time_slots (id, date, start_time, end_time, conference_id) '
+                                "VALUES (8, '2025-06-01', '09:00:00', '10:00:00', 2)"))
+        slots = (await conn.execute(text('SELECT id, conference_id FROM time_slots ORDER BY id'))).all()
+        constraints = await conn.run_sync(lambda sync_conn: [
+            constraint['column_names'] for constraint in inspect(sync_conn).get_unique_constraints('time_slots')])
+        indexes = await conn.run_sync(lambda sync_conn: {
+            index['name'] for index in inspect(sync_conn).get_indexes('time_slots')})
+    assert [tuple(slot) for slot in slots] == [(7, 1), (8, 2)]
+    assert constraints == [['conference_id', 'date', 'start_time', 'end_time']]
+    assert 'ix_time_slots_conference' in indexes
+
+
+@pytest.mark.asyncio
+async def test_upgrade_scopes_outbox_and_files_to_conferences(tmp_path: Path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for table in ('outbox', 'outbox_messages', 'files'):
+            await conn.execute(text(f'DROP TABLE {table}'))
+        await conn.execute(text('CREATE TABLE outbox_messages (id INTEGER PRIMARY KEY, payload VARCHAR NOT NULL)'))
+        await conn.execute(text('CREATE TABLE outbox (chat_id BIGINT NOT NULL, key VARCHAR NOT NULL, '
+                                'message_id INTEGER NOT NULL REFERENCES outbox_messages (id), '
+                                'status VARCHAR(7) NOT NULL, attempts INTEGER NOT NULL, '
+                                'next_attempt DATETIME NOT NULL, PRIMARY KEY (chat_id, key))'))
+        await conn.execute(text('CREATE INDEX ix_outbox_due ON outbox (status, next_attempt)'))
+        await conn.execute(text('CREATE TABLE files (id VARCHAR PRIMARY KEY, local_path VARCHAR NOT NULL, '
+                                'telegram_id VARCHAR)'))
+        await conn.execute(text('INSERT INTO outbox_messages VALUES (5, \'{"text": "Hello"}\')'))
+        await conn.execute(text("INSERT INTO outbox VALUES (41, 'key', 5, 'PENDING', 0, '2025-06-01 09:00:00')"))
+        await conn.execute(text("INSERT INTO files VALUES ('schedule', 'files/general.pdf', 'telegram-id')"))
+        await conn.execute(insert(SchemaVersion).values(version=3))
+
+    await data.setup.create_tables(engine)
+
+    async with engine.begin() as conn:
+        messages = (await conn.execute(text('SELECT id, conference_id FROM outbox_messages'))).all()
+        entries = (await conn.execute(text('SELECT conference_id, chat_id, key, message_id FROM outbox'))).all()
+        files = (await conn.execute(text('SELECT conference_id, id, telegram_id FROM files'))).all()
+        keys = await conn.run_sync(lambda sync_conn: {
+            table: inspect(sync_conn).get_pk_constraint(table)['constrained_columns'] for table in ('outbox', 'files')})
+        indexes = await conn.run_sync(lambda sync_conn: {
+            index['name']: index['column_names'] for index in inspect(sync_conn).get_indexes('outbox')})
+    assert [tuple(message) for message in messages] == [(5, 1)]
+    assert [tuple(entry) for entry in entries] == [(1, 41, 'key', 5)]
+    assert [tuple(file) for file in files] == [(1, 'schedule', 'telegram-id')]
+    assert keys == {'outbox': ['conference_id', 'chat_id', 'key'], 'files': ['conference_id', 'id']}
+    assert indexes['ix_outbox_due'] == ['conference_id', 'status', 'next_attempt']
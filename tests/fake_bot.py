@@ -1,11 +1,11 @@
 import datetime
 import typing
 from collections.abc import Mapping
-from io import BytesIO
 from typing import Any, Self
 
 import pytest
 from aiogram import Bot, Router
+from aiogram.client.telegram import PRODUCTION
 from aiogram.fsm.context import FSMContext
 from aiogram.methods import (
     AnswerCallbackQuery,
@@ -20,6 +20,7 @@ from aiogram.types import (
     Chat,
     ChatIdUnion,
     Document,
+    File,
     FSInputFile,
     InlineKeyboardMarkup,
     InputFile,
@@ -49,7 +50,23 @@ class StateFake(FSMContext):
         self.data.clear()
 
 
+class SessionFake:
+    def __init__(self, files: Mapping[str, bytes]):
+        self.api = PRODUCTION
+        self.streamed_bytes = 0
+        self._files = files
+
+    async def stream_content(self, url: str, chunk_size: int = 65536, **_: Any):
+        content = self._files[url.rsplit('/', 1)[-1]]
+        for start in range(0, len(content), chunk_size):
+            chunk = content[start:start + chunk_size]
+            self.streamed_bytes += len(chunk)
+            yield chunk
+
+
 class BotFake:
+    token = '42:TEST'  # noqa: S105
+
     def __init__(self, **kwargs: Any) -> None:
         self.router = Router()
         self.sent_messages: list[str] = []
@@ -65,6 +82,10 @@ class BotFake:
         async def nop(*_: Any): pass  # Do nothing by default
         self._data['schedule_update_callback'] = nop
         self.pinned: dict[ChatIdUnion, list[Message]] = {}
+        self.session = SessionFake(self._files)
+
+    def inject(self, **kwargs: Any):
+        self._data.update(kwargs)
 
     @property
     def bot(self):
@@ -127,8 +148,8 @@ class BotFake:
     def send_message(self, chat_id: ChatIdUnion, text: str):
         return self(SendMessage(chat_id=chat_id, text=text))
 
-    async def download(self, file_id: str):  # NOSONAR
-        return BytesIO(self._files[file_id])
+    async def get_file(self, file_id: str):  # NOSONAR
+        return File(file_id=file_id, file_unique_id=file_id, file_path=file_id)
 
     def message(self, text: str, user_id: int = 42, chat_id: int = 42, username: str | None = 'testUser',
                 file: tuple[str, bytes] | None = None):
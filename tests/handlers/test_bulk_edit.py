@@ -0,0 +1,206 @@
+# ruff : noqa: PLR2004
+
+import datetime
+import itertools
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from aiogram.types import Chat, InlineKeyboardMarkup, Message
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import data.mock_data
+import data.setup
+from data.repository import SelectionRepository, SpeechRepository
+from data.schedule import ScheduleSnapshot
+from data.tables import Selection
+from dto import ConferenceDto, SpeechDto, TimeSlotDto
+from handlers import bulk_edit
+
+
+@pytest_asyncio.fixture  # type: ignore
+async def session_maker():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    session_maker = async_sessionmaker(engine)
+    await data.setup.create_tables(engine)
+    await data.mock_data.fill_tables(session_maker)
+    async with session_maker() as session, session.begin():
+        session.add(Selection(attendee=42, time_slot_id=1, speech_id=3))
+    return session_maker
+
+
+@pytest.fixture
+def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SpeechRepository(session_maker, conference)
+
+
+@pytest.fixture
+def selection_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SelectionRepository(session_maker, conference)
+
+
+def _message(markup: InlineKeyboardMarkup | None = None):
+    return Message(message_id=1, date=datetime.datetime(2025, 1, 1),  # noqa: DTZ001
+                   chat=Chat(id=42, type='private'), reply_markup=markup).as_(AsyncMock())
+
+
+def _callback(data: str, message: Message):
+    callback = AsyncMock(data=data, message=message)
+    callback.from_user.id = 42
+    return callback
+
+
+def _labels(markup: InlineKeyboardMarkup):
+    return [[button.text for button in row] for row in markup.inline_keyboard]
+
+
+def _answered_markup(message: AsyncMock):
+    markup = message.answer.await_args.kwargs['reply_markup']
+    assert isinstance(markup, InlineKeyboardMarkup)
+    return markup
+
+
+def _edited_markup(message: Message):
+    markup = message.bot.await_args.args[0].reply_markup  # type: ignore
+    assert isinstance(markup, InlineKeyboardMarkup)
+    return markup
+
+
+async def _open_day(speech_repository: SpeechRepository, selection_repository: SelectionRepository):
+    message = AsyncMock()
+    await bulk_edit.handle_day_selection(_callback('bulk_day#2025-06-01', message), speech_repository,
+                                         selection_repository)
+    return _answered_markup(message)
+
+
+def test_router():
+    assert bulk_edit.get_router() is not None
+
+
+@pytest.mark.asyncio
+async def test_day_picker(speech_repository: SpeechRepository):
+    message = AsyncMock()
+    await bulk_edit.handle_bulk_edit(message, speech_repository)
+    markup = _answered_markup(message)
+    assert [button.callback_data for button in markup.inline_keyboard[0]] == ['bulk_day#2025-06-01',
+                                                                               'bulk_day#2025-06-02']
+
+
+@pytest.mark.asyncio
+async def test_day_grid(speech_repository: SpeechRepository, selection_repository: SelectionRepository):
+    message = AsyncMock()
+    await bulk_edit.handle_day_selection(_callback('bulk_day#2025-06-01', message), speech_repository,
+                                         selection_repository)
+    message.answer.assert_called_once()
+    kwargs = message.answer.await_args.kwargs
+    for substring in 'About something', 'Alternative point', 'About something else', '09:00 - 10:00':
+        assert substring in kwargs['text']
+    assert _labels(_answered_markup(message)) == [['09:00', 'A', '✅ B'], ['10:00', 'A'], ['Сохранить', 'Отмена']]
+
+
+@pytest.mark.asyncio
+async def test_pick_only_edits_keyboard(speech_repository: SpeechRepository,
+                                        selection_repository: SelectionRepository):
+    message = _message(await _open_day(speech_repository, selection_repository))
+    callback = _callback('bulk_pick#1#1', message)
+    await bulk_edit.handle_pick(callback)
+    callback.answer.assert_called_once()
+    message.bot.assert_called_once()  # type: ignore
+    markup = _edited_markup(message)
+    assert _labels(markup) == [['09:00', '✅ A', 'B'], ['10:00', 'A'], ['Сохранить', 'Отмена']]
+
+    message = _message(markup)
+    await bulk_edit.handle_pick(_callback('bulk_pick#1#1', message))
+    markup = _edited_markup(message)
+    assert _labels(markup)[0] == ['09:00', 'A', 'B']
+
+
+@pytest.mark.asyncio
+async def test_save(speech_repository: SpeechRepository, selection_repository: SelectionRepository,
+                    session_maker: async_sessionmaker[AsyncSession]):
+    markup = await _open_day(speech_repository, selection_repository)
+    for query in 'bulk_pick#1#3', 'bulk_pick#2#2':
+        message = _message(markup)
+        await bulk_edit.handle_pick(_callback(query, message))
+        markup = _edited_markup(message)
+    assert bulk_edit.read_choices(markup.inline_keyboard) == {1: None, 2: 2}
+
+    message = _message(markup)
+    callback = _callback('bulk_save', message)
+    await bulk_edit.handle_save(callback, speech_repository, selection_repository)
+    callback.answer.assert_called_once_with('Сохранено')
+    async with session_maker() as session:
+        result = await session.execute(select(Selection.time_slot_id, Selection.speech_id)
+                                       .where(Selection.attendee == 42))
+        assert set(result) == {(2, 2)}
+
+
+@pytest.mark.asyncio
+async def test_save_rejects_outdated_keyboard(speech_repository: SpeechRepository,
+                                              selection_repository: SelectionRepository,
+                                              session_maker: async_sessionmaker[AsyncSession]):
+    markup = await _open_day(speech_repository, selection_repository)
+    rows = [*markup.inline_keyboard]
+    rows[0] = [*rows[0], rows[0][1].model_copy(update={'text': '✅ C', 'callback_data': 'bulk_pick#1#4'})]
+    rows[0][1] = rows[0][1].model_copy(update={'text': 'A'})
+    rows[0][2] = rows[0][2].model_copy(update={'text': 'B'})
+
+    callback = _callback('bulk_save', _message(InlineKeyboardMarkup(inline_keyboard=rows)))
+    await bulk_edit.handle_save(callback, speech_repository, selection_repository)
+
+    callback.answer.assert_called_once_with('Расписание изменилось, откройте день заново', show_alert=True)
+    async with session_maker() as session:
+        result = await session.execute(select(Selection.time_slot_id, Selection.speech_id)
+                                       .where(Selection.attendee == 42))
+        assert set(result) == {(1, 3)}
+
+
+def _large_schedule(slot_count: int, speech_count: int):
+    date = datetime.date(2025, 6, 1)
+    slots = [TimeSlotDto(slot_id, date, datetime.time(slot_id % 24), datetime.time(slot_id % 24))
+             for slot_id in range(1, slot_count + 1)]
+    speech_ids = itertools.count(1)
+    speeches = [SpeechDto(next(speech_ids), 'Title', 'Speaker', slot, f'Room {room}')
+                for slot in slots for room in range(speech_count)]
+    return ScheduleSnapshot.build(0, slots, speeches), date
+
+
+def test_keyboard_rows_are_limited():
+    schedule, date = _large_schedule(2, 20)
+    markup = bulk_edit.build_day_keyboard(schedule, date, set())
+    assert all(len(row) <= bulk_edit.MAX_ROW_BUTTONS for row in markup.inline_keyboard)
+    choices = bulk_edit.read_choices(markup.inline_keyboard)
+    assert choices == {1: None, 2: None}
+
+
+def test_keyboard_is_paginated():
+    schedule, date = _large_schedule(30, 9)
+    pages = bulk_edit.paginate_slots(schedule, date)
+    assert len(pages) > 1
+    assert [slot for page in pages for slot in page] == list(schedule.slots)
+
+    markups = [bulk_edit.build_day_keyboard(schedule, date, set(), pages, page) for page in range(len(pages))]
+    assert all(sum(map(len, markup.inline_keyboard)) <= bulk_edit.MAX_KEYBOARD_BUTTONS for markup in markups)
+    assert _labels(markups[0])[-2] == ['▶']
+    assert _labels(markups[-1])[-2] == ['◀']
+    assert markups[0].inline_keyboard[-2][0].callback_data == 'bulk_page#2025-06-01#1'
+
+
+@pytest.mark.asyncio
+async def test_page_switch_saves_choices(speech_repository: SpeechRepository,
+                                         selection_repository: SelectionRepository,
+                                         session_maker: async_sessionmaker[AsyncSession]):
+    message = _message(await _open_day(speech_repository, selection_repository))
+    await bulk_edit.handle_pick(_callback('bulk_pick#2#2', message))
+    message = _message(_edited_markup(message))
+
+    await bulk_edit.handle_page(_callback('bulk_page#2025-06-01#0', message), speech_repository,
+                                selection_repository)
+
+    async with session_maker() as session:
+        result = await session.execute(select(Selection.time_slot_id, Selection.speech_id)
+                                       .where(Selection.attendee == 42))
+        assert set(result) == {(1, 3), (2, 2)}
+    markup = _edited_markup(message)
+    assert _labels(markup) == [['09:00', 'A', '✅ B'], ['10:00', '✅ A'], ['Сохранить', 'Отмена']]
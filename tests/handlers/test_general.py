@@ -12,7 +12,9 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 import data.mock_data
 import data.setup
 from data.repository import FileRepository, SpeechRepository
+from dto import ConferenceDto
 from handlers import general
+from view.cache import TimetableCache
 
 
 @pytest_asyncio.fixture  # type: ignore
@@ -25,13 +27,13 @@ async def session_maker():
 
 
 @pytest.fixture
-def speech_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SpeechRepository(session_maker)
+def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SpeechRepository(session_maker, conference)
 
 
 @pytest.fixture
-def file_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return FileRepository(session_maker)
+def file_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return FileRepository(session_maker, conference)
 
 
 @pytest.mark.asyncio
@@ -64,7 +66,7 @@ async def test_schedule_all_first(speech_repository: SpeechRepository, file_repo
     callback.message.answer_document.side_effect = fake_answer_document
     await file_repository.add_files([('schedule', Path('schedule.txt'))])
 
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
 
     callback.answer.assert_awaited_once()
     callback.message.answer_document.assert_awaited_once()
@@ -79,7 +81,7 @@ async def test_schedule_all_repeat(speech_repository: SpeechRepository, file_rep
     await file_repository.add_files([('schedule', Path('schedule.txt'))])
     await file_repository.set_telegram_id('schedule', '1234567890')
 
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
 
     callback.answer.assert_awaited_once()
     callback.message.answer_document.assert_awaited_once()
@@ -94,10 +96,10 @@ async def test_schedule_all_repeat(speech_repository: SpeechRepository, file_rep
 async def test_schedule_today(speech_repository: SpeechRepository, file_repository: FileRepository, query: str):
     callback = AsyncMock(data=query)
 
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
 
     callback.answer.assert_awaited_once()
-    callback.message.answer.assert_awaited()
+    callback.message.answer.assert_awaited_once()
     args = '\n'.join(arg.kwargs['text'] for arg in callback.message.answer.await_args_list)
     for substring in ('About something', 'About something else', 'Alternative point', 'Dr. John Doe', 'Jane Doe',
                       'Mr. Alternative', 'A', 'B', '01.06', '9:00', '10:00', '11:00'):
@@ -112,7 +114,7 @@ async def test_schedule_today(speech_repository: SpeechRepository, file_reposito
 async def test_schedule_tomorrow(speech_repository: SpeechRepository, file_repository: FileRepository, query: str):
     callback = AsyncMock(data=query)
 
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
 
     callback.answer.assert_awaited_once()
     callback.message.answer.assert_awaited()
@@ -131,7 +133,7 @@ async def test_schedule_tomorrow(speech_repository: SpeechRepository, file_repos
 async def test_schedule_empty(speech_repository: SpeechRepository, file_repository: FileRepository, query: str):
     callback = AsyncMock(data=query)
 
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
 
     callback.answer.assert_awaited_once()
     callback.message.answer.assert_awaited_once()
@@ -145,7 +147,7 @@ async def test_handle_personal_view_inaccessible(speech_repository: SpeechReposi
     callback.message = InaccessibleMessage(
         chat=Chat(id=1, type=''), message_id=21)
 
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
 
     callback.answer.assert_awaited_once()
     args = callback.answer.await_args.args
@@ -157,6 +159,6 @@ async def test_handle_personal_view_wrong(speech_repository: SpeechRepository,
                                           file_repository: FileRepository,
                                           caplog: pytest.LogCaptureFixture):
     callback = AsyncMock(data='asdf')
-    await general.handle_schedule_selection(callback, speech_repository, file_repository)
+    await general.handle_schedule_selection(callback, speech_repository, file_repository, TimetableCache())
     assert 'Received unknown general command asdf' in caplog.text
     callback.answer.assert_awaited_once_with('Что-то пошло не так')
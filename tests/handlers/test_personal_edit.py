@@ -16,6 +16,7 @@ import data.mock_data
 import data.setup
 from data.repository import SelectionRepository, SpeechRepository
 from data.tables import Selection
+from dto import ConferenceDto
 from handlers import personal_edit
 from handlers.personal_edit import EditingScene, EditIntentionScene, SelectDayScene, SelectSingleScene
 from tests.fake_bot import StateFake
@@ -31,13 +32,14 @@ async def session_maker():
 
 
 @pytest.fixture
-def speech_repository(session_maker: async_sessionmaker[AsyncSession]) -> SpeechRepository:
-    return SpeechRepository(session_maker)
+def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto) -> SpeechRepository:
+    return SpeechRepository(session_maker, conference)
 
 
 @pytest.fixture
-def selection_repository(session_maker: async_sessionmaker[AsyncSession]) -> SelectionRepository:
-    return SelectionRepository(session_maker)
+def selection_repository(session_maker: async_sessionmaker[AsyncSession],
+                         conference: ConferenceDto) -> SelectionRepository:
+    return SelectionRepository(session_maker, conference)
 
 
 @pytest.fixture
@@ -138,12 +140,12 @@ TEST_DATA_DAYS = [
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize(('day', 'slots'), TEST_DATA_DAYS)
-async def test_select_day(speech_repository: SpeechRepository, state: StateFake, day: str, slots: list[int]):
+async def test_select_day(speech_repository: SpeechRepository, day: str, slots: list[int]):
     wizard = AsyncMock()
     scene = SelectDayScene(wizard)
 
     message = AsyncMock()
-    await scene.on_enter(message, state, speech_repository)
+    await scene.on_enter(message, speech_repository)
 
     message.answer.assert_called_once()
     args = message.answer.await_args.kwargs
@@ -151,7 +153,7 @@ async def test_select_day(speech_repository: SpeechRepository, state: StateFake,
     assert '02.06' in args['text']
 
     message = AsyncMock(text=day)
-    await scene.on_message(message, state, speech_repository)
+    await scene.on_message(message, speech_repository)
 
     wizard.goto.assert_called_once()
     args = wizard.goto.await_args.args
@@ -162,12 +164,12 @@ async def test_select_day(speech_repository: SpeechRepository, state: StateFake,
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize('day', ['0', '-1', '3', 'fgz'])
-async def test_select_day_wrong(speech_repository: SpeechRepository, state: StateFake, day: str):
+async def test_select_day_wrong(speech_repository: SpeechRepository, day: str):
     wizard = AsyncMock()
     scene = SelectDayScene(wizard)
 
     message = AsyncMock()
-    await scene.on_enter(message, state, speech_repository)
+    await scene.on_enter(message, speech_repository)
 
     message.answer.assert_called_once()
     args = message.answer.await_args.kwargs
@@ -175,7 +177,7 @@ async def test_select_day_wrong(speech_repository: SpeechRepository, state: Stat
     assert '02.06' in args['text']
 
     message = AsyncMock(text=day)
-    await scene.on_message(message, state, speech_repository)
+    await scene.on_message(message, speech_repository)
 
     message.answer.assert_called_once()
     args = message.answer.await_args.args
@@ -279,7 +281,7 @@ async def test_edit(session_maker: async_sessionmaker[AsyncSession], selection_r
         await scene.on_query(query, state, selection_repository)
     else:
         message = AsyncMock(text='B', from_user=user)
-        await scene.on_message(message, state, selection_repository)
+        await scene.on_message(message, state, selection_repository, speech_repository)
 
     wizard.retake.assert_called_once()
     wizard.retake.assert_awaited_once()
@@ -302,7 +304,7 @@ async def test_edit_remove(session_maker: async_sessionmaker[AsyncSession], sele
         await scene.on_query(query, state, selection_repository)
     else:
         message = AsyncMock(text='Ничего', from_user=user)
-        await scene.on_message(message, state, selection_repository)
+        await scene.on_message(message, state, selection_repository, speech_repository)
 
     wizard.retake.assert_called_once()
     wizard.retake.assert_awaited_once()
@@ -334,7 +336,7 @@ async def test_edit_wrong_message(session_maker: async_sessionmaker[AsyncSession
     _, scene = await _setup_edit(session_maker, speech_repository, state, user, message, query_enter, exist)
 
     message = AsyncMock(text='C', from_user=user)
-    await scene.on_message(message, state, selection_repository)
+    await scene.on_message(message, state, selection_repository, speech_repository)
 
     message.answer.assert_awaited_once()
     args = message.answer.await_args.args
@@ -399,7 +401,7 @@ async def test_edit_cancel(session_maker: async_sessionmaker[AsyncSession],
     wizard, scene = await _setup_edit(session_maker, speech_repository, state, user, message, query_enter, False)
 
     message = AsyncMock(text='Завершить', from_user=user)
-    await scene.on_message(message, state, selection_repository)
+    await scene.on_message(message, state, selection_repository, speech_repository)
 
     wizard.exit.assert_called_once()
     wizard.exit.assert_awaited_once()
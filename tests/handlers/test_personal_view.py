@@ -10,6 +10,7 @@ import data.mock_data
 import data.setup
 from data.repository import SelectionRepository, SpeechRepository
 from data.tables import Selection
+from dto import ConferenceDto
 from handlers.personal_view import get_router, handle_personal_view, handle_personal_view_selection
 
 
@@ -27,13 +28,13 @@ async def session_maker():
 
 
 @pytest_asyncio.fixture  # type: ignore
-async def speech_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SpeechRepository(session_maker)
+async def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SpeechRepository(session_maker, conference)
 
 
 @pytest_asyncio.fixture  # type: ignore
-async def selection_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SelectionRepository(session_maker)
+async def selection_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SelectionRepository(session_maker, conference)
 
 
 def test_router():
@@ -56,7 +57,7 @@ async def test_handle_personal_view_all(selection_repository: SelectionRepositor
     callback.from_user.id = 42
     await handle_personal_view_selection(callback, selection_repository)
     callback.answer.assert_called_once()
-    callback.message.answer.assert_called()
+    callback.message.answer.assert_called_once()
     text = '\n'.join(arg.kwargs['text'] for arg in callback.message.answer.await_args_list)
     for substring in ('About something', 'About something else',
                       'Alternative day 2', 'Dr. John Doe', 'Jane Doe', 'Mr. Alternative', 'A', 'B',
@@ -0,0 +1,39 @@
+import asyncio
+import datetime
+import multiprocessing.queues
+import threading
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from data.engine import create_engine
+from data.repository import LeaseRepository
+from notifications.leader import LeaderElection
+
+LEASE_DURATION = datetime.timedelta(seconds=1)
+RENEW_INTERVAL = 0.1
+
+
+def compete(url: str, name: str, stop: threading.Event, events: multiprocessing.queues.Queue[tuple[str, str, float]]):
+    asyncio.run(_compete(url, name, stop, events))
+
+
+async def _compete(url: str, name: str, stop: threading.Event,
+                   events: multiprocessing.queues.Queue[tuple[str, str, float]]):
+    engine = create_engine(url)
+    election = LeaderElection(LeaseRepository(async_sessionmaker(engine)), holder=name,
+                              lease_duration=LEASE_DURATION, renew_interval=RENEW_INTERVAL)
+
+    async def lead():
+        events.put((name, 'acquired', time.time()))
+        try:
+            await asyncio.Future()
+        finally:
+            events.put((name, 'released', time.time()))
+
+    events.put((name, 'started', time.time()))
+    task = asyncio.create_task(election.run(lead))
+    await asyncio.to_thread(stop.wait)
+    task.cancel()
+    await asyncio.wait((task,))
+    await engine.dispose()
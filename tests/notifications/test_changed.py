@@ -1,24 +1,29 @@
 # ruff: noqa: PLR2004
 
 import datetime
+import functools
 from unittest.mock import AsyncMock, call
 from zoneinfo import ZoneInfo
 
 import pytest
 import pytest_asyncio
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+import data.engine
 import data.mock_data
 import data.setup
-from data.repository import SelectionRepository
-from data.tables import Selection, Settings
-from dto import TimeSlotDto
+from data.repository import OutboxRepository, SelectionRepository
+from data.tables import OutboxMessage, Selection, Settings
+from dto import ConferenceDto, TimeSlotDto
 from notifications.changed import notify_schedule_change
+from notifications.outbox import Outbox
+from notifications.sender import MessageSender
 
 
 @pytest_asyncio.fixture
 async def session_maker():
-    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    engine = data.engine.create_engine('sqlite+aiosqlite:///:memory:')
     session_maker = async_sessionmaker(engine)
     await data.setup.create_tables(engine)
     await data.mock_data.fill_tables(session_maker)
@@ -39,12 +44,15 @@ async def session_maker():
 
 
 @pytest.fixture
-def selection_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SelectionRepository(session_maker)
+def selection_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SelectionRepository(session_maker, conference)
 
 
 @pytest.mark.asyncio
-async def test_notify_schedule_change(selection_repository: SelectionRepository):
+@pytest.mark.parametrize('chunk_size', [1, 3, 1000])
+async def test_notify_schedule_change(session_maker: async_sessionmaker[AsyncSession],
+                                      selection_repository: SelectionRepository, chunk_size: int,
+                                      conference: ConferenceDto):
     timezone = ZoneInfo('Asia/Novosibirsk')
     slots = [
         TimeSlotDto(1, datetime.date(2025, 6, 1), datetime.time(9, tzinfo=timezone),
@@ -54,23 +62,29 @@ async def test_notify_schedule_change(selection_repository: SelectionRepository)
         TimeSlotDto(3, datetime.date(2025, 6, 2), datetime.time(9, tzinfo=timezone),
                     datetime.time(10, tzinfo=timezone)),
     ]
+    selection_repository.stream_user_ids_that_selected = functools.partial(  # type: ignore[method-assign]
+        selection_repository.stream_user_ids_that_selected, chunk_size=chunk_size)
     bot = AsyncMock()
+    outbox = Outbox(OutboxRepository(session_maker, conference), MessageSender(bot))
 
-    await notify_schedule_change(bot, selection_repository, slots)
+    await notify_schedule_change(outbox, selection_repository, slots)
+    await outbox.deliver_due()
 
     expected_calls = (
-        call(41, text='Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
+        call(41, 'Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
              entities=[], parse_mode=None),
-        call(42, text='Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
+        call(42, 'Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
              entities=[], parse_mode=None),
-        call(43, text='Поменялось расписание для следующих слотов:\n10:00 - 11:00\nПроверьте ваш выбор',
+        call(43, 'Поменялось расписание для следующих слотов:\n10:00 - 11:00\nПроверьте ваш выбор',
              entities=[], parse_mode=None),
-        call(44, text='Поменялось расписание для следующих слотов:\n09:00 - 10:00\nПроверьте ваш выбор',
+        call(44, 'Поменялось расписание для следующих слотов:\n09:00 - 10:00\nПроверьте ваш выбор',
              entities=[], parse_mode=None),
-        call(45, text='Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
+        call(45, 'Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
              entities=[], parse_mode=None),
-        call(46, text='Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
+        call(46, 'Поменялось расписание для следующих слотов:\n09:00 - 10:00\n10:00 - 11:00\nПроверьте ваш выбор',
              entities=[], parse_mode=None),
     )
     bot.send_message.assert_has_awaits(expected_calls, any_order=True)
     assert bot.send_message.await_count == 6
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(OutboxMessage)) == 3
@@ -1,25 +1,46 @@
 # ruff: noqa: PLR2004
 
 import asyncio
+import datetime
+from collections import Counter
 from typing import Any
 from unittest.mock import AsyncMock, call
+from zoneinfo import ZoneInfo
 
 import pytest
 import pytest_asyncio
+from apscheduler.events import (  # type: ignore
+    EVENT_JOB_ADDED,
+    EVENT_JOB_MODIFIED,
+    EVENT_JOB_REMOVED,
+    JobEvent,
+)
 from apscheduler.schedulers.asyncio import AsyncIOScheduler  # type: ignore
 from freezegun import freeze_time
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+import data.engine
 import data.mock_data
 import data.setup
-from data.repository import SelectionRepository, SpeechRepository
-from data.tables import Selection, Settings
+from data.repository import (
+    OutboxRepository,
+    ReminderJobRepository,
+    SelectionRepository,
+    SpeechRepository,
+    UserRepository,
+)
+from data.tables import OutboxMessage, Selection, Settings, Speech, TimeSlot
+from dto import ConferenceDto
 from notifications import event_start
+from notifications.outbox import Outbox
+from notifications.planner import AudiencePlanner
+from notifications.sender import MessageSender
 
 
 @pytest_asyncio.fixture
 async def session_maker():
-    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    engine = data.engine.create_engine('sqlite+aiosqlite:///:memory:')
     session_maker = async_sessionmaker(engine)
     await data.setup.create_tables(engine)
     await data.mock_data.fill_tables(session_maker)
@@ -40,19 +61,44 @@ async def session_maker():
 
 
 @pytest.fixture
-def speech_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SpeechRepository(session_maker)
+def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SpeechRepository(session_maker, conference)
 
 
 @pytest.fixture
-def selection_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SelectionRepository(session_maker)
+def selection_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SelectionRepository(session_maker, conference)
+
+
+@pytest.fixture
+def planner(session_maker: async_sessionmaker[AsyncSession], speech_repository: SpeechRepository,
+            selection_repository: SelectionRepository):
+    return AudiencePlanner(speech_repository, selection_repository, UserRepository(session_maker))
+
+
+@pytest.fixture
+def bot():
+    return AsyncMock()
+
+
+@pytest.fixture
+def outbox(session_maker: async_sessionmaker[AsyncSession], bot: AsyncMock, conference: ConferenceDto):
+    return Outbox(OutboxRepository(session_maker, conference), MessageSender(bot))
+
+
+@pytest.fixture
+def job_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return ReminderJobRepository(session_maker, conference)
+
+
+def _job_ids(scheduler: AsyncIOScheduler):
+    return {job.id for job in event_start.get_scheduled_jobs(scheduler)}
 
 
 @pytest.mark.asyncio
-async def test_notify_first(selection_repository: SelectionRepository):
-    bot = AsyncMock()
-    await event_start.notify_first(bot, selection_repository, 1, 5)
+async def test_notify_first(planner: AudiencePlanner, outbox: Outbox, bot: AsyncMock):
+    await event_start.notify_first(outbox, planner, 1, 5)
+    await outbox.deliver_due()
 
     expected_calls_first_event = (
         call(41, 'Через 5 минут начинается доклад "About something" (A)'),
@@ -65,9 +111,19 @@ async def test_notify_first(selection_repository: SelectionRepository):
 
 
 @pytest.mark.asyncio
-async def test_notify_change_location(selection_repository: SelectionRepository):
-    bot = AsyncMock()
-    await event_start.notify_change_location(bot, selection_repository, 2, 1, 5)
+async def test_repeated_reminder_stores_no_payload(planner: AudiencePlanner, outbox: Outbox,
+                                                   session_maker: async_sessionmaker[AsyncSession]):
+    await event_start.notify_first(outbox, planner, 1, 5)
+    await event_start.notify_first(outbox, planner, 1, 5)
+
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(OutboxMessage)) == 2
+
+
+@pytest.mark.asyncio
+async def test_notify_change_location(planner: AudiencePlanner, outbox: Outbox, bot: AsyncMock):
+    await event_start.notify_change_location(outbox, planner, 2, 1, 5)
+    await outbox.deliver_due()
 
     args = (
         call(42, 'Через 5 минут начинается доклад "About something else" (A)'),
@@ -79,8 +135,8 @@ async def test_notify_change_location(selection_repository: SelectionRepository)
 
 
 @pytest.mark.asyncio
-async def test_configure(speech_repository: SpeechRepository, selection_repository: SelectionRepository):
-    bot = AsyncMock()
+async def test_configure(speech_repository: SpeechRepository, planner: AudiencePlanner, outbox: Outbox,
+                         bot: AsyncMock):
     scheduler = AsyncIOScheduler()
     semaphore = asyncio.Semaphore(0)
 
@@ -89,8 +145,9 @@ async def test_configure(speech_repository: SpeechRepository, selection_reposito
     bot.send_message.side_effect = release_semaphore
 
     with freeze_time('2025-06-01 08:54:00', -7, tick=True) as frozen_time:
-        await event_start.configure_events(scheduler, speech_repository, selection_repository, bot, 5)
+        await event_start.configure_events(scheduler, speech_repository, planner, outbox, 5)
         scheduler.start()
+        outbox_task = asyncio.create_task(outbox.run())
 
         bot.send_message.assert_not_called()
 
@@ -121,3 +178,103 @@ async def test_configure(speech_repository: SpeechRepository, selection_reposito
         )
         bot.send_message.assert_has_awaits(expected_calls_second_event, any_order=True)
         assert bot.send_message.await_count == 3
+        outbox_task.cancel()
+
+
+@pytest.mark.asyncio
+@freeze_time('2025-06-01 08:00:00', -7)
+async def test_reconfigure_mutations(speech_repository: SpeechRepository, planner: AudiencePlanner, outbox: Outbox):
+    scheduler = AsyncIOScheduler()
+    mutations: Counter[str] = Counter()
+    kinds = {EVENT_JOB_ADDED: 'added', EVENT_JOB_MODIFIED: 'modified', EVENT_JOB_REMOVED: 'removed'}
+
+    def record(event: JobEvent):
+        mutations[kinds[event.code]] += 1
+
+    scheduler.add_listener(record, EVENT_JOB_ADDED | EVENT_JOB_MODIFIED | EVENT_JOB_REMOVED)  # pyright: ignore[reportUnknownMemberType]
+    scheduler.start(paused=True)
+
+    async def reconfigure():
+        mutations.clear()
+        await speech_repository.reload_schedule()
+        await event_start.configure_events(scheduler, speech_repository, planner, outbox, 5)
+        return dict(mutations)
+
+    # two planning jobs and a reminder per slot
+    assert await reconfigure() == {'added': 5}
+    assert await reconfigure() == {}
+
+    timezone = ZoneInfo('Asia/Novosibirsk')
+    async with speech_repository.get_session() as session, session.begin():
+        slot = await session.get_one(TimeSlot, 3)
+        slot.start_time = datetime.time(9, 30, tzinfo=timezone)
+        slot.end_time = datetime.time(10, 30, tzinfo=timezone)
+        session.add(Speech(title='Late talk', speaker='Speaker', time_slot_id=3, location='C'))
+    # the second day's reminder and planning job move
+    assert await reconfigure() == {'modified': 2}
+    jobs = {job.id: job.trigger.run_date for job in event_start.get_scheduled_jobs(scheduler)}
+    assert jobs['reminder:3'].astimezone(timezone).time() == datetime.time(9, 25)
+
+    async with speech_repository.get_session() as session, session.begin():
+        await session.execute(delete(Speech).where(Speech.time_slot_id == 3))
+        await session.delete(await session.get_one(TimeSlot, 3))
+    assert await reconfigure() == {'removed': 2}
+    assert _job_ids(scheduler) == {'plan:2025-06-01', 'reminder:1', 'reminder:2'}
+    scheduler.shutdown(wait=False)
+
+
+@pytest.mark.asyncio
+async def test_restore_catch_up(speech_repository: SpeechRepository, planner: AudiencePlanner, outbox: Outbox,
+                                bot: AsyncMock, job_repository: ReminderJobRepository):
+    with freeze_time('2025-06-01 08:00:00', -7) as frozen_time:
+        scheduler = AsyncIOScheduler()
+        scheduler.start(paused=True)
+        await event_start.configure_events(scheduler, speech_repository, planner, outbox, 5, job_repository)
+        scheduler.shutdown(wait=False)
+        assert await job_repository.get_revision() == await speech_repository.get_revision()
+        assert len(await job_repository.get_pending()) == 5
+
+        # the bot was down through both reminders of the first day
+        frozen_time.move_to('2025-06-01 09:58:00')
+        scheduler = AsyncIOScheduler()
+        scheduler.start(paused=True)
+        await event_start.restore_events(scheduler, speech_repository, planner, outbox, 5, job_repository)
+        assert _job_ids(scheduler) == {'plan:2025-06-02', 'reminder:3'}
+        assert {spec.id for spec in await job_repository.get_pending()} == {'plan:2025-06-02', 'reminder:3'}
+        await outbox.deliver_due()
+        # only the reminder inside the catch-up window is sent
+        bot.send_message.assert_has_awaits((
+            call(42, 'Через 5 минут начинается доклад "About something else" (A)'),
+            call(43, 'Через 5 минут начинается доклад "About something else" (A)'),
+            call(45, 'Через 5 минут начинается доклад "About something else" (A)'),
+        ), any_order=True)
+        assert bot.send_message.await_count == 3
+        scheduler.shutdown(wait=False)
+
+        scheduler = AsyncIOScheduler()
+        scheduler.start(paused=True)
+        await event_start.restore_events(scheduler, speech_repository, planner, outbox, 5, job_repository)
+        await outbox.deliver_due()
+        assert bot.send_message.await_count == 3
+        scheduler.shutdown(wait=False)
+
+
+@pytest.mark.asyncio
+@freeze_time('2025-06-01 08:00:00', -7)
+async def test_restore_outdated(speech_repository: SpeechRepository, planner: AudiencePlanner, outbox: Outbox,
+                                job_repository: ReminderJobRepository):
+    scheduler = AsyncIOScheduler()
+    scheduler.start(paused=True)
+    await event_start.configure_events(scheduler, speech_repository, planner, outbox, 5, job_repository)
+    async with speech_repository.get_session() as session, session.begin():
+        await session.execute(delete(Speech).where(Speech.time_slot_id == 3))
+        await session.delete(await session.get_one(TimeSlot, 3))
+        await speech_repository.bump_revision(session)
+    await speech_repository.refresh_schedule()
+
+    scheduler.remove_all_jobs()  # pyright: ignore[reportUnknownMemberType]
+    await event_start.restore_events(scheduler, speech_repository, planner, outbox, 5, job_repository)
+    assert _job_ids(scheduler) == {'plan:2025-06-01', 'reminder:1', 'reminder:2'}
+    assert {spec.id for spec in await job_repository.get_pending()} == {'plan:2025-06-01', 'reminder:1', 'reminder:2'}
+    assert await job_repository.get_revision() == await speech_repository.get_revision()
+    scheduler.shutdown(wait=False)
@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import multiprocessing
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import data.setup
+from data.engine import create_engine
+from data.repository import LeaseRepository
+from notifications.leader import LeaderElection
+from tests.notifications import leader_worker
+
+NOW = datetime.datetime(2025, 6, 1, 9)  # noqa: DTZ001
+LEASE = datetime.timedelta(seconds=30)
+
+
+@pytest_asyncio.fixture  # type: ignore
+async def session_maker(tmp_path: Path):
+    engine = create_engine(f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}')
+    await data.setup.create_tables(engine)
+    yield async_sessionmaker(engine)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_lease(session_maker: async_sessionmaker[AsyncSession]):
+    repository = LeaseRepository(session_maker)
+    assert await repository.try_acquire('scheduler', 'a', NOW, NOW + LEASE)
+    assert not await repository.try_acquire('scheduler', 'b', NOW, NOW + LEASE)
+    assert await repository.try_acquire('other', 'b', NOW, NOW + LEASE)
+    assert await repository.try_acquire('scheduler', 'a', NOW + LEASE / 2, NOW + LEASE * 1.5)
+    assert not await repository.try_acquire('scheduler', 'b', NOW + LEASE, NOW + LEASE * 2)
+    assert await repository.try_acquire('scheduler', 'b', NOW + LEASE * 2, NOW + LEASE * 3)
+    await repository.release('scheduler', 'a')
+    assert not await repository.try_acquire('scheduler', 'a', NOW + LEASE * 2, NOW + LEASE * 3)
+    await repository.release('scheduler', 'b')
+    assert await repository.try_acquire('scheduler', 'a', NOW + LEASE * 2, NOW + LEASE * 3)
+
+
+@pytest.mark.asyncio
+async def test_single_leader(session_maker: async_sessionmaker[AsyncSession]):
+    repository = LeaseRepository(session_maker)
+    leaders: list[str] = []
+
+    def candidate(name: str):
+        election = LeaderElection(repository, holder=name, renew_interval=0.01)
+
+        async def lead():
+            leaders.append(name)
+            await asyncio.Future()
+
+        return election, asyncio.create_task(election.run(lead))
+
+    first, first_task = candidate('first')
+    await asyncio.sleep(0.05)
+    second, second_task = candidate('second')
+    await asyncio.sleep(0.05)
+    assert first.is_leader
+    assert not second.is_leader
+    assert leaders == ['first']
+
+    first_task.cancel()
+    await asyncio.wait((first_task,))
+    await asyncio.sleep(0.05)
+    assert second.is_leader
+    assert leaders == ['first', 'second']
+    second_task.cancel()
+    await asyncio.wait((second_task,))
+
+
+@pytest.mark.asyncio
+async def test_leader_task_restarted(session_maker: async_sessionmaker[AsyncSession]):
+    election = LeaderElection(LeaseRepository(session_maker), renew_interval=0.01)
+    runs = 0
+
+    async def lead():
+        nonlocal runs
+        runs += 1
+        if runs == 1:
+            msg = 'Leader task failed'
+            raise RuntimeError(msg)
+        await asyncio.Future()
+
+    task = asyncio.create_task(election.run(lead))
+    await asyncio.sleep(0.1)
+    assert runs == 2  # noqa: PLR2004
+    assert election.is_leader
+    task.cancel()
+    await asyncio.wait((task,))
+
+
+def _wait_for(events: 'multiprocessing.Queue[tuple[str, str, float]]', received: list[tuple[str, str, float]],
+              kind: str):
+    while True:
+        event = events.get(timeout=60)
+        received.append(event)
+        if event[1] == kind:
+            return event[0]
+
+
+def test_worker_processes(tmp_path: Path):
+    url = f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}'
+    engine = create_engine(url)
+    asyncio.run(data.setup.create_tables(engine))
+    context = multiprocessing.get_context('spawn')
+    events: multiprocessing.Queue[tuple[str, str, float]] = context.Queue()
+    stops = {name: context.Event() for name in ('first', 'second', 'third')}
+    processes = {name: context.Process(target=leader_worker.compete, args=(url, name, stop, events))
+                 for name, stop in stops.items()}
+    received: list[tuple[str, str, float]] = []
+    processes['first'].start()
+    assert _wait_for(events, received, 'acquired') == 'first'
+    for name in 'second', 'third':
+        processes[name].start()
+    while sum(event[1] == 'started' for event in received) < len(processes):
+        _wait_for(events, received, 'started')
+
+    stops['first'].set()
+    successor = _wait_for(events, received, 'acquired')
+    assert successor in {'second', 'third'}
+    # the other candidate stops first, so it cannot take over once the successor releases the lease
+    for name in sorted(processes, key=lambda name: name == successor):
+        stops[name].set()
+        processes[name].join(timeout=60)
+        assert processes[name].exitcode == 0
+    while not events.empty():
+        received.append(events.get())
+
+    transitions = sorted((event for event in received if event[1] != 'started'), key=lambda event: event[2])
+    assert [(name, kind) for name, kind, _ in transitions] == [('first', 'acquired'), ('first', 'released'),
+                                                               (successor, 'acquired'), (successor, 'released')]
@@ -0,0 +1,259 @@
+# ruff: noqa: PLR2004
+
+import asyncio
+import dataclasses
+import datetime
+from typing import Any
+from unittest.mock import AsyncMock, call
+
+import pytest
+import pytest_asyncio
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import SendMessage
+from aiogram.utils.formatting import Bold, Text
+from freezegun import freeze_time
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import data.setup
+from data.repository import OutboxRepository
+from data.tables import DeliveryStatus, OutboxEntry, OutboxMessage
+from dto import ConferenceDto
+from notifications.outbox import Outbox
+from notifications.sender import MessageSender
+
+
+@pytest_asyncio.fixture
+async def session_maker():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    session_maker = async_sessionmaker(engine)
+    await data.setup.create_tables(engine)
+    return session_maker
+
+
+@pytest.fixture
+def bot():
+    return AsyncMock()
+
+
+@pytest.fixture
+def outbox(session_maker: async_sessionmaker[AsyncSession], bot: AsyncMock, conference: ConferenceDto):
+    return Outbox(OutboxRepository(session_maker, conference), MessageSender(bot, global_rate=1000))
+
+
+async def _get_entries(session_maker: async_sessionmaker[AsyncSession]):
+    async with session_maker() as session:
+        result = await session.scalars(select(OutboxEntry).order_by(OutboxEntry.chat_id, OutboxEntry.key))
+        return result.all()
+
+
+def _method():
+    return SendMessage(chat_id=2, text='Hello')
+
+
+@pytest.mark.asyncio
+async def test_deliver(outbox: Outbox, bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession]):
+    await outbox.enqueue('key', {'text': 'Hello'}, (1, 2, 3))
+
+    await outbox.deliver_due()
+
+    bot.send_message.assert_has_awaits([call(1, 'Hello'), call(2, 'Hello'), call(3, 'Hello')], any_order=True)
+    assert bot.send_message.await_count == 3
+    assert all(entry.status == DeliveryStatus.SENT for entry in await _get_entries(session_maker))
+
+
+@pytest.mark.asyncio
+async def test_deliver_formatted(outbox: Outbox, bot: AsyncMock):
+    await outbox.enqueue('key', Text('Hello ', Bold('world')).as_kwargs(), [1])
+
+    await outbox.deliver_due()
+
+    bot.send_message.assert_awaited_once_with(
+        1, 'Hello world', entities=[{'type': 'bold', 'offset': 6, 'length': 5}], parse_mode=None)
+
+
+@pytest.mark.asyncio
+async def test_payload_shared(outbox: Outbox, bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession]):
+    await outbox.enqueue('key', {'text': 'Hello'}, range(100))
+
+    await outbox.deliver_due()
+
+    assert bot.send_message.await_count == 100
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(OutboxMessage)) == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_idempotent(outbox: Outbox, bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession]):
+    await outbox.enqueue('key', {'text': 'Hello'}, [1])
+    await outbox.deliver_due()
+    await outbox.enqueue('key', {'text': 'Hello'}, [1, 2])
+    await outbox.deliver_due()
+    assert await outbox.enqueue('key', {'text': 'Hello'}, [1, 2]) is None
+
+    bot.send_message.assert_has_awaits([call(1, 'Hello'), call(2, 'Hello')])
+    assert bot.send_message.await_count == 2
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(OutboxMessage)) == 2
+
+
+@pytest.mark.asyncio
+async def test_conferences_have_separate_outboxes(outbox: Outbox, bot: AsyncMock,
+                                                  session_maker: async_sessionmaker[AsyncSession],
+                                                  conference: ConferenceDto):
+    other_bot = AsyncMock()
+    other = Outbox(OutboxRepository(session_maker, dataclasses.replace(conference, id=conference.id + 1)),
+                   MessageSender(other_bot, global_rate=1000))
+    await outbox.enqueue('key', {'text': 'Hello'}, [1])
+    await other.enqueue('key', {'text': 'Other'}, [1, 2])
+
+    await outbox.deliver_due()
+
+    bot.send_message.assert_awaited_once_with(1, 'Hello')
+    await other.deliver_due()
+    other_bot.send_message.assert_has_awaits([call(1, 'Other'), call(2, 'Other')], any_order=True)
+    assert bot.send_message.await_count == 1
+    assert all(entry.status == DeliveryStatus.SENT for entry in await _get_entries(session_maker))
+
+
+@pytest.mark.asyncio
+async def test_failure_does_not_abort(outbox: Outbox, bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession]):
+    async def send_message(chat_id: int, _: str):
+        if chat_id == 2:
+            raise TelegramServerError(_method(), 'error')
+
+    bot.send_message.side_effect = send_message
+
+    with freeze_time('2025-06-01 09:00:00'):
+        await outbox.enqueue('key', {'text': 'Hello'}, (1, 2, 3))
+        await outbox.deliver_due()
+
+    entries = await _get_entries(session_maker)
+    assert [entry.status for entry in entries] == [DeliveryStatus.SENT, DeliveryStatus.PENDING, DeliveryStatus.SENT]
+    assert entries[1].attempts == 1
+    assert entries[1].next_attempt == datetime.datetime(2025, 6, 1, 9, 0, 2)  # noqa: DTZ001
+
+
+@pytest.mark.asyncio
+async def test_retry_after(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    sender = AsyncMock(spec=MessageSender)
+    sender.send.side_effect = [TelegramRetryAfter(_method(), 'flood', 30), None]
+    outbox = Outbox(OutboxRepository(session_maker, conference), sender)
+
+    with freeze_time('2025-06-01 09:00:00') as frozen_time:
+        await outbox.enqueue('key', {'text': 'Hello'}, [1])
+        await outbox.deliver_due()
+
+        sender.pause.assert_called_once_with(30)
+        entry, = await _get_entries(session_maker)
+        assert entry.status == DeliveryStatus.PENDING
+        assert entry.attempts == 0
+        assert entry.next_attempt == datetime.datetime(2025, 6, 1, 9, 0, 30)  # noqa: DTZ001
+
+        frozen_time.tick(10)
+        await outbox.deliver_due()
+        assert sender.send.await_count == 1
+
+        frozen_time.tick(20)
+        await outbox.deliver_due()
+        assert sender.send.await_count == 2
+
+    entry, = await _get_entries(session_maker)
+    assert entry.status == DeliveryStatus.SENT
+
+
+@pytest.mark.asyncio
+async def test_rejected(outbox: Outbox, bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession]):
+    bot.send_message.side_effect = TelegramForbiddenError(_method(), 'blocked')
+
+    await outbox.enqueue('key', {'text': 'Hello'}, [1])
+    await outbox.deliver_due()
+    await outbox.deliver_due()
+
+    assert bot.send_message.await_count == 1
+    entry, = await _get_entries(session_maker)
+    assert entry.status == DeliveryStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_give_up(session_maker: async_sessionmaker[AsyncSession], bot: AsyncMock, conference: ConferenceDto):
+    outbox = Outbox(OutboxRepository(session_maker, conference), MessageSender(bot), max_attempts=2, base_retry_delay=0)
+    bot.send_message.side_effect = TelegramServerError(_method(), 'error')
+
+    await outbox.enqueue('key', {'text': 'Hello'}, [1])
+    await outbox.deliver_due()
+    await outbox.deliver_due()
+    await outbox.deliver_due()
+
+    assert bot.send_message.await_count == 2
+    entry, = await _get_entries(session_maker)
+    assert entry.status == DeliveryStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_results_saved_in_groups(session_maker: async_sessionmaker[AsyncSession], bot: AsyncMock,
+                                       conference: ConferenceDto):
+    repository = OutboxRepository(session_maker, conference)
+    outbox = Outbox(repository, MessageSender(bot, global_rate=1000, max_concurrency=1), result_group_size=3)
+    groups: list[int] = []
+    save_results = repository.save_results
+
+    async def record_groups(*args: Any):
+        groups.append(sum(len(results) for results in args[:3]))
+        await save_results(*args)
+
+    repository.save_results = record_groups  # type: ignore
+    await outbox.enqueue('key', {'text': 'Hello'}, range(10))
+
+    await outbox.deliver_due()
+
+    assert groups[0] == 3
+    assert sum(groups) == 10
+    assert len(groups) > 1
+    assert all(entry.status == DeliveryStatus.SENT for entry in await _get_entries(session_maker))
+
+
+@pytest.mark.asyncio
+async def test_prune(outbox: Outbox, bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession]):
+    bot.send_message.side_effect = [None, TelegramForbiddenError(_method(), 'blocked'), None]
+    with freeze_time('2025-06-01 09:00:00') as frozen_time:
+        await outbox.enqueue('old', {'text': 'Old'}, (1, 2))
+        await outbox.deliver_due()
+        frozen_time.tick(datetime.timedelta(days=8))
+        await outbox.enqueue('recent', {'text': 'Recent'}, [1])
+        await outbox.deliver_due()
+        await outbox.enqueue('pending', {'text': 'Pending'}, [1])
+
+        await outbox.prune()
+
+    assert [(entry.key, entry.status) for entry in await _get_entries(session_maker)] == [
+        ('pending', DeliveryStatus.PENDING), ('recent', DeliveryStatus.SENT)]
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(OutboxMessage)) == 2
+
+
+@pytest.mark.asyncio
+async def test_run_polls_for_entries_of_other_processes(bot: AsyncMock, session_maker: async_sessionmaker[AsyncSession],
+                                                        conference: ConferenceDto):
+    repository = OutboxRepository(session_maker, conference)
+    outbox = Outbox(repository, MessageSender(bot, global_rate=1000), poll_interval=0.05)
+    delivered = asyncio.Event()
+
+    async def send_message(chat_id: int, _: str):
+        if chat_id == 1:
+            raise TelegramServerError(_method(), 'error')
+        delivered.set()
+
+    bot.send_message.side_effect = send_message
+    # a retry due later must not hold back the poll
+    await outbox.enqueue('retried', {'text': 'Hello'}, [1])
+    runner = asyncio.create_task(outbox.run())
+    try:
+        await asyncio.sleep(0.1)
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        await repository.enqueue('other', '{"text": "Hello"}', [2], now)
+
+        async with asyncio.timeout(1):
+            await delivered.wait()
+    finally:
+        runner.cancel()
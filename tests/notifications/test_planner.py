@@ -0,0 +1,143 @@
+import dataclasses
+import datetime
+from collections import Counter
+from unittest.mock import Mock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import data.mock_data
+import data.setup
+from data.repository import SelectionRepository, SpeechRepository, UserRepository
+from data.tables import Selection, Settings
+from dto import ConferenceDto
+from notifications.planner import AudiencePlanner
+
+
+@pytest_asyncio.fixture
+async def session_maker():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    session_maker = async_sessionmaker(engine)
+    await data.setup.create_tables(engine)
+    await data.mock_data.fill_tables(session_maker)
+    async with session_maker() as session, session.begin():
+        session.add_all((Selection(attendee=41, time_slot_id=1, speech_id=1),
+                         Selection(attendee=41, time_slot_id=2, speech_id=2),
+                         Selection(attendee=42, time_slot_id=1, speech_id=3),
+                         Selection(attendee=42, time_slot_id=2, speech_id=2),
+                         Selection(attendee=43, time_slot_id=2, speech_id=2),
+                         Selection(attendee=44, time_slot_id=1, speech_id=1),
+                         Selection(attendee=45, time_slot_id=1, speech_id=3),
+                         Selection(attendee=46, time_slot_id=1, speech_id=3),
+                         Selection(attendee=45, time_slot_id=2, speech_id=2),
+                         Selection(attendee=46, time_slot_id=2, speech_id=2)))
+        session.add_all((Settings(user_id=45, notifications_enabled=True),
+                         Settings(user_id=46, notifications_enabled=False)))
+    return session_maker
+
+
+@pytest.fixture
+def selection_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SelectionRepository(session_maker, conference)
+
+
+@pytest.fixture
+def user_repository(session_maker: async_sessionmaker[AsyncSession]):
+    return UserRepository(session_maker)
+
+
+@pytest_asyncio.fixture
+async def planner(session_maker: async_sessionmaker[AsyncSession], selection_repository: SelectionRepository,
+                  user_repository: UserRepository, conference: ConferenceDto):
+    planner = AudiencePlanner(SpeechRepository(session_maker, conference), selection_repository, user_repository)
+    await planner.plan_day(datetime.date(2025, 6, 1))
+    return planner
+
+
+async def _get_audience(planner: AudiencePlanner, slot_id: int, previous_slot_id: int | None):
+    return [row async for chunk in planner.stream_audience(slot_id, previous_slot_id) for row in chunk]
+
+
+@pytest.mark.asyncio
+async def test_plan_matches_queries(planner: AudiencePlanner, selection_repository: SelectionRepository):
+    first = await _get_audience(planner, 1, None)
+    changing = await _get_audience(planner, 2, 1)
+
+    expected_first = await selection_repository.get_users_that_selected(1)
+    expected_changing = await selection_repository.get_changing_users(2, 1)
+    assert Counter(first) == Counter((x.attendee, x.speech.id) for x in expected_first)
+    assert Counter(changing) == Counter((x.attendee, x.speech.id) for x in expected_changing)
+    speeches = await planner.get_speeches(1)
+    assert all(speeches[speech_id].title for _, speech_id in first)
+
+
+@pytest.mark.asyncio
+async def test_no_query_when_planned(planner: AudiencePlanner, selection_repository: SelectionRepository):
+    selection_repository.stream_users_that_selected = Mock(side_effect=AssertionError)  # type: ignore
+    selection_repository.stream_changing_users = Mock(side_effect=AssertionError)  # type: ignore
+
+    await _get_audience(planner, 1, None)
+    await _get_audience(planner, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_selection_change_patches_plan(planner: AudiencePlanner, selection_repository: SelectionRepository):
+    await selection_repository.save_selection(43, 1, 1)
+    await selection_repository.save_selection(41, 1, None)
+
+    first = await _get_audience(planner, 1, None)
+    changing = await _get_audience(planner, 2, 1)
+
+    assert Counter(attendee for attendee, _ in first) == Counter((42, 43, 44, 45))
+    assert Counter(attendee for attendee, _ in changing) == Counter((41, 42, 45))
+
+
+@pytest.mark.asyncio
+async def test_notification_setting_patches_plan(planner: AudiencePlanner, user_repository: UserRepository):
+    await user_repository.save_notification_setting(42, False)
+    await user_repository.save_notification_setting(46, True)
+
+    first = await _get_audience(planner, 1, None)
+    changing = await _get_audience(planner, 2, 1)
+
+    assert Counter(attendee for attendee, _ in first) == Counter((41, 44, 45, 46))
+    assert Counter(attendee for attendee, _ in changing) == Counter((43, 45, 46))
+
+
+@pytest.mark.asyncio
+async def test_unplanned_slot_is_queried(session_maker: async_sessionmaker[AsyncSession],
+                                         selection_repository: SelectionRepository, user_repository: UserRepository,
+                                         conference: ConferenceDto):
+    planner = AudiencePlanner(SpeechRepository(session_maker, conference), selection_repository, user_repository)
+
+    changing = await _get_audience(planner, 2, 1)
+
+    assert Counter(attendee for attendee, _ in changing) == Counter((42, 43, 45))
+
+
+@pytest.mark.asyncio
+async def test_is_planned(planner: AudiencePlanner, session_maker: async_sessionmaker[AsyncSession],
+                          conference: ConferenceDto):
+    speeches = await SpeechRepository(session_maker, conference).get_all_speeches(datetime.date(2025, 6, 1))
+    assert planner.is_planned([1, 2], speeches)
+    assert not planner.is_planned([3], ())
+    assert not planner.is_planned([2, 1], speeches)
+    renamed = [dataclasses.replace(speech, title='Renamed') if speech.id == 1 else speech for speech in speeches]
+    assert not planner.is_planned([1, 2], renamed)
+
+
+@pytest.mark.asyncio
+async def test_shared_planner_sees_other_processes(session_maker: async_sessionmaker[AsyncSession],
+                                                   selection_repository: SelectionRepository,
+                                                   user_repository: UserRepository, conference: ConferenceDto):
+    planner = AudiencePlanner(SpeechRepository(session_maker, conference), selection_repository, user_repository,
+                              shared=True)
+    await planner.plan_day(datetime.date(2025, 6, 1))
+
+    # repositories of another worker, their listeners do not reach this planner
+    await SelectionRepository(session_maker, conference).save_selection(43, 1, 1)
+    await UserRepository(session_maker).save_notification_setting(44, False)
+
+    first = await _get_audience(planner, 1, None)
+    assert Counter(attendee for attendee, _ in first) == Counter((41, 42, 43, 45))
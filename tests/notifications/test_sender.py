@@ -0,0 +1,78 @@
+# ruff: noqa: PLR2004
+
+import asyncio
+import time
+from typing import Any
+from unittest.mock import AsyncMock, call
+
+import pytest
+
+from notifications.sender import MessageSender, TokenBucket
+
+
+def test_token_bucket_burst():
+    bucket = TokenBucket(10, 3)
+
+    delays = [bucket.reserve() for _ in range(5)]
+
+    assert delays[:3] == [0, 0, 0]
+    assert delays[3] == pytest.approx(0.1, abs=0.01)
+    assert delays[4] == pytest.approx(0.2, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_per_chat_limit():
+    bot = AsyncMock()
+    sender = MessageSender(bot, per_chat_rate=20)
+
+    start = time.monotonic()
+    await asyncio.gather(*(sender.send(42, str(i)) for i in range(3)))
+
+    assert time.monotonic() - start >= 0.09
+    bot.send_message.assert_has_awaits([call(42, '0'), call(42, '1'), call(42, '2')], any_order=True)
+
+
+@pytest.mark.asyncio
+async def test_global_limit():
+    bot = AsyncMock()
+    sender = MessageSender(bot, global_rate=50)
+
+    start = time.monotonic()
+    await asyncio.gather(*(sender.send(chat_id, 'Hello') for chat_id in range(60)))
+
+    assert time.monotonic() - start >= 0.19
+    assert bot.send_message.await_count == 60
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    running = 0
+    max_running = 0
+
+    async def send_message(*_: Any):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    bot = AsyncMock()
+    bot.send_message.side_effect = send_message
+    sender = MessageSender(bot, global_rate=1000, max_concurrency=4)
+
+    await asyncio.gather(*(sender.send(chat_id, 'Hello') for chat_id in range(20)))
+
+    assert max_running == 4
+
+
+@pytest.mark.asyncio
+async def test_pause():
+    bot = AsyncMock()
+    sender = MessageSender(bot)
+
+    sender.pause(0.1)
+    start = time.monotonic()
+    await sender.send(42, 'Hello')
+
+    assert time.monotonic() - start >= 0.09
+    bot.send_message.assert_awaited_once_with(42, 'Hello')
@@ -1,18 +1,24 @@
 import datetime
 import textwrap
+from collections import Counter
+from collections.abc import Iterable
+from typing import Any
 from zoneinfo import ZoneInfo
 
 import pytest
 import pytest_asyncio
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import selectinload
 
 import data.mock_data
 import data.setup
-from data.repository import SpeechRepository, UserRepository
-from data.tables import Settings, Speech
+from data.repository import OutboxRepository, SpeechRepository, UserRepository
+from data.tables import ScheduleStaging, Settings, Speech
+from dto import ConferenceDto, TimeSlotDto
 from handlers import admin
+from notifications.outbox import Outbox
+from notifications.sender import MessageSender
 from tests.fake_bot import BotFake
 
 
@@ -28,8 +34,8 @@ async def session_maker():
 
 
 @pytest.fixture
-def speech_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SpeechRepository(session_maker)
+def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SpeechRepository(session_maker, conference)
 
 
 @pytest.fixture
@@ -38,8 +44,14 @@ def user_repository(session_maker: async_sessionmaker[AsyncSession]):
 
 
 @pytest.fixture
-def bot(speech_repository: SpeechRepository, user_repository: UserRepository):
+def outbox_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return OutboxRepository(session_maker, conference)
+
+
+@pytest.fixture
+def bot(speech_repository: SpeechRepository, user_repository: UserRepository, outbox_repository: OutboxRepository):
     bot = BotFake(speech_repository=speech_repository, user_repository=user_repository)
+    bot.inject(outbox=Outbox(outbox_repository, MessageSender(bot.bot)))
     bot.router.include_router(admin.get_router())
     return bot
 
@@ -88,8 +100,10 @@ async def test_set_admin_invalid_format(bot: BotFake):
 
 
 @pytest.mark.asyncio
-async def test_update_schedule(bot: BotFake, session_maker: async_sessionmaker[AsyncSession]):
+async def test_update_schedule(bot: BotFake, session_maker: async_sessionmaker[AsyncSession],
+                               speech_repository: SpeechRepository):
     bot.router.include_router(admin.get_router())
+    old_schedule = await speech_repository.get_schedule()
     data = '''
     date,start_time,end_time,location,title,speaker
     01-06,09:00,10:00,A,About something else,Jane Doe
@@ -126,6 +140,158 @@ async def test_update_schedule(bot: BotFake, session_maker: async_sessionmaker[A
             assert any(
                 speech == (s.time_slot.date, s.time_slot.start_time, s.time_slot.end_time,
                            s.location, s.title, s.speaker) for s in schedule)
+    new_schedule = await speech_repository.get_schedule()
+    assert new_schedule.version == old_schedule.version + 1
+    assert len(new_schedule.speeches) == len(reference_schedule)
+    assert Counter((s.time_slot.date, s.time_slot.start_time, s.time_slot.end_time, s.location, s.title, s.speaker)
+                   for s in new_schedule.speeches) == Counter(reference_schedule)
+
+
+@pytest.mark.asyncio
+async def test_update_schedule_reports_changes(bot: BotFake):
+    updated_slots: list[list[int | None]] = []
+
+    async def callback(slots: Iterable[TimeSlotDto]):
+        updated_slots.append([slot.id for slot in slots])
+
+    bot.inject(schedule_update_callback=callback)
+    data = textwrap.dedent('''
+    date,start_time,end_time,location,title,speaker
+    01-06,09:00,10:00,A,About something,Dr. John Doe
+    01-06,09:00,10:00,B,Alternative point,Mr. Alternative
+    01-06,10:00,11:00,A,About something else,Jane Doe
+    02-06,09:00,10:00,A,,
+    02-06,09:00,10:00,C,New day talk,New speaker
+    02-06,09:00,10:00,B,Alternative day two,Mr. Alternative
+    ''').strip().encode('utf-8')
+
+    await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+    await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+
+    assert updated_slots == [[3], []]
+    first, second = bot.sent_messages
+    assert 'Расписание обновлено' in first
+    assert '"New day talk": A → C' in first
+    assert '"Alternative day 2" (Mr. Alternative) → "Alternative day two" (Mr. Alternative)' in first
+    assert 'About something' not in first
+    assert 'Изменений нет' in second
+
+
+@pytest.mark.asyncio
+async def test_update_schedule_streamed(bot: BotFake, speech_repository: SpeechRepository,
+                                        session_maker: async_sessionmaker[AsyncSession],
+                                        monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(admin, 'DOWNLOAD_CHUNK_SIZE', 5)
+    monkeypatch.setattr(admin, 'IMPORT_BATCH_SIZE', 2)
+    bot.router.include_router(admin.get_router())
+    data = (
+        'date,start_time,end_time,location,title,speaker\r\n'
+        '01-06,09:00,10:00,A,Доклад о чём-то,Иван Иванов\r\n'
+        '01-06,09:00,10:00,B,"Multi\nline, quoted ""title""",Mr. Alternative\r\n'
+        '02-06,09:00,10:00,C,Replaced later,Nobody\r\n'
+        '02-06,09:00,10:00,C,New day talk,New speaker\r\n'
+    ).encode()
+
+    await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+
+    assert 'Расписание обновлено' in bot.sent_messages[0]
+    schedule = await speech_repository.get_schedule()
+    speeches = {(s.time_slot.date.day, s.time_slot.start_time.hour, s.location): (s.title, s.speaker)
+                for s in schedule.speeches}
+    assert speeches[1, 9, 'A'] == ('Доклад о чём-то', 'Иван Иванов')
+    assert speeches[1, 9, 'B'] == ('Multi\nline, quoted "title"', 'Mr. Alternative')
+    assert speeches[2, 9, 'C'] == ('New day talk', 'New speaker')
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(ScheduleStaging)) == 0
+
+
+@pytest.mark.asyncio
+async def test_update_schedule_fails_fast(bot: BotFake, speech_repository: SpeechRepository,
+                                          session_maker: async_sessionmaker[AsyncSession],
+                                          monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(admin, 'DOWNLOAD_CHUNK_SIZE', 1024)
+    bot.router.include_router(admin.get_router())
+    old_schedule = await speech_repository.get_schedule()
+    rows = [f'01-06,09:00,10:00,Room {i},Title {i},Speaker {i}' for i in range(2000)]
+    rows.insert(1500, '01-06,9 am,10:00,A,Broken,Nobody')
+    data = '\n'.join(['date,start_time,end_time,location,title,speaker', *rows]).encode('utf-8')
+
+    await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+
+    assert bot.sent_messages == ['Ошибка при обработке файла в строке 1502']
+    assert bot.session.streamed_bytes < len(data)
+    assert (await speech_repository.get_schedule()).version == old_schedule.version
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(ScheduleStaging)) == 0
+        assert await session.scalar(select(func.count()).where(Speech.title == 'Title 0')) == 0
+
+
+@pytest.mark.asyncio
+async def test_update_schedule_short_row(bot: BotFake, speech_repository: SpeechRepository):
+    bot.router.include_router(admin.get_router())
+    data = (b'date,start_time,end_time,location,title,speaker\n'
+            b'01-06,09:00,10:00,A,About something else,Jane Doe\n'
+            b'01-06,09:00,10:00,B\n')
+
+    await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+
+    assert bot.sent_messages == ['Ошибка при обработке файла в строке 3']
+    assert (await speech_repository.get_schedule()).version == 1
+
+
+@pytest.mark.asyncio
+async def test_update_schedule_discards_staged_rows_on_download_error(
+        bot: BotFake, session_maker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(admin, 'IMPORT_BATCH_SIZE', 1)
+    bot.router.include_router(admin.get_router())
+    data = (b'date,start_time,end_time,location,title,speaker\n'
+            b'01-06,09:00,10:00,A,First,Speaker\n'
+            b'01-06,09:00,10:00,B,Second,Speaker\n')
+
+    async def broken_download(*_: Any):
+        yield data
+        raise ConnectionError
+
+    monkeypatch.setattr(admin, '_stream_document', broken_download)
+
+    with pytest.raises(ConnectionError):
+        await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(ScheduleStaging)) == 0
+
+
+@pytest.mark.asyncio
+async def test_update_schedule_apply_error_is_not_reported_as_line(
+        bot: BotFake, speech_repository: SpeechRepository, session_maker: async_sessionmaker[AsyncSession],
+        monkeypatch: pytest.MonkeyPatch):
+    data = (b'date,start_time,end_time,location,title,speaker\n'
+            b'01-06,09:00,10:00,A,First,Speaker\n')
+
+    async def fail(*_: Any):
+        raise ValueError
+
+    monkeypatch.setattr(speech_repository, 'apply_staged', fail)
+
+    with pytest.raises(ValueError):  # noqa: PT011
+        await bot.message('/edit_schedule', user_id=42, file=('schedule.csv', data))
+
+    assert bot.sent_messages == []
+    async with session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(ScheduleStaging)) == 0
+
+
+def test_parser_joins_line_breaks_split_between_chunks(speech_repository: SpeechRepository):
+    data = (b'date,start_time,end_time,location,title,speaker\r\n'
+            b'01-06,09:00,10:00,A,"Two\r\nlines",Jane Doe\r\n'
+            b'01-06,10:00,11:00,B,Talk,John Doe\r\n')
+    expected = [('Two\r\nlines', 'Jane Doe', 'A'), ('Talk', 'John Doe', 'B')]
+    for split in range(1, len(data)):
+        parser = admin.ScheduleParser(speech_repository.conference, 100)
+        batches = [*parser.feed(data[:split]), *parser.feed(data[split:]), *parser.close()]
+        speeches = [speech for batch_speeches, _ in batches for speech in batch_speeches]
+        assert [(speech.title, speech.speaker, speech.location) for speech in speeches] == expected, split
+        assert parser.rows == len(expected)
 
 
 @pytest.mark.asyncio
@@ -176,20 +342,23 @@ async def test_update_schedule_wrong_format(bot: BotFake, wrong_header: bool):
         ('/notify', 'Неверный формат команды', 1),
         ('/notify 123', 'Неверный формат команды', 1),
         ('/notify abc Hello', 'Ошибка при отправке сообщения', 1),
-        ('/notify 123,abc Hello', 'Ошибка при отправке сообщения', 2),
+        ('/notify 123,abc Hello', 'Ошибка при отправке сообщения', 1),
     ]
 )
-async def test_manual_notify_handler_invalid(bot: BotFake, command: str, expected_text: str, message_count: int):
+async def test_manual_notify_handler_invalid(bot: BotFake, outbox_repository: OutboxRepository,
+                                             command: str, expected_text: str, message_count: int):
     await bot.message(command, user_id=42)
 
     assert len(bot.sent_messages) == message_count
     assert expected_text in bot.sent_messages[-1]
+    assert await outbox_repository.get_next_attempt_time() is None
 
 
 @pytest.mark.asyncio
-async def test_manual_notify_handler_success(bot: BotFake):
+async def test_manual_notify_handler_success(bot: BotFake, outbox_repository: OutboxRepository):
     await bot.message('/notify 1001,1002,1003 Hello world!', user_id=42)
 
-    assert len(bot.sent_messages) == 4  # noqa: PLR2004
-    assert all(msg == 'Hello world!' for msg in bot.sent_messages[:-1])
+    assert bot.sent_messages == ['Сообщение поставлено в очередь для 3 пользователей']
+    await Outbox(outbox_repository, MessageSender(bot.bot)).deliver_due()
+    assert bot.sent_messages[1:] == ['Hello world!'] * 3
     assert {msg.chat.id for msg in bot.messages} == {1001, 1002, 1003, 42}
@@ -12,8 +12,10 @@ import data.mock_data
 import data.setup
 from data.repository import FileRepository, SpeechRepository, UserRepository
 from data.tables import Settings
+from dto import ConferenceDto
 from handlers import general
 from tests.fake_bot import BotFake
+from view.cache import TimetableCache
 
 
 @pytest_asyncio.fixture  # type: ignore
@@ -26,8 +28,8 @@ async def session_maker():
 
 
 @pytest.fixture
-def speech_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return SpeechRepository(session_maker)
+def speech_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return SpeechRepository(session_maker, conference)
 
 
 @pytest.fixture
@@ -36,14 +38,15 @@ def user_repository(session_maker: async_sessionmaker[AsyncSession]):
 
 
 @pytest.fixture
-def file_repository(session_maker: async_sessionmaker[AsyncSession]):
-    return FileRepository(session_maker)
+def file_repository(session_maker: async_sessionmaker[AsyncSession], conference: ConferenceDto):
+    return FileRepository(session_maker, conference)
 
 
 @pytest_asyncio.fixture
 async def bot(speech_repository: SpeechRepository, user_repository: UserRepository, file_repository: FileRepository):
     await file_repository.add_files([('schedule', Path('schedule.txt'))])
     bot = BotFake(speech_repository=speech_repository, user_repository=user_repository, file_repository=file_repository)
+    bot.inject(timetable_cache=TimetableCache())
     bot.router.include_router(general.get_router())
     return bot
 
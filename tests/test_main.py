@@ -0,0 +1,105 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import Connection, event
+
+import data.engine
+import main
+from data.repository import FileRepository, SpeechRepository, UserRepository
+
+# Module counts do not depend on the machine's load, about 1325 modules are imported today
+IMPORT_MODULE_BUDGET = 1400
+# Round trips between the database setup and the bot being ready, seven today and independent of the machine's load
+READY_STATEMENT_BUDGET = 10
+LAZY_MODULES = ('aiohttp.web', 'apscheduler', 'babel.dates', 'automapper')
+IMPORT_SCRIPT = f'''
+import json, sys
+before = len(sys.modules)
+import main
+print(json.dumps({{'imported': len(sys.modules) - before,
+                  'loaded': [name for name in {LAZY_MODULES!r} if name in sys.modules]}}))
+'''
+
+
+def test_import_budget():
+    result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=Path(main.__file__).parent,  # noqa: S603
+                            capture_output=True, check=True, text=True)
+    report = json.loads(result.stdout)
+    assert report['loaded'] == []
+    assert report['imported'] < IMPORT_MODULE_BUDGET
+
+
+async def _run_startup(monkeypatch: pytest.MonkeyPatch, database_url: str, schedule_path: Path):
+    monkeypatch.setenv('DATABASE_URL', database_url)
+    monkeypatch.setenv('FILL_MOCK_DATA', '1')
+    monkeypatch.setenv('GENERAL_SCHEDULE_PATH', str(schedule_path))
+    statements: list[tuple[int, str]] = []
+    create_engine = data.engine.create_engine
+
+    def record_statement(connection: Connection, _: Any, statement: str, *__: Any):
+        statements.append((id(connection.connection), statement))
+
+    def record_statements(url: str):
+        engine = create_engine(url)
+        event.listen(engine.sync_engine, 'before_cursor_execute', record_statement)
+        return engine
+
+    init_database = main.init_database
+    initialized: list[int] = []
+    served: list[list[tuple[int, str]]] = []
+
+    async def record_init(*args: Any):
+        await init_database(*args)
+        initialized.append(len(statements))
+
+    async def serve(*_: Any):
+        served.append(statements.copy())
+
+    monkeypatch.setattr(data.engine, 'create_engine', record_statements)
+    monkeypatch.setattr(main, 'init_database', record_init)
+    monkeypatch.setattr(main, 'serve', serve)
+    await main.setup_and_run_bot('123456:token')
+
+    assert len(served) == 1
+    startup = served[0][initialized[0]:]
+    assert len(startup) <= READY_STATEMENT_BUDGET
+    return [next((connection, i) for i, (connection, statement) in enumerate(startup) if marker in statement)
+            for marker in ('INSERT INTO files', 'FROM settings', 'FROM time_slots')]
+
+
+@pytest.mark.asyncio
+async def test_startup_on_single_connection_writes_before_reading(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (_, files_insert), (_, admins_select), (_, slots_select) = await _run_startup(
+        monkeypatch, 'sqlite+aiosqlite:///:memory:', tmp_path / 'general.pdf')
+
+    assert files_insert < admins_select
+    assert files_insert < slots_select
+
+
+@pytest.mark.asyncio
+async def test_startup_steps_run_concurrently(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    started: list[str] = []
+    finished: list[int] = []
+
+    def track(repository: type[Any], step: str):
+        original = getattr(repository, step)
+
+        async def tracked(*args: Any):
+            started.append(step)
+            result = await original(*args)
+            finished.append(len(started))
+            return result
+
+        monkeypatch.setattr(repository, step, tracked)
+
+    track(FileRepository, 'add_files')
+    track(UserRepository, 'load_admins')
+    track(SpeechRepository, 'get_schedule')
+    await _run_startup(monkeypatch, f'sqlite+aiosqlite:///{tmp_path / 'bot.db'}', tmp_path / 'general.pdf')
+
+    # run one after another, a step would finish before the next one starts
+    assert finished == [3, 3, 3]
@@ -0,0 +1,35 @@
+import dataclasses
+import datetime
+from zoneinfo import ZoneInfo
+
+from data.schedule import ScheduleSnapshot
+from dto import SpeechDto, TimeSlotDto
+from view.cache import TimetableCache
+
+
+def _schedule(version: int, title: str):
+    timezone = ZoneInfo('Asia/Novosibirsk')
+    slot = TimeSlotDto(1, datetime.date(2025, 6, 1), datetime.time(9, tzinfo=timezone),
+                       datetime.time(10, tzinfo=timezone))
+    return ScheduleSnapshot.build(version, [slot], [SpeechDto(1, title, 'Speaker', slot, 'A')])
+
+
+def test_rendered_once_per_version():
+    cache = TimetableCache()
+    schedule = _schedule(1, 'Title')
+
+    first = cache.get(schedule, datetime.date(2025, 6, 1))
+    second = cache.get(dataclasses.replace(schedule), datetime.date(2025, 6, 1))
+
+    assert first is second
+    assert any('Title' in kwargs['text'] for kwargs in first)
+    assert cache.get(schedule, datetime.date(2025, 6, 2)) == ()
+
+
+def test_new_version_rerenders():
+    cache = TimetableCache()
+    cache.warm_up(_schedule(1, 'Old title'))
+
+    rendered = cache.get(_schedule(2, 'New title'), datetime.date(2025, 6, 1))
+
+    assert any('New title' in kwargs['text'] for kwargs in rendered)
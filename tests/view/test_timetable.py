@@ -1,6 +1,7 @@
 import datetime
 
 import pytest
+from aiogram.utils.formatting import Bold, Italic, Text
 
 from dto import SpeechDto, TimeSlotDto
 from view import timetable
@@ -40,3 +41,56 @@ def test_make_entry_string_location_only(speech: SpeechDto):
     assert 'A title' in result
     assert 'A Speaker' in result
     assert 'a location' in result
+
+
+def test_date_format_table(time_slot: TimeSlotDto, monkeypatch: pytest.MonkeyPatch):
+    table = timetable.DateFormatTable()
+    fallback = (table.date(time_slot.date, 'E, dd.MM'), table.slot_time(time_slot))
+    assert fallback == ('Вс, 15.06', '09:00 - 10:00')
+    table.update([time_slot.date], [time_slot])
+
+    def fail(*_: object):
+        pytest.fail('Precomputed strings should not be formatted again')
+
+    monkeypatch.setattr(timetable, '_format_date', fail)
+    assert (table.date(time_slot.date, 'E, dd.MM'), table.slot_time(time_slot)) == fallback
+    assert table.date(time_slot.date, 'E, dd.MM:\n') == 'Вс, 15.06:\n'
+
+
+def _entity_texts(text: Text):
+    rendered, entities = text.render()
+    encoded = rendered.encode('utf-16-le')
+    return [(entity.type, encoded[entity.offset * 2:(entity.offset + entity.length) * 2].decode('utf-16-le'))
+            for entity in entities]
+
+
+def test_pack_messages_joins_blocks():
+    blocks = [Text('📆', Bold(f'Day {i}'), '\n', Italic(f'Speaker {i}')) for i in range(5)]
+
+    packed = list(timetable.pack_messages(blocks))
+
+    assert len(packed) == 1
+    assert _entity_texts(packed[0]) == [entity for block in blocks for entity in _entity_texts(block)]
+
+
+def test_pack_messages_respects_limit():
+    blocks = [Text('🏫', Bold(f'Room {i}'), ': talk') for i in range(20)]
+
+    packed = list(timetable.pack_messages(blocks, limit=50))
+
+    assert all(len(text) <= 50 for text in packed)  # noqa: PLR2004
+    assert len(packed) == 7  # noqa: PLR2004
+    assert '\n\n'.join(text.render()[0] for text in packed) == '\n\n'.join(block.render()[0] for block in blocks)
+
+
+def test_pack_messages_splits_long_block():
+    block = Text(*(Text('🗓️', Bold(f'Speech number {i}'), '\n') for i in range(10)), Italic('x' * 45))
+
+    packed = list(timetable.pack_messages([Text('Header'), block], limit=40))
+
+    assert packed[0].render()[0] == 'Header'
+    assert all(len(text) <= 40 for text in packed)  # noqa: PLR2004
+    assert ''.join(text.render()[0] for text in packed[1:]) == block.render()[0]
+    entities = [entity for text in packed[1:] for entity in _entity_texts(text)]
+    assert [text for kind, text in entities if kind == 'bold'] == [f'Speech number {i}' for i in range(10)]
+    assert ''.join(text for kind, text in entities if kind == 'italic') == 'x' * 45